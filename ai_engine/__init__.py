@@ -1,3 +1,18 @@
-from .classifier import ExpenseClassifier
-from .analytics import get_monthly_total, get_category_breakdown, generate_suggestions, get_daily_spending
-from .ocr import extract_text, parse_receipt
+# Submodules are imported on first attribute access, so light users such as
+# ai_engine.parser (and the CLI in main.py) don't pay for sklearn/pandas/tesseract.
+_EXPORTS = {
+    "ExpenseClassifier": "classifier",
+    "get_monthly_total": "analytics",
+    "get_category_breakdown": "analytics",
+    "generate_suggestions": "analytics",
+    "get_daily_spending": "analytics",
+    "extract_text": "ocr",
+    "parse_receipt": "ocr",
+}
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        import importlib
+        module = importlib.import_module(f".{_EXPORTS[name]}", __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,138 +1,131 @@
 import database
-import pandas as pd
+import expense_store
+import profiles
+import numpy as np
 from datetime import datetime
+from cache import cached_per_user
+import concurrency
+from profiling import phase
 
+@cached_per_user
 def get_monthly_total(user_id):
-    """Calculates total spending for the current month for a specific user."""
+    """Total spending for the current month for a specific user (from the running totals)."""
     current_month = datetime.now().strftime("%Y-%m")
-    expenses = database.get_expenses(user_id=user_id, month=current_month)
-    total = sum(row['amount'] for row in expenses)
-    return total
+    return database.get_month_totals(user_id, current_month).get(database.ALL_CATEGORIES, 0)
 
+@cached_per_user
 def get_category_breakdown(user_id):
-    """Calculates spending per category for the current month for a specific user."""
+    """Spending per category for the current month for a specific user (from the running totals)."""
     current_month = datetime.now().strftime("%Y-%m")
-    expenses = database.get_expenses(user_id=user_id, month=current_month)
-    
-    breakdown = {}
-    for row in expenses:
-        cat = row['category']
-        amt = row['amount']
-        breakdown[cat] = breakdown.get(cat, 0) + amt
-    
-    return breakdown
+    totals = database.get_month_totals(user_id, current_month)
+    totals.pop(database.ALL_CATEGORIES, None)
+    return totals
 
+@cached_per_user
 def generate_suggestions(user_id):
-    """Generates simple financial suggestions based on thresholds for a user."""
-    breakdown = get_category_breakdown(user_id)
+    """
+    Turns this month's budget alerts into dashboard messages. The alerts are
+    recorded by database.py as expenses are written, so nothing is recomputed here.
+    """
+    current_month = datetime.now().strftime("%Y-%m")
+    currency = profiles.get_profile(user_id).currency
+    alerts = database.get_budget_alerts(user_id, current_month)
+    exceeded = {a['category'] for a in alerts if a['level'] == 'exceeded'}
     suggestions = []
     
-    # Thresholds for 10 Categories (in PKR)
-    thresholds = {
-        "Food & Dining": 30000,
-        "Transportation": 15000,
-        "Housing & Utilities": 50000,
-        "Mobile & Communication": 3000,
-        "Shopping": 20000,
-        "Health & Fitness": 10000,
-        "Education": 25000,
-        "Entertainment": 5000,
-        "Gifts & Donations": 10000,
-        "Financial / Others": 20000
-    }
-    
-    for category, amount in breakdown.items():
-        limit = thresholds.get(category, 20000)
-        if amount > limit:
-            suggestions.append(f"⚠️  Alert: High spending in {category} (PKR {amount} > Limit {limit}).")
-    
-    total_spending = get_monthly_total(user_id)
-    if total_spending > 100000:
-        suggestions.append("⚠️  Alert: Total monthly spending is high (> PKR 100,000).")
+    for alert in alerts:
+        category, total, budget = alert['category'], alert['total'], alert['budget']
+        if alert['level'] == 'warning' and category in exceeded:
+            continue
+        if category == database.ALL_CATEGORIES:
+            if alert['level'] == 'exceeded':
+                suggestions.append(f"⚠️  Alert: Total monthly spending is high (> {currency} {budget:,.0f}).")
+            else:
+                suggestions.append(f"🔔 Heads up: You have used {total / budget:.0%} of your {currency} {budget:,.0f} monthly budget.")
+        elif alert['level'] == 'exceeded':
+            suggestions.append(f"⚠️  Alert: High spending in {category} ({currency} {total:,.0f} > Limit {budget:,.0f}).")
+        else:
+            suggestions.append(f"🔔 Heads up: {category} is at {total / budget:.0%} of its {currency} {budget:,.0f} budget.")
     
     if not suggestions:
         suggestions.append("✅ Great job! Your spending is within limits.")
         
     return suggestions
 
+@cached_per_user
 def predict_next_month_spending(user_id):
-    """Predicts next month's spending using Linear Regression on daily totals."""
+    """
+    Predicts next month's spending: known recurring bills due in the next 30
+    days, plus a Linear Regression trend over this month's other daily totals.
+    """
     try:
-        from sklearn.linear_model import LinearRegression
-        import numpy as np
-        import pandas as pd
+        from . import recurring
+        
+        series = database.get_recurring_series(user_id)
+        bills = recurring.expected_total(series)
         
-        # Get daily spending
-        daily = get_daily_spending(user_id)
+        # Daily spending, leaving out the entries of detected bills
+        known = {(s['series_key'], s['category']) for s in series}
+        current_month = datetime.now().strftime("%Y-%m")
+        daily = expense_store.get_columns(user_id).daily_totals(current_month, exclude_groups=known)
         
         # Scenario 1: No Data
         if not daily:
-            return 0
+            return round(bills, 2)
             
         # Scenario 2: Only 1 Day of Data (Simple Extrapolation)
         if len(daily) == 1:
             val = list(daily.values())[0]
-            return val * 30 # Simple projection
+            return round(val * 30 + bills, 2) # Simple projection
             
         # Scenario 3: 2+ Days (Linear Regression)
             
         # Prepare data: X = Day number, y = Cumulative Amount
         # (Using cumulative gives a smoother trend for monthly projection)
-        df = pd.DataFrame(list(daily.items()), columns=['date', 'amount'])
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
-        df['day'] = (df['date'] - df['date'].min()).dt.days
-        df['cumulative'] = df['amount'].cumsum()
+        days = np.array([database.day_number(d) for d in daily])
+        X = days - days.min()
+        y = np.cumsum(list(daily.values()))
         
-        X = df[['day']]
-        y = df['cumulative']
-        
-        model = LinearRegression()
-        model.fit(X, y)
-        
-        # Predict for day 30
-        next_val = model.predict([[30]])[0]
-        return max(0, round(next_val, 2))
+        with phase("ml"):
+            # Least-squares line (what LinearRegression fits for one feature)
+            slope, intercept = np.polyfit(X, y, 1)
+            
+            # Predict for day 30
+            next_val = slope * 30 + intercept
+        return round(max(0, next_val) + bills, 2)
     except Exception as e:
         print(f"Prediction Error: {e}")
         return 0
 
+@cached_per_user
 def detect_anomalies(user_id):
     """Detects unusual expenses using Isolation Forest."""
     try:
-        from sklearn.ensemble import IsolationForest
-        import pandas as pd
+        from . import isolation
         
-        expenses = database.get_expenses(user_id=user_id)
-        if len(expenses) < 5:
+        ids, amounts = expense_store.get_columns(user_id).amounts()
+        if len(amounts) < 5:
             return []
-            
-        df = pd.DataFrame([{'amount': e['amount'], 'id': e['id'], 'text': e['expense_text']} for e in expenses])
         
         # Train on 'amount'
-        model = IsolationForest(contamination=0.05, random_state=42)
-        df['anomaly'] = model.fit_predict(df[['amount']])
+        with phase("ml"):
+            scores = concurrency.run_cpu_bound(isolation.score_samples, amounts)
         
-        # -1 indicates anomaly
-        anomalies = df[df['anomaly'] == -1]
+        # The lowest 5% of scores (contamination=0.05)
+        flagged = np.flatnonzero(scores < np.percentile(scores, 5))
+        texts = database.get_expense_texts(user_id, [int(ids[i]) for i in flagged])
+        currency = profiles.get_profile(user_id).currency
         results = []
-        for _, row in anomalies.iterrows():
-            results.append(f"⚠️ Anomaly: {row['text']} (PKR {row['amount']}) seems unusual.")
+        for i in flagged:
+            results.append(f"⚠️ Anomaly: {texts.get(int(ids[i]), '')} ({currency} {amounts[i]}) seems unusual.")
             
         return results
     except Exception as e:
         print(f"Anomaly Error: {e}")
         return []
 
+@cached_per_user
 def get_daily_spending(user_id):
     """Calculates total spending per day for the current month for a user."""
     current_month = datetime.now().strftime("%Y-%m")
-    expenses = database.get_expenses(user_id=user_id, month=current_month)
-    
-    daily = {}
-    for row in expenses:
-        day = row['date'].split(" ")[0]
-        amt = row['amount']
-        daily[day] = daily.get(day, 0) + amt
-    
-    return dict(sorted(daily.items()))
+    return expense_store.get_columns(user_id).daily_totals(current_month)
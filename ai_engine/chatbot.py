@@ -1,5 +1,6 @@
 import re
 import database
+import profiles
 from . import analytics
 
 def process_query(text, user_id, username="User"):
@@ -21,7 +22,8 @@ def process_query(text, user_id, username="User"):
     # Intent: Prediction
     if "predict" in text or "next month" in text or "forecast" in text:
         prediction = analytics.predict_next_month_spending(user_id)
-        return f"Based on your current trend, I predict you will spend around **PKR {prediction}** next month. 🔮"
+        currency = profiles.get_profile(user_id).currency
+        return f"Based on your current trend, I predict you will spend around **{currency} {prediction}** next month. 🔮"
         
     # Intent: Anomalies
     if "weird" in text or "anomaly" in text or "strange" in text:
@@ -39,7 +41,8 @@ def process_query(text, user_id, username="User"):
 
 def _handle_total_query(user_id):
     total = analytics.get_monthly_total(user_id)
-    return f"You have spent a total of **PKR {total}** this month."
+    currency = profiles.get_profile(user_id).currency
+    return f"You have spent a total of **{currency} {total}** this month."
 
 def _handle_category_query(text, user_id):
     breakdown = analytics.get_category_breakdown(user_id)
@@ -64,7 +67,8 @@ def _handle_category_query(text, user_id):
     
     if target != "Unknown":
         amount = breakdown.get(target, 0)
-        return f"You have spent **PKR {amount}** on {target}."
+        currency = profiles.get_profile(user_id).currency
+        return f"You have spent **{currency} {amount}** on {target}."
     
     return "I couldn't identify the category. Try checking your dashboard."
 
@@ -76,6 +80,7 @@ def _generate_smart_analysis(user_id, username):
     breakdown = analytics.get_category_breakdown(user_id)
     anomalies = analytics.detect_anomalies(user_id)
     forecast = analytics.predict_next_month_spending(user_id)
+    currency = profiles.get_profile(user_id).currency
     
     # 1. Find Highest Category
     if not breakdown:
@@ -89,7 +94,7 @@ def _generate_smart_analysis(user_id, username):
     response = f"📊 **Financial Health Report for {username}**<br><br>"
     
     # Overview
-    response += f"You have spent **PKR {total}** so far. Based on your current pace, I forecast you'll hit **PKR {forecast}** by next month.<br><br>"
+    response += f"You have spent **{currency} {total}** so far. Based on your current pace, I forecast you'll hit **{currency} {forecast}** by next month.<br><br>"
     
     # Insight
     response += f"⚠️ **Key Insight:** Your biggest expense is **{highest_cat}** ({percentage}% of total). "
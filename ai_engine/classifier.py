@@ -1,22 +1,176 @@
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import SGDClassifier
-from sklearn.pipeline import make_pipeline
-import joblib
 import os
+from collections import Counter
+
+import numpy as np
+
+from profiling import phase
 
 # Save model in the ai_engine directory or root
 MODEL_FILE = os.path.join(os.path.dirname(__file__), "expense_model.pkl")
+# The same model as plain arrays, which the app loads without scikit-learn
+COMPILED_FILE = os.path.splitext(MODEL_FILE)[0] + ".npz"
+
+# Predictions less confident than this are stored flagged for review (see history's review queue)
+REVIEW_THRESHOLD = float(os.environ.get("REVIEW_THRESHOLD", "0.6"))
+
+def needs_review(confidence):
+    return confidence < REVIEW_THRESHOLD
+
+def build_pipeline(ngram_range=(2, 5), loss='modified_huber', alpha=0.0001, analyzer='char_wb'):
+    """
+    Advanced NLP: Character N-Grams + SVM
+    analyzer='char_wb': Looks at inside patterns of words (e.g. "book" inside "notebook")
+    ngram_range=(2, 5): Learns patterns of 2 to 5 letters.
+    The defaults are the hand-picked config; ai_engine.train searches around them.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import make_pipeline
+    return make_pipeline(
+        TfidfVectorizer(analyzer=analyzer, ngram_range=tuple(ngram_range), min_df=1),
+        SGDClassifier(loss=loss, alpha=alpha, random_state=42) # SVM with probabilities
+    )
+
+def _rule_override(text_lower):
+    """
+    We keep rules ONLY for things regular patterns can't catch (like "Oil").
+    Returns a category, or None to let the model decide.
+    """
+    # Oil Ambiguity Rule
+    if "oil" in text_lower:
+        if any(x in text_lower for x in ["engine", "mobil", "car", "bike", "brake", "change", "filter", "zong"]):
+            return "Transportation"
+        if not "cooking" in text_lower:
+            return "Food & Dining" # Default (Cooking Oil)
+    return None
+
+class CompiledModel:
+    """
+    A trained char_wb TF-IDF + linear classifier pipeline reduced to its arrays.
+    predict() and predict_proba() give the same results as the pipeline, using
+    only NumPy, so serving a request doesn't import scikit-learn (or the
+    pandas it pulls in).
+    """
+
+    # Losses SGDClassifier has predict_proba for
+    LOSSES = ("modified_huber", "log_loss")
+
+    def __init__(self, terms, idf, coef, intercept, classes, ngram_range, loss="modified_huber"):
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.idf = idf
+        self.coef_t = np.ascontiguousarray(coef.T)  # features x classes
+        self.intercept = intercept
+        self.classes = classes
+        self.ngram_range = (int(ngram_range[0]), int(ngram_range[1]))
+        self.loss = str(loss)
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """Raises ValueError for pipelines predict() can't reproduce."""
+        vectorizer, model = pipeline.steps[0][1], pipeline.steps[-1][1]
+        params = vectorizer.get_params()
+        if (len(pipeline.steps) != 2 or params['analyzer'] != 'char_wb' or params['norm'] != 'l2'
+                or not params['use_idf'] or params['sublinear_tf'] or params['binary']
+                or params['preprocessor'] is not None or params['strip_accents'] or not params['lowercase']):
+            raise ValueError("only the default char_wb TF-IDF pipeline can be compiled")
+        if model.loss not in cls.LOSSES:
+            raise ValueError(f"loss {model.loss!r} has no probabilities")
+        terms = [None] * len(vectorizer.vocabulary_)
+        for term, index in vectorizer.vocabulary_.items():
+            terms[index] = term
+        return cls(np.array(terms), vectorizer.idf_, model.coef_, model.intercept_, model.classes_,
+                   vectorizer.ngram_range, model.loss)
+
+    def save(self, path):
+        np.savez(path, terms=self.terms, idf=self.idf, coef=self.coef_t.T, intercept=self.intercept,
+                 classes=self.classes, ngram_range=np.array(self.ngram_range), loss=np.array(self.loss))
+
+    @classmethod
+    def load(cls, path):
+        """Raises ValueError for a file saved before the loss was recorded."""
+        with np.load(path, allow_pickle=False) as data:
+            if 'loss' not in data:
+                raise ValueError("compiled model has no loss; recompile it")
+            return cls(data['terms'], data['idf'], data['coef'], data['intercept'], data['classes'], data['ngram_range'],
+                       data['loss'])
+
+    def _ngrams(self, text):
+        """TfidfVectorizer's char_wb analyzer: padded character n-grams inside each word."""
+        min_n, max_n = self.ngram_range
+        grams = []
+        for word in text.lower().split():
+            word = " " + word + " "
+            for n in range(min_n, max_n + 1):
+                grams.extend(word[i:i + n] for i in range(max(1, len(word) - n + 1)))
+                if len(word) <= n:  # a short word is counted once
+                    break
+        return grams
+
+    def decision_function(self, texts):
+        """Scores, one row per text (one column for two classes, as in scikit-learn)."""
+        rows = []
+        for text in texts:
+            counts = Counter(self.vocabulary[g] for g in self._ngrams(text) if g in self.vocabulary)
+            scores = self.intercept.copy()
+            if counts:
+                columns = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+                weights = np.fromiter(counts.values(), dtype=float, count=len(counts)) * self.idf[columns]
+                scores += weights @ self.coef_t[columns] / np.sqrt(weights @ weights)
+            rows.append(scores)
+        return np.array(rows).reshape(len(rows), len(self.intercept))
+
+    def _labels(self, scores):
+        if len(self.classes) == 2:
+            return self.classes[(scores[:, 0] > 0).astype(int)]
+        return self.classes[np.argmax(scores, axis=1)]
+
+    def _proba(self, scores):
+        """SGDClassifier.predict_proba from the scores."""
+        if self.loss == "log_loss":
+            prob = 1 / (1 + np.exp(-scores))
+        else:
+            prob = (np.clip(scores, -1, 1) + 1) / 2
+        if len(self.classes) == 2:
+            return np.hstack([1 - prob, prob])
+        total = prob.sum(axis=1, keepdims=True)
+        # modified_huber: every score at -1 or below means no class is preferred
+        prob[total[:, 0] == 0] = 1
+        total[total == 0] = len(self.classes)
+        return prob / total
+
+    def predict(self, texts):
+        return self._labels(self.decision_function(texts))
+
+    def predict_proba(self, texts):
+        return self._proba(self.decision_function(texts))
+
+    def predict_with_confidence(self, texts):
+        """(labels, probability of each label), from one pass over the texts."""
+        scores = self.decision_function(texts)
+        labels, prob = self._labels(scores), self._proba(scores)
+        return labels, prob[np.arange(len(labels)), np.searchsorted(self.classes, labels)]
+
+def _predict_with_confidence(model, texts):
+    """predict_with_confidence for a compiled model or a scikit-learn pipeline."""
+    if isinstance(model, CompiledModel):
+        return model.predict_with_confidence(texts)
+    labels, prob = model.predict(texts), model.predict_proba(texts)
+    return labels, prob[np.arange(len(labels)), np.searchsorted(model.classes_, labels)]
+
+def compile_model(pipeline):
+    """Writes COMPILED_FILE for a trained pipeline; returns the CompiledModel, or None if it can't be compiled."""
+    try:
+        compiled = CompiledModel.from_pipeline(pipeline)
+    except ValueError as e:
+        print(f"Model not compiled: {e}")
+        return None
+    compiled.save(COMPILED_FILE)
+    return compiled
 
 class ExpenseClassifier:
     def __init__(self):
-        # Advanced NLP: Character N-Grams + SVM
-        # analyzer='char_wb': Looks at inside patterns of words (e.g. "book" inside "notebook")
-        # ngram_range=(2, 5): Learns patterns of 2 to 5 letters.
-        self.pipeline = make_pipeline(
-            TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 5), min_df=1),
-            SGDClassifier(loss='modified_huber', random_state=42) # SVM with probabilities
-        )
+        self.pipeline = None
         self.is_trained = False
 
     def train(self):
@@ -24,10 +178,12 @@ class ExpenseClassifier:
         from .pakistani_data import TRAINING_DATA
         
         print("Training Neuro-NLP Model...")
-        df = pd.DataFrame(TRAINING_DATA, columns=["text", "category"])
+        texts = [text for text, _ in TRAINING_DATA]
+        categories = [category for _, category in TRAINING_DATA]
         
         # Train on the patterns
-        self.pipeline.fit(df['text'], df['category'])
+        self.pipeline = build_pipeline()
+        self.pipeline.fit(texts, categories)
         self.is_trained = True
         self.save_model()
         print("Neuro-NLP Model trained.")
@@ -36,35 +192,71 @@ class ExpenseClassifier:
         """
         Predicts category using Character Pattern Recognition (Fuzzy AI).
         Understand words it has never seen before if they share roots.
+        Returns (category, confidence): the model's probability of that
+        category, 1.0 when a rule decided it.
         """
         if not self.is_trained:
             self.load_model()
-            
+
         text_lower = text.lower().strip()
-        
+
         # --- LAYER 1: Rule-Based Overrides (Specific Ambiguities) ---
-        # We keep this ONLY for things regular patterns can't catch (like "Oil")
-        
-        # Oil Ambiguity Rule
-        if "oil" in text_lower:
-            if any(x in text_lower for x in ["engine", "mobil", "car", "bike", "brake", "change", "filter", "zong"]):
-                return "Transportation"
-            if not "cooking" in text_lower: 
-                return "Food & Dining" # Default (Cooking Oil)
+        override = _rule_override(text_lower)
+        if override:
+            return override, 1.0
 
         # --- LAYER 2: Advanced Pattern Prediction ---
         # This will catch "Textbooks" as Education because it knows "Books"
         # This will catch "Ciggies" as Food because it knows "Cigarettes"
-        prediction = self.pipeline.predict([text_lower])[0]
-        return prediction
+        with phase("classify"):
+            labels, confidences = _predict_with_confidence(self.pipeline, [text_lower])
+        return str(labels[0]), float(confidences[0])
+
+    def predict_batch(self, texts):
+        """
+        Same as predict for a list of texts, but the model runs once over the
+        whole batch, which is much cheaper per item than calling predict in a loop.
+        Returns a list of (category, confidence).
+        """
+        if not self.is_trained:
+            self.load_model()
+
+        lowered = [t.lower().strip() for t in texts]
+        results = [(override, 1.0) if override else None for override in map(_rule_override, lowered)]
+        pending = [i for i, result in enumerate(results) if result is None]
+        if pending:
+            with phase("classify"):
+                labels, confidences = _predict_with_confidence(self.pipeline, [lowered[i] for i in pending])
+            for i, label, confidence in zip(pending, labels, confidences):
+                results[i] = (str(label), float(confidence))
+        return results
 
     def save_model(self):
+        import joblib
         joblib.dump(self.pipeline, MODEL_FILE)
+        compiled = compile_model(self.pipeline)
+        if compiled is not None:
+            self.pipeline = compiled
 
     def load_model(self):
+        """
+        Loads the compiled model when it is up to date with MODEL_FILE. Otherwise
+        the pickled pipeline is loaded (this needs scikit-learn) and compiled for
+        the next start.
+        """
+        if os.path.exists(COMPILED_FILE) and (not os.path.exists(MODEL_FILE)
+                                              or os.path.getmtime(COMPILED_FILE) >= os.path.getmtime(MODEL_FILE)):
+            try:
+                self.pipeline = CompiledModel.load(COMPILED_FILE)
+                self.is_trained = True
+                return
+            except ValueError as e:
+                print(f"Compiled model not used: {e}")
         if os.path.exists(MODEL_FILE):
+            import joblib
             self.pipeline = joblib.load(MODEL_FILE)
             self.is_trained = True
+            self.pipeline = compile_model(self.pipeline) or self.pipeline
         else:
             print("Model file not found. Training new model...")
             self.train()
@@ -0,0 +1,53 @@
+"""
+Isolation Forest for one-dimensional data (expense amounts), in NumPy.
+
+Same algorithm and scoring convention as sklearn.ensemble.IsolationForest
+(random splits on random subsamples; score_samples is minus the anomaly
+score, so lower means more unusual). Scikit-learn isn't needed on the serving
+path for it. With a single feature every tree just cuts the number line into
+intervals, so a tree is a sorted list of cut points plus the path length of
+each interval, and scoring is one searchsorted per tree.
+"""
+import math
+import random
+
+import numpy as np
+
+def _average_path_length(n):
+    """c(n): average path length of an unsuccessful search in a binary search tree of n points."""
+    if n <= 1:
+        return 0.0
+    if n == 2:
+        return 1.0
+    return 2.0 * (math.log(n - 1) + np.euler_gamma) - 2.0 * (n - 1) / n
+
+def _build(sample, depth, max_depth, rng, cuts, lengths):
+    """Splits a sorted sample until points are isolated; appends cuts and leaf path lengths left to right."""
+    if depth >= max_depth or len(sample) <= 1 or sample[0] == sample[-1]:
+        lengths.append(depth + _average_path_length(len(sample)))
+        return
+    threshold = rng.uniform(sample[0], sample[-1])
+    split = int(np.searchsorted(sample, threshold, side='left'))
+    if split == 0:  # drew the minimum itself: cut above it instead
+        split = int(np.searchsorted(sample, sample[0], side='right'))
+        threshold = sample[split]
+    _build(sample[:split], depth + 1, max_depth, rng, cuts, lengths)
+    cuts.append(threshold)
+    _build(sample[split:], depth + 1, max_depth, rng, cuts, lengths)
+
+def score_samples(values, n_trees=100, sample_size=256, seed=42):
+    """Scores like IsolationForest.score_samples: -2 ** (-mean path length / c(sample size))."""
+    values = np.asarray(values, dtype=float)
+    size = min(sample_size, len(values))
+    max_depth = math.ceil(math.log2(max(size, 2)))
+    rng = random.Random(seed)
+    # Amounts repeat a lot: walk each distinct value once
+    distinct, inverse = np.unique(values, return_inverse=True)
+    depths = np.zeros(len(distinct))
+    for _ in range(n_trees):
+        sample = np.sort(values[rng.sample(range(len(values)), size)])
+        cuts, lengths = [], []
+        _build(sample, 0, max_depth, rng, cuts, lengths)
+        # Values below a cut go left, as in sklearn (x < threshold)
+        depths += np.asarray(lengths)[np.searchsorted(cuts, distinct, side='right')]
+    return -(2.0 ** (-(depths / n_trees) / _average_path_length(size)))[inverse]
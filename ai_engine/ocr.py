@@ -1,21 +1,206 @@
-import pytesseract
-from PIL import Image
-import re
+"""
+Receipt OCR: text from an uploaded file, and expenses from that text.
+
+An upload can hold several pages: a PDF (bank statements), a multi-frame
+TIFF, or one photo with a few receipts laid out on a table. extract_pages
+splits it into page images in reading order, sends them to a process pool
+(OCR_PROCESSES processes per worker, started on first use) for Tesseract,
+and returns one text per page in the same order. PDF pages that carry a text
+layer are read from it without OCR. Photos are split into receipts by
+find_receipts: paper is brighter than what it lies on, so the columns and
+rows without paper separate one receipt from the next.
+
+PDFs are opened with pypdfium2; without it a PDF upload reads as no text.
+"""
+import multiprocessing
 import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from profiling import phase
 
 # Set tesseract path if needed (e.g. Windows default)
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 # We will assume it's in PATH or user can configure it.
 
-def extract_text(image_path):
-    """Extracts text from an image file."""
+OCR_PROCESSES = int(os.environ.get("OCR_PROCESSES", os.cpu_count() or 1))
+OCR_MAX_PAGES = int(os.environ.get("OCR_MAX_PAGES", "50"))
+PDF_DPI = 300
+# A PDF page with at least this much text in its text layer is not OCR'd
+MIN_TEXT_LAYER_CHARS = 20
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded web worker can copy held locks into the child
+            _pool = ProcessPoolExecutor(max_workers=OCR_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def ocr_image(image):
+    """Tesseract on one page image. Runs in the pool processes."""
+    # Imported here: pytesseract loads pandas when it's installed, and only uploads need it
+    import pytesseract
     try:
-        image = Image.open(image_path)
-        text = pytesseract.image_to_string(image)
-        return text
+        return pytesseract.image_to_string(image)
+    except (pytesseract.TesseractError, pytesseract.TesseractNotFoundError) as e:
+        # pytesseract's exceptions can't be unpickled in the parent, which breaks the pool
+        raise RuntimeError(str(e)) from None
+
+# --- Pages ---
+
+def _is_pdf(path):
+    with open(path, "rb") as f:
+        return f.read(5) == b"%PDF-"
+
+def _pdf_pages(path):
+    """Each page as its text layer (str) if it has one, else as a rendered grayscale image."""
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(path)
+    try:
+        for index in range(min(len(pdf), OCR_MAX_PAGES)):
+            page = pdf[index]
+            text = page.get_textpage().get_text_bounded()
+            if len(text.strip()) >= MIN_TEXT_LAYER_CHARS:
+                yield text
+            else:
+                yield page.render(scale=PDF_DPI / 72, grayscale=True).to_pil()
+            page.close()
+    finally:
+        pdf.close()
+
+def _image_pages(path):
+    """Each frame of an image file, and within it each receipt find_receipts locates."""
+    from PIL import Image, ImageOps, ImageSequence
+
+    with Image.open(path) as image:
+        count = 0
+        for frame in ImageSequence.Iterator(image):
+            page = ImageOps.exif_transpose(frame.convert("L"))
+            for box in find_receipts(page):
+                yield page.crop(box)
+                count += 1
+            if count >= OCR_MAX_PAGES:
+                break
+
+def load_pages(path):
+    """The pages of an upload in reading order: texts (PDF text layers) and PIL images to OCR."""
+    if _is_pdf(path):
+        try:
+            return list(_pdf_pages(path))
+        except ImportError:
+            print("OCR Error: reading PDFs needs pypdfium2")
+            return []
+    return list(_image_pages(path))
+
+def _otsu(hist):
+    """Threshold between dark and bright pixels that best separates the two (Otsu's method)."""
+    import numpy as np
+
+    hist = hist.astype(np.float64)
+    levels = np.arange(256)
+    weight = np.cumsum(hist)
+    total = weight[-1]
+    mean = np.cumsum(hist * levels)
+    between = (mean[-1] * weight - mean * total) ** 2 / np.maximum(weight * (total - weight), 1)
+    return int(np.argmax(between))
+
+def _split(mask, axis, min_gap, min_size):
+    """(start, end) runs along `axis` that hold paper, cut at gaps of min_gap or more without paper."""
+    import numpy as np
+
+    filled = mask.mean(axis=1 - axis) > 0.02
+    runs, start, gap = [], None, 0
+    for i, has_paper in enumerate(np.append(filled, False)):
+        if has_paper:
+            if start is None:
+                start = i
+            gap = 0
+        elif start is not None:
+            gap += 1
+            if gap >= min_gap or i == len(filled):
+                end = i - gap + 1
+                if end - start >= min_size:
+                    runs.append((start, end))
+                start, gap = None, 0
+    return runs
+
+def find_receipts(image, max_side=600):
+    """
+    Boxes (left, top, right, bottom) of the receipts on a grayscale photo,
+    left to right and top to bottom, each trimmed to its paper. A scan or a
+    cropped photo gives one box.
+    """
+    import numpy as np
+
+    small = image.copy()
+    small.thumbnail((max_side, max_side))
+    pixels = np.asarray(small)
+    mask = pixels > _otsu(np.bincount(pixels.ravel(), minlength=256))
+    full = [(0, 0, image.width, image.height)]
+    height, width = mask.shape
+    boxes = []
+    # Side by side first, then stacked within each column of receipts
+    for left, right in _split(mask, 1, max(2, width // 50), width // 10):
+        column = mask[:, left:right]
+        for top, bottom in _split(column, 0, max(2, height // 50), height // 10):
+            # Trim the box to the paper it holds
+            rows = np.flatnonzero(column[top:bottom].mean(axis=1) > 0.02)
+            cols = np.flatnonzero(column[top:bottom].mean(axis=0) > 0.02)
+            boxes.append((left + cols[0], top + rows[0], left + cols[-1] + 1, top + rows[-1] + 1))
+    if not boxes:
+        return full
+    scale = image.width / width
+    pad = 4
+    return [(max(0, int((l - pad) * scale)), max(0, int((t - pad) * scale)),
+             min(image.width, int((r + pad) * scale)), min(image.height, int((b + pad) * scale)))
+            for l, t, r, b in boxes]
+
+# --- Text ---
+
+def extract_pages(path, processes=None):
+    """
+    Text of each page of an upload, in order (see the module docstring).
+    Images are OCR'd in parallel when there are several. Returns [] if the
+    file can't be read.
+    """
+    try:
+        with phase("ocr"):
+            pages = load_pages(path)
+            images = [(i, page) for i, page in enumerate(pages) if not isinstance(page, str)]
+            processes = OCR_PROCESSES if processes is None else processes
+            if len(images) <= 1 or processes <= 1:
+                texts = [ocr_image(page) for _, page in images]
+            else:
+                try:
+                    texts = list(_get_pool().map(ocr_image, [page for _, page in images]))
+                except BrokenProcessPool:
+                    # A pool process died (e.g. killed for memory); start over once
+                    _reset_pool()
+                    texts = list(_get_pool().map(ocr_image, [page for _, page in images]))
+            for (i, _), text in zip(images, texts):
+                pages[i] = text
+        return pages
     except Exception as e:
         print(f"OCR Error: {e}")
-        return ""
+        return []
+
+def extract_text(image_path):
+    """Extracts the text of an upload, its pages joined in order."""
+    return "\n".join(extract_pages(image_path))
 
 def parse_receipt(text):
     """
@@ -54,7 +239,10 @@ def parse_receipt_items(text):
     """
     Advanced OCR: Extracts multiple items from a receipt.
     Returns a list of {'desc': str, 'amount': float}
+    `text` can also be the page texts from extract_pages; their items come in page order.
     """
+    if isinstance(text, (list, tuple)):
+        return [item for page in text for item in parse_receipt_items(page)]
     if not text:
         return []
 
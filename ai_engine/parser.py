@@ -0,0 +1,258 @@
+"""
+Natural-language expense parser shared by the web app and the CLI.
+
+    parse_input("pizza 700 and coke 150")        -> [("pizza", 700.0), ("coke", 150.0)]
+    parse_input("Rs 1.5k groceries, 2,500 rent") -> [("groceries", 1500.0), ("rent", 2500.0)]
+    parse_input("milk 2L 300\n2x chai 40")       -> [("milk 2L", 300.0), ("chai", 80.0)]
+
+The text is tokenized in one regex scan. Each line's tokens are then grouped
+into descriptions and amounts, and each amount is paired with the description
+next to it. Rules:
+- Amounts can come before or after the description. Each line (or ';' clause)
+  is read on its own.
+- Accepted forms: "2,500" and "1,50,000"; k / thousand / lac / lakh / crore
+  suffixes; Rs / PKR / rupees / ₨ markers and a "/-" tail.
+- Units such as "2kg", "5L" or "500 ml" stay in the description.
+- "2x" and "x2" multiply the amount. "2x" applies to what follows and "x2" to
+  what precedes.
+- "and", "&", "+" and "," separate items only between items. Inside a
+  description they are kept ("bread and butter 200").
+- A small bare count such as the "2" in "2 pizza 700" stays in the
+  description when the line has more numbers than descriptions.
+- A linking word between an amount and its description is dropped:
+  "500 for petrol" and "petrol for 500" both give ("petrol", 500.0).
+- Nothing is dropped silently: an amount with no description left to pair
+  with (the second 300 of "biryani 300 300"), a description without an
+  amount, or a quantity with nothing to apply to ("x 100") is appended to
+  the `leftovers` list when one is passed, so the caller can report it.
+"""
+import re
+
+MULTIPLIERS = {
+    'k': 1_000, 'thousand': 1_000,
+    'lac': 100_000, 'lacs': 100_000, 'lakh': 100_000, 'lakhs': 100_000,
+    'crore': 10_000_000, 'crores': 10_000_000, 'cr': 10_000_000,
+}
+
+# Bare numbers below this can be item counts ("2 pizza 700") rather than prices
+MAX_COUNT = 100
+
+# Dropped from the side of a description that touches its amount ("500 for petrol")
+LINKING_WORDS = {'for', 'on', 'at'}
+
+_LETTER = r'[^\W\d_]'
+_NUM = r'\d{1,3}(?:,\d{2,3})*,\d{3}(?!\d)(?:\.\d+)?|\d+(?:\.\d+)?|\.\d+'
+_CUR = rf'(?<!{_LETTER})(?:rs|pkr|rupees?|inr)(?:\.|(?!{_LETTER}))|₨'
+_UNIT = r'kgs?|gms?|grams?|g|ltrs?|litres?|liters?|l|ml|dozen|doz|pcs?|pieces?|packs?|pkts?|packets?|units?'
+_MULT = '|'.join(sorted(MULTIPLIERS, key=len, reverse=True))
+_DIGITS_RE = re.compile(r'\d+')
+
+# Leading blanks are folded into each match so finditer never stops on whitespace.
+# Plain words are tried first since they are the most common token.
+_TOKEN_RE = re.compile(rf'''[ \t]*(?:
+    (?P<word>(?!(?:and|rs|pkr|rupees?|inr)(?!{_LETTER})|[x×][ \t]?\d){_LETTER}[\w'’.-]*)
+  | (?P<brk>[\r\n;]+)
+  | (?P<unit>(?:{_NUM})[ \t]?(?:{_UNIT})(?!{_LETTER}|\d))
+  | (?P<qty_before>\d+[ \t]?[x×](?!{_LETTER}))
+  | (?P<qty_after>[x×][ \t]?\d+(?![\w.]))
+  | (?P<amount>(?:(?P<cur1>{_CUR})[ \t]*)?
+      (?P<num>{_NUM})(?:[ \t]?(?P<mult>{_MULT})(?!{_LETTER}|\d))?
+      (?:[ \t]*(?P<cur2>/-|{_CUR}))?
+      (?![\w]))
+  | (?P<conn>[,+&]|and(?![\w]))
+  | (?P<alnum>[\w'’-]*{_LETTER}[\w'’.-]*)
+)''', re.IGNORECASE | re.VERBOSE)
+
+class _Connector(str):
+    """An "and" / "&" / "+" / "," kept inside a description run."""
+    __slots__ = ()
+
+class _Stray(str):
+    """A quantity with nothing on its line to apply to ("x 100")."""
+    __slots__ = ()
+
+class _Run:
+    """Consecutive description words, with interior connectors kept so the run can be split."""
+
+    __slots__ = ('words', 'qty', 'consumed')
+
+    def __init__(self, words=None):
+        self.words = words if words is not None else []
+        self.qty = 1
+        self.consumed = False
+
+    def has_connector(self):
+        return any(isinstance(w, _Connector) for w in self.words)
+
+    def split_first(self):
+        """Cuts the run at its first connector; returns the left part and keeps the rest."""
+        idx = next(i for i, w in enumerate(self.words) if isinstance(w, _Connector))
+        left = _Run(self.words[:idx])
+        left.qty = self.qty
+        self.words, self.qty = self.words[idx + 1:], 1
+        return left
+
+    def strip_linking(self, leading):
+        """Drops linking words from the start (or end) of the run, keeping at least one word."""
+        idx = 0 if leading else -1
+        while len(self.words) > 1 and not isinstance(self.words[idx], _Connector) \
+                and self.words[idx].lower() in LINKING_WORDS:
+            del self.words[idx]
+
+    def text(self):
+        out = []
+        for w in self.words:
+            if w == ',' and out:
+                out[-1] += ','
+            else:
+                out.append(w)
+        return ' '.join(out)
+
+class _Amount:
+    __slots__ = ('text', 'value', 'marked', 'qty', 'joined_next', 'paired')
+
+    def __init__(self, text, value, marked):
+        self.text = text
+        self.value = value
+        self.marked = marked        # had a currency marker or a k/lac suffix
+        self.qty = 1
+        self.joined_next = False    # a run follows with no connector in between
+        self.paired = False
+
+def _scan(text):
+    """
+    Single regex pass over the input. Yields one list of parts (_Run / _Amount)
+    per line or ';' clause, with connectors and quantities already attached.
+    """
+    parts = []
+    pending_conn = None
+    pending_qty = 1
+    pending_text = []  # the quantity tokens behind pending_qty
+    for m in _TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == 'word' or kind == 'alnum' or kind == 'unit':
+            word = m.group(kind)
+            if kind != 'unit':
+                word = word.rstrip('.')
+            last = parts[-1] if parts else None
+            if last.__class__ is _Run:
+                if pending_conn is not None:
+                    last.words.append(pending_conn)
+                last.words.append(word)
+                part = last
+            else:
+                part = _Run([word])
+                if last is not None and pending_conn is None:
+                    last.joined_next = True
+                parts.append(part)
+        elif kind == 'amount':
+            value = float(m.group('num').replace(',', ''))
+            mult = m.group('mult')
+            if mult:
+                value *= MULTIPLIERS[mult.lower()]
+            part = _Amount(m.group(kind), value, bool(mult or m.group('cur1') or m.group('cur2')))
+            parts.append(part)
+        elif kind == 'conn':
+            pending_conn = _Connector(m.group(kind))
+            continue
+        elif kind == 'qty_after':
+            # "x2" belongs to whatever precedes it
+            qty = int(_DIGITS_RE.search(m.group(kind)).group())
+            if parts:
+                parts[-1].qty *= qty
+            else:
+                pending_qty *= qty
+                pending_text.append(m.group(kind))
+            continue
+        elif kind == 'qty_before':
+            pending_qty *= int(_DIGITS_RE.search(m.group(kind)).group())
+            pending_text.append(m.group(kind))
+            continue
+        else:  # brk
+            yield _end_segment(parts, pending_qty, pending_text)
+            parts, pending_conn, pending_qty, pending_text = [], None, 1, []
+            continue
+        if pending_qty != 1:
+            part.qty *= pending_qty
+            pending_qty, pending_text = 1, []
+        pending_conn = None
+
+    yield _end_segment(parts, pending_qty, pending_text)
+
+def _end_segment(parts, pending_qty, pending_text):
+    """Applies a quantity left at the end of a line to the last part, or keeps it as a _Stray."""
+    if pending_qty != 1:
+        if parts:
+            parts[-1].qty *= pending_qty
+        else:
+            parts.append(_Stray(' '.join(pending_text)))
+    return parts
+
+def _is_count(part):
+    return not part.marked and part.qty == 1 and part.text.isdigit() and part.value < MAX_COUNT
+
+def _merge_leading_counts(parts):
+    """Folds bare numbers like the "2" in "2 pizza 700" into the description that follows them."""
+    excess = sum(isinstance(p, _Amount) for p in parts) - sum(isinstance(p, _Run) for p in parts)
+    if excess <= 0:
+        return parts
+    merged = []
+    i = 0
+    while i < len(parts):
+        part = parts[i]
+        if (excess > 0 and isinstance(part, _Amount) and part.joined_next and _is_count(part)
+                and i + 1 < len(parts)):
+            run = parts[i + 1]
+            run.words.insert(0, part.text)
+            merged.append(run)
+            excess -= 1
+            i += 2
+            continue
+        merged.append(part)
+        i += 1
+    return merged
+
+def _parse_segment(parts, items, leftovers):
+    parts = _merge_leading_counts(parts)
+    for i, part in enumerate(parts):
+        if not isinstance(part, _Amount):
+            continue
+        run = None
+        left = parts[i - 1] if i > 0 else None
+        right = parts[i + 1] if i + 1 < len(parts) else None
+        if isinstance(left, _Run) and not left.consumed:
+            run = left
+        elif isinstance(right, _Run):
+            following = parts[i + 2] if i + 2 < len(parts) else None
+            after = parts[i + 3] if i + 3 < len(parts) else None
+            if isinstance(following, _Amount) and not isinstance(after, _Run) and right.has_connector():
+                # "700 pizza and coke 150": the next amount has nothing else to describe it
+                run = right.split_first()
+            else:
+                run = right
+        if run is None or not run.words:
+            continue
+        run.strip_linking(leading=run is not left)
+        run.consumed = part.paired = True
+        amount = round(part.value * part.qty * run.qty, 2)
+        items.append((run.text(), amount))
+    if leftovers is not None:
+        for part in parts:
+            if isinstance(part, _Stray):
+                leftovers.append(str(part))
+            elif isinstance(part, _Amount) and not part.paired:
+                leftovers.append(part.text)
+            elif isinstance(part, _Run) and not part.consumed and part.words:
+                leftovers.append(part.text())
+
+def parse_input(user_input, leftovers=None):
+    """
+    Parses natural language input into one or more transactions.
+    Returns: List of (description, amount) tuples, in input order. Text that
+    didn't become part of an item is appended to `leftovers` if given.
+    """
+    items = []
+    for parts in _scan(user_input or ''):
+        if parts:
+            _parse_segment(parts, items, leftovers)
+    return items
@@ -0,0 +1,125 @@
+"""
+Detects recurring expenses (bills, rent, subscriptions) per user.
+
+Expenses are grouped by database.series_key (normalized description) and
+category. For a group, the gaps between entries are compared against a few
+standard periods at once, and the amounts must stay roughly stable. Detection
+runs incrementally: after each committed write only the touched groups are
+re-checked (database.on_expense_change), and the result is kept in the
+recurring_series table.
+
+    python -m ai_engine.recurring --user alice      # rescan one user's history
+"""
+from datetime import date
+
+import numpy as np
+
+import database
+
+PERIODS = ("weekly", "fortnightly", "monthly", "quarterly", "yearly")
+_PERIOD_DAYS = np.array([7.0, 14.0, 30.44, 91.31, 365.25])
+
+MIN_OCCURRENCES = 3
+TOLERANCE = 0.2        # a gap counts as regular within +-20% of the period
+MIN_REGULARITY = 0.75  # share of gaps that must be regular
+MAX_AMOUNT_CV = 0.35   # std / mean of the recent amounts
+HISTORY = 24           # entries per group looked at
+
+def _today():
+    return database.day_number(date.today().isoformat())
+
+def detect(days, amounts, today=None):
+    """
+    days: expenses.day numbers, oldest first; amounts: matching floats.
+    Returns the recurring_series fields (without keys/description), or None
+    if the group isn't periodic, its amounts vary too much, or it has stopped.
+    """
+    days = np.asarray(days, dtype=np.int64)
+    amounts = np.asarray(amounts, dtype=float)
+    # Several entries on one day count as one occurrence
+    days, starts = np.unique(days, return_index=True)
+    amounts = np.add.reduceat(amounts, starts)
+    if len(days) < MIN_OCCURRENCES:
+        return None
+
+    # gaps x periods: share of gaps within tolerance of each candidate period
+    gaps = np.diff(days).astype(float)
+    regular = (np.abs(gaps[:, None] / _PERIOD_DAYS[None, :] - 1) <= TOLERANCE).mean(axis=0)
+    best = int(np.argmax(regular))
+    if regular[best] < MIN_REGULARITY:
+        return None
+
+    recent = amounts[-6:]
+    mean = recent.mean()
+    cv = recent.std() / mean if mean > 0 else np.inf
+    if cv > MAX_AMOUNT_CV:
+        return None
+
+    period_days = float(_PERIOD_DAYS[best])
+    today = _today() if today is None else today
+    if today - days[-1] > 2 * period_days * (1 + TOLERANCE):
+        return None  # missed two cycles: cancelled
+
+    return {
+        "period": PERIODS[best],
+        "period_days": period_days,
+        "amount": round(float(np.median(amounts[-3:])), 2),
+        "occurrences": int(len(days)),
+        "confidence": round(float(regular[best] * (1 - cv)), 3),
+        "last_date": database.day_to_iso(int(days[-1])),
+        "next_date": database.day_to_iso(int(days[-1] + round(period_days))),
+    }
+
+def update_series(user_id, keys):
+    """Re-checks the given (series_key, category) groups of a user and stores the result."""
+    for key, category in keys:
+        if not key:
+            continue
+        rows = database.get_series_history(user_id, key, category, HISTORY)
+        rows = [r for r in rows if r['day'] is not None]
+        series = detect([r['day'] for r in rows], [r['amount_minor'] / 100 for r in rows]) if rows else None
+        if series is not None:
+            series["description"] = rows[-1]['expense_text']
+        database.save_series(user_id, key, category, series)
+
+def rescan(user_id):
+    """Full pass over a user's history (existing data, or after changing the detector settings)."""
+    keys = database.get_series_keys(user_id, MIN_OCCURRENCES)
+    keys |= {(r['series_key'], r['category']) for r in database.get_recurring_series(user_id)}
+    update_series(user_id, keys)
+    return database.get_recurring_series(user_id)
+
+def expected_total(series_rows, horizon_days=30, today=None):
+    """
+    Sum of the bills due in the next `horizon_days`. A bill that is overdue by
+    less than one period is still expected (it just hasn't been entered yet).
+    """
+    if not series_rows:
+        return 0.0
+    today = _today() if today is None else today
+    next_days = np.array([database.day_number(r['next_date']) for r in series_rows], dtype=float)
+    periods = np.array([r['period_days'] for r in series_rows])
+    amounts = np.array([r['amount'] for r in series_rows])
+    # Skip cycles that are more than a period overdue, then count due dates up to the horizon
+    first = next_days + np.maximum(0, np.ceil((today - periods - next_days) / periods)) * periods
+    due = np.where(first <= today + horizon_days, np.floor((today + horizon_days - first) / periods) + 1, 0)
+    return round(float((due * amounts).sum()), 2)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Rescan a user's expenses for recurring bills.")
+    parser.add_argument("--db", default=database.DB_NAME)
+    parser.add_argument("--user", required=True)
+    args = parser.parse_args(argv)
+    database.DB_NAME = args.db
+    database.init_db()
+    user_id = database.get_user_id(args.user)
+    if user_id is None:
+        parser.error(f"unknown user {args.user!r}")
+    for row in rescan(user_id):
+        print(f"{row['description']:<30} {row['category']:<24} {row['period']:<12} "
+              f"{row['amount']:>10,.0f}  next {row['next_date']}  ({row['occurrences']}x, confidence {row['confidence']})")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
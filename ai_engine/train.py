@@ -0,0 +1,175 @@
+"""
+Hyperparameter search for the expense classifier.
+
+    python -m ai_engine.train                       # grid search, save best model
+    python -m ai_engine.train --search random --n-iter 40
+    python -m ai_engine.train --max-latency-ms 0.5  # best model under a latency budget
+    python -m ai_engine.train --dry-run --report search.json
+    python -m ai_engine.train --feedback            # also learn the categories users confirmed
+
+Every config is scored with stratified k-fold cross-validation (accuracy and
+macro-F1), folds are evaluated in parallel across all cores with joblib, and
+single-prediction latency is then measured for each config in this process.
+The winner is refit on the full dataset and saved to MODEL_FILE (and as
+arrays to COMPILED_FILE), which ExpenseClassifier.load_model picks up on the
+next start.
+
+With --feedback the dataset also holds the categories users confirmed or
+corrected in the review queue (database.get_classifier_feedback, from
+EXPENSES_DB and its shards). A user's answer replaces the built-in label of
+the same text, and the latest answer for a text wins.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import joblib
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import StratifiedKFold
+
+from .classifier import MODEL_FILE, build_pipeline, compile_model
+from .pakistani_data import TRAINING_DATA
+
+# Only losses with predict_proba: the app relies on the classifier's probabilities
+GRID = {
+    "ngram_range": [(1, 3), (2, 4), (2, 5), (3, 5)],
+    "loss": ["modified_huber", "log_loss"],
+    "alpha": [1e-5, 1e-4, 1e-3],
+}
+
+METADATA_FILE = os.path.splitext(MODEL_FILE)[0] + ".json"
+
+def grid_configs():
+    keys = list(GRID)
+    return [dict(zip(keys, values)) for values in itertools.product(*(GRID[k] for k in keys))]
+
+def random_configs(n_iter, seed=42):
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(n_iter):
+        low = rng.randint(1, 3)
+        configs.append({
+            "ngram_range": (low, rng.randint(low + 1, 6)),
+            "loss": rng.choice(GRID["loss"]),
+            "alpha": float(10 ** rng.uniform(-6, -2)),
+        })
+    return configs
+
+def _score_fold(config, texts, labels, train_idx, test_idx):
+    pipeline = build_pipeline(**config)
+    pipeline.fit(texts[train_idx], labels[train_idx])
+    predicted = pipeline.predict(texts[test_idx])
+    return accuracy_score(labels[test_idx], predicted), f1_score(labels[test_idx], predicted, average="macro")
+
+def measure_latency(pipeline, texts, samples=200):
+    """Per-prediction latency in ms (one text per call, like ExpenseClassifier.predict)."""
+    picks = [texts[i % len(texts)] for i in range(samples)]
+    pipeline.predict([picks[0]])  # warm-up
+    timings = []
+    for text in picks:
+        start = time.perf_counter()
+        pipeline.predict([text])
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+def training_examples(feedback=False):
+    """(text, category) pairs: TRAINING_DATA, with the users' answers merged in when `feedback` is set."""
+    pairs = [(t.lower().strip(), c) for t, c in TRAINING_DATA]
+    if not feedback:
+        return pairs
+    import database
+    database.init_db()
+    answers = {text.lower().strip(): category for text, _, category, _ in database.get_classifier_feedback()}
+    return [(t, c) for t, c in pairs if t not in answers] + list(answers.items())
+
+def run_search(configs, cv=5, n_jobs=-1, examples=None):
+    examples = examples or training_examples()
+    texts = np.array([t for t, _ in examples], dtype=object)
+    labels = np.array([c for _, c in examples], dtype=object)
+    folds = list(StratifiedKFold(n_splits=cv, shuffle=True, random_state=42).split(texts, labels))
+
+    # All (config, fold) pairs in one parallel batch keeps every core busy
+    jobs = [(ci, fi) for ci in range(len(configs)) for fi in range(len(folds))]
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(_score_fold)(configs[ci], texts, labels, *folds[fi]) for ci, fi in jobs
+    )
+
+    results = []
+    for ci, config in enumerate(configs):
+        fold_scores = [score for (cj, _), score in zip(jobs, scores) if cj == ci]
+        pipeline = build_pipeline(**config).fit(texts, labels)
+        p50, p99 = measure_latency(pipeline, list(texts))
+        results.append({
+            "config": {**config, "ngram_range": list(config["ngram_range"])},
+            "accuracy": round(float(np.mean([a for a, _ in fold_scores])), 4),
+            "macro_f1": round(float(np.mean([f for _, f in fold_scores])), 4),
+            "latency_p50_ms": round(p50, 4),
+            "latency_p99_ms": round(p99, 4),
+        })
+    return results, texts, labels
+
+def pick_best(results, metric="macro_f1", max_latency_ms=None):
+    """Highest metric within the latency budget; faster config wins a tie."""
+    eligible = [r for r in results if max_latency_ms is None or r["latency_p50_ms"] <= max_latency_ms]
+    if not eligible:
+        return None
+    return max(eligible, key=lambda r: (r[metric], -r["latency_p50_ms"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--search", choices=["grid", "random"], default="grid")
+    parser.add_argument("--n-iter", type=int, default=30, help="Configs to sample for --search random")
+    parser.add_argument("--cv", type=int, default=5)
+    parser.add_argument("--jobs", type=int, default=-1, help="joblib workers (-1 = all cores)")
+    parser.add_argument("--metric", choices=["macro_f1", "accuracy"], default="macro_f1")
+    parser.add_argument("--max-latency-ms", type=float, help="Only consider configs with p50 latency under this")
+    parser.add_argument("--report", help="Write all results as JSON to this file")
+    parser.add_argument("--dry-run", action="store_true", help="Don't overwrite the saved model")
+    parser.add_argument("--feedback", action="store_true", help="Add the categories users confirmed to the dataset")
+    args = parser.parse_args(argv)
+
+    examples = training_examples(args.feedback)
+    if args.feedback:
+        builtin = set(training_examples())
+        print(f"{sum(1 for e in examples if e not in builtin)} of {len(examples)} examples come from user feedback")
+    configs = grid_configs() if args.search == "grid" else random_configs(args.n_iter)
+    print(f"Evaluating {len(configs)} configs x {args.cv} folds...")
+    start = time.perf_counter()
+    results, texts, labels = run_search(configs, cv=args.cv, n_jobs=args.jobs, examples=examples)
+    print(f"Search finished in {time.perf_counter() - start:.1f}s\n")
+
+    results.sort(key=lambda r: r[args.metric], reverse=True)
+    print(f"{'ngram':<8} {'loss':<15} {'alpha':>9} {'acc':>7} {'F1':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        c = r["config"]
+        print(f"{str(tuple(c['ngram_range'])):<8} {c['loss']:<15} {c['alpha']:>9.2g} {r['accuracy']:>7.4f} "
+              f"{r['macro_f1']:>7.4f} {r['latency_p50_ms']:>8.3f} {r['latency_p99_ms']:>8.3f}")
+
+    best = pick_best(results, args.metric, args.max_latency_ms)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"metric": args.metric, "best": best, "results": results}, f, indent=2)
+    if best is None:
+        print(f"\nNo config meets the {args.max_latency_ms} ms latency budget.")
+        return 1
+
+    print(f"\nBest ({args.metric}): {best['config']}  acc={best['accuracy']} F1={best['macro_f1']} p50={best['latency_p50_ms']}ms")
+    if args.dry_run:
+        return 0
+
+    pipeline = build_pipeline(**best["config"]).fit(texts, labels)
+    joblib.dump(pipeline, MODEL_FILE)
+    compile_model(pipeline)
+    with open(METADATA_FILE, "w") as f:
+        json.dump(best, f, indent=2)
+    print(f"Saved model to {MODEL_FILE}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
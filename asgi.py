@@ -0,0 +1,127 @@
+"""
+ASGI entry point.
+
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker -w 2
+    uvicorn asgi:application --workers 2
+
+Each request runs on a bounded thread pool (REQUEST_CONCURRENCY threads per
+worker), so a slow OCR or PDF request no longer blocks the whole worker the way
+a default sync gunicorn worker does. CPU-heavy steps inside the views are
+further limited to CPU_WORKERS at a time (see concurrency.py).
+"""
+import asyncio
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import concurrency
+from run import app
+
+_request_executor = ThreadPoolExecutor(max_workers=concurrency.REQUEST_CONCURRENCY, thread_name_prefix="request")
+_BODY_IN_MEMORY = 1 << 20  # request bodies above this (receipt uploads) are spooled to disk
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope (PEP 3333 strings are latin-1 decoded bytes)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope["query_string"].decode("latin1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin1").upper().replace("-", "_")
+        value = value.decode("latin1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        # Repeated headers are joined, as a WSGI server does
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+class WsgiToAsgi:
+    """
+    Serves a WSGI app over ASGI, each request on _request_executor and at
+    most max_concurrency at a time. The request body is read on the event
+    loop first; the app then runs in its thread, and the response chunks it
+    yields are sent back through the loop as they come.
+    """
+
+    def __init__(self, wsgi_application, max_concurrency):
+        self.wsgi_application = wsgi_application
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            # Nothing to set up; acknowledge so servers don't log errors
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            raise ValueError(f"unsupported ASGI scope {scope['type']!r}")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            body = tempfile.SpooledTemporaryFile(max_size=_BODY_IN_MEMORY)
+            try:
+                while True:
+                    message = await receive()
+                    if message["type"] == "http.disconnect":
+                        return
+                    body.write(message.get("body", b""))
+                    if not message.get("more_body", False):
+                        break
+                body.seek(0)
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(_request_executor, self._run, scope, body, send, loop)
+            finally:
+                body.close()
+
+    def _run(self, scope, body, send, loop):
+        """Runs in a request thread: calls the WSGI app and sends its response."""
+        def emit(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get("started"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [(name.lower().encode("latin1"), value.encode("latin1")) for name, value in headers]
+
+        def start():
+            if not response.get("started"):
+                response["started"] = True
+                emit({"type": "http.response.start", "status": response["status"], "headers": response["headers"]})
+
+        result = self.wsgi_application(_environ(scope, body), start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    start()
+                    emit({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        start()
+        emit({"type": "http.response.body", "body": b"", "more_body": False})
+
+application = WsgiToAsgi(app, concurrency.REQUEST_CONCURRENCY)
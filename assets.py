@@ -0,0 +1,177 @@
+"""
+Static assets (the stylesheet and Chart.js) served under content-hashed names.
+
+build() copies each file in ASSETS to ASSET_DIR (static/dist by default) as
+<name>.<sha256[:12]>.<ext>, next to a gzip (.gz) and, when the brotli package is
+installed, a brotli (.br) copy compressed once at maximum level. Templates
+link them with asset_url("css/style.css"). A name always means the same bytes,
+so /assets/ answers with a one-year immutable Cache-Control and browsers never
+revalidate; a changed file gets a new name and the next page load fetches it.
+The compressed copy the client accepts is sent as is (brotli, then gzip,
+then the plain file), with Vary: Accept-Encoding.
+
+Every worker runs build() when it starts; files that already exist are left
+as they are, so this is a few hashes of small files. Older versions are kept
+for pages still open in browsers. If ASSET_DIR can't be written, asset_url
+falls back to the plain /static/ URLs.
+
+Third-party files (VENDORED) are copied byte for byte from a pinned npm
+release by `python main.py vendor`; `--check` reports files that differ.
+The tarball is checked against the integrity hash the registry publishes.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip copies are made
+    brotli = None
+
+STATIC_FOLDER = 'static'
+ASSET_DIR = os.environ.get('ASSET_DIR')  # default: "dist" inside STATIC_FOLDER
+
+ASSETS = ("css/style.css", "js/chart.umd.min.js")
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# File in STATIC_FOLDER -> (npm package, exact version, path in its tarball)
+VENDORED = {
+    "js/chart.umd.min.js": ("chart.js", "4.4.0", "package/dist/chart.umd.js"),
+    "js/chart.LICENSE.txt": ("chart.js", "4.4.0", "package/LICENSE.md"),
+}
+NPM_REGISTRY = "https://registry.npmjs.org"
+# Content-Encoding -> suffix of the precompressed copy, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_manifest = {}  # "css/style.css" -> "css/style.3f2a1b9c8d7e.css"
+_served = set()  # the hashed names, the only paths /assets/ answers for
+
+def asset_dir():
+    return ASSET_DIR or os.path.join(STATIC_FOLDER, 'dist')
+
+def fingerprinted_name(name, data):
+    base, ext = os.path.splitext(name)
+    return f"{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+def _write(path, data):
+    # Workers starting together each write a temp copy; the last rename wins
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.asset-')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _compressed(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the bytes, and so the ETag, the same on every build
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def build():
+    """
+    Writes the hashed copies of ASSETS (and their .gz/.br) that don't exist
+    yet. Returns {name: hashed name}; an asset that can't be read or written
+    is left out and keeps its /static/ URL.
+    """
+    manifest = {}
+    for name in ASSETS:
+        try:
+            with open(os.path.join(STATIC_FOLDER, name), 'rb') as f:
+                data = f.read()
+            hashed = fingerprinted_name(name, data)
+            path = os.path.join(asset_dir(), hashed)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if not os.path.exists(path):
+                _write(path, data)
+            for encoding, suffix in ENCODINGS:
+                if (encoding != "br" or brotli is not None) and not os.path.exists(path + suffix):
+                    _write(path + suffix, _compressed(data, encoding))
+        except OSError as e:
+            print(f"Asset {name} not fingerprinted: {e}")
+            continue
+        manifest[name] = hashed
+    _manifest.clear()
+    _manifest.update(manifest)
+    _served.clear()
+    _served.update(manifest.values())
+    return manifest
+
+def _npm_tarball(package, version):
+    """A release's .tgz bytes. Raises OSError when unreachable, ValueError when it fails its integrity hash."""
+    import base64
+    import json
+    from urllib.request import urlopen
+
+    with urlopen(f"{NPM_REGISTRY}/{package}/{version}", timeout=30) as response:
+        dist = json.load(response)["dist"]
+    with urlopen(dist["tarball"], timeout=60) as response:
+        data = response.read()
+    algorithm, _, expected = dist["integrity"].partition("-")
+    if base64.b64encode(hashlib.new(algorithm, data).digest()).decode() != expected:
+        raise ValueError(f"{package}@{version}: the tarball does not match its integrity hash")
+    return data
+
+def vendor(check=False):
+    """
+    Writes each VENDORED file as it is in its npm release, or with check=True
+    only compares. Returns the names that differed. Raises like _npm_tarball.
+    """
+    import io
+    import tarfile
+
+    releases = {}
+    changed = []
+    for name, (package, version, member) in VENDORED.items():
+        if (package, version) not in releases:
+            releases[package, version] = tarfile.open(fileobj=io.BytesIO(_npm_tarball(package, version)))
+        data = releases[package, version].extractfile(member).read()
+        path = os.path.join(STATIC_FOLDER, name)
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == data:
+                    continue
+        except FileNotFoundError:
+            pass
+        changed.append(name)
+        if not check:
+            _write(path, data)
+    return changed
+
+def asset_url(name):
+    """URL of a static file: its hashed copy under /assets/ when built, else /static/<name>."""
+    from flask import url_for
+    hashed = _manifest.get(name)
+    if hashed is None:
+        return url_for('static', filename=name)
+    return url_for('asset', filename=hashed)
+
+def pick_encoding(path, accept_encodings):
+    """(file to send, Content-Encoding or None) for a request's parsed Accept-Encoding."""
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.exists(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+def init_app(app):
+    """Builds the assets and adds the /assets/ route and the asset_url template global."""
+    from flask import abort, request, send_file
+
+    global STATIC_FOLDER
+    STATIC_FOLDER = app.static_folder
+    build()
+
+    @app.route('/assets/<path:filename>', endpoint='asset')
+    def asset(filename):
+        if filename not in _served:
+            abort(404)
+        path, encoding = pick_encoding(os.path.join(asset_dir(), filename), request.accept_encodings)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_file(os.path.abspath(path), mimetype=mimetype, conditional=True)
+        if encoding:
+            response.content_encoding = encoding
+        response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        return response
+
+    app.add_template_global(asset_url)
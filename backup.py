@@ -0,0 +1,327 @@
+"""
+Online snapshots of the expense databases, and restoring them.
+
+Copying expenses.db while workers write to it can give a torn file. A
+snapshot instead reads every database file (DB_NAME, then each shard) with
+SQLite's backup API. A read transaction is opened on all of them first and
+held until the copy ends; in WAL mode that pins each file as it was when the
+snapshot started, while workers go on committing. The copy runs
+BACKUP_PAGES pages at a time and sleeps BACKUP_PAUSE times the length of
+each step in between, leaving disk and CPU to requests. While it runs the
+WAL can't be checkpointed past the snapshot and grows; SQLite folds it back
+in after.
+
+A snapshot is a directory BACKUP_DIR/<YYYYmmdd-HHMMSS>/ holding one file per
+database (gzip-compressed with compress=True) and manifest.json with each
+file's SHA-256, size, schema version and expense count. It is written under
+a ".partial" name and renamed when complete. verify_snapshot re-checks all
+of that plus SQLite's integrity check; restore_snapshot verifies first, then
+copies the files back over DB_NAME and the shards. Restore with the app
+stopped: workers cache where users live and their expense columns.
+
+One snapshot runs at a time per BACKUP_DIR (a lock file holds the pid), and
+its progress is kept in BACKUP_DIR/status.json so any worker can report it.
+"""
+import contextlib
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import database
+
+BACKUP_DIR = os.environ.get("BACKUP_DIR")  # default: "backups" next to DB_NAME
+BACKUP_PAGES = int(os.environ.get("BACKUP_PAGES", "1024"))
+BACKUP_PAUSE = float(os.environ.get("BACKUP_PAUSE", "1.0"))
+
+MANIFEST = "manifest.json"
+_STATUS_INTERVAL = 1.0  # seconds between status.json updates during a copy
+
+def backup_dir():
+    return BACKUP_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DB_NAME)), "backups")
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _describe(path):
+    """Schema version and expense count (archived years included) of a database file."""
+    conn = database._open(path)
+    c = conn.cursor()
+    user_version = database.schema_version(conn)
+    expenses = 0
+    for table in database._sources(c):
+        c.execute(f"SELECT COUNT(*) FROM {table}")
+        expenses += c.fetchone()[0]
+    conn.close()
+    return user_version, expenses
+
+# --- One snapshot at a time ---
+
+def _lock_path():
+    return os.path.join(backup_dir(), "backup.lock")
+
+def _acquire():
+    """Takes the backup lock; False if a live process holds it."""
+    os.makedirs(backup_dir(), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(_lock_path(), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(_lock_path()) as f:
+                    os.kill(int(f.read() or 0), 0)
+                return False
+            except PermissionError:
+                return False  # alive, run by another user
+            except (OSError, ValueError):
+                # The process that took it is gone
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(_lock_path())
+                continue
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        return True
+    return False
+
+def _release():
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(_lock_path())
+
+def _write_status(status):
+    path = os.path.join(backup_dir(), "status.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(status, f)
+    os.replace(path + ".tmp", path)
+
+def status():
+    """Progress of the running snapshot, or the outcome of the last one ({"state": "idle"} if none)."""
+    try:
+        with open(os.path.join(backup_dir(), "status.json")) as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        return {"state": "idle"}
+    if current.get("state") == "running" and not os.path.exists(_lock_path()):
+        current["state"] = "failed"
+        current["error"] = "interrupted"
+    return current
+
+# --- Taking snapshots ---
+
+def _copy(source, target, progress):
+    """Copies an open source connection to a new file, BACKUP_PAGES pages per step."""
+    dst = sqlite3.connect(target)
+    last = time.perf_counter()
+
+    def step(status, remaining, total):
+        nonlocal last
+        progress(total - remaining, total)
+        if BACKUP_PAUSE > 0:
+            time.sleep((time.perf_counter() - last) * BACKUP_PAUSE)
+        last = time.perf_counter()
+
+    source.backup(dst, pages=BACKUP_PAGES, progress=step)
+    # The copy stands alone, without a -wal file next to it
+    dst.execute("PRAGMA journal_mode=DELETE")
+    dst.close()
+
+def _compress(path):
+    with open(path, "rb") as f_in, gzip.open(path + ".gz", "wb", compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out, 1 << 20)
+    os.remove(path)
+    return path + ".gz"
+
+def _snapshot(name, compress):
+    paths = database.expense_databases()
+    directory = os.path.join(backup_dir(), name)
+    partial = directory + ".partial"
+    os.makedirs(partial)
+    state = {"state": "running", "snapshot": name, "files_done": 0, "files_total": len(paths),
+             "pages_done": 0, "pages_total": 0, "started_at": time.time()}
+    _write_status(state)
+
+    # Read transactions on every file first, so all of them are taken at nearly the same moment
+    sources = []
+    for path in paths:
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute("BEGIN")
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        sources.append((path, conn))
+
+    files = []
+    written = time.time()
+    try:
+        for path, conn in sources:
+            shard = None if path == database.DB_NAME else os.path.splitext(os.path.basename(path))[0]
+            target = os.path.join(partial, "main.db" if shard is None else f"{shard}.db")
+
+            def progress(done, total):
+                nonlocal written
+                state.update(file=os.path.basename(target), pages_done=done, pages_total=total)
+                if time.time() - written >= _STATUS_INTERVAL:
+                    _write_status(state)
+                    written = time.time()
+
+            _copy(conn, target, progress)
+            conn.close()
+            user_version, expenses = _describe(target)
+            size = os.path.getsize(target)
+            if compress:
+                target = _compress(target)
+            files.append({"file": os.path.basename(target), "shard": shard, "bytes": size,
+                          "stored_bytes": os.path.getsize(target), "sha256": _sha256(target),
+                          "compressed": compress, "user_version": user_version, "expenses": expenses})
+            state["files_done"] += 1
+            _write_status(state)
+    finally:
+        for _, conn in sources:
+            conn.close()
+
+    manifest = {"created_at": datetime.fromtimestamp(state["started_at"]).isoformat(timespec="seconds"),
+                "seconds": round(time.time() - state["started_at"], 2), "files": files}
+    with open(os.path.join(partial, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(partial, directory)
+    state.update(state="done", finished_at=time.time(), path=directory)
+    _write_status(state)
+    return directory
+
+def create_snapshot(compress=False):
+    """
+    Takes a snapshot of DB_NAME and every shard while the app keeps serving.
+    Returns the snapshot directory; raises RuntimeError if another snapshot
+    is running.
+    """
+    if not _acquire():
+        raise RuntimeError("a backup is already running")
+    try:
+        return _run(compress)
+    finally:
+        _release()
+
+def _run(compress):
+    name = base = datetime.now().strftime("%Y%m%d-%H%M%S")
+    while os.path.exists(os.path.join(backup_dir(), name)):
+        name = f"{base}-{int(name[len(base) + 1:] or 1) + 1}"
+    try:
+        return _snapshot(name, compress)
+    except Exception as e:
+        _write_status({"state": "failed", "snapshot": name, "error": str(e), "finished_at": time.time()})
+        shutil.rmtree(os.path.join(backup_dir(), name + ".partial"), ignore_errors=True)
+        raise
+
+def start_background(compress=False):
+    """create_snapshot in a thread of this process; False if a snapshot is already running anywhere."""
+    if not _acquire():
+        return False
+    _write_status({"state": "running", "started_at": time.time()})
+
+    def work():
+        try:
+            _run(compress)
+        except Exception:
+            pass  # recorded in status.json
+        finally:
+            _release()
+
+    threading.Thread(target=work, name="backup", daemon=True).start()
+    return True
+
+def list_snapshots():
+    """Complete snapshots in BACKUP_DIR, oldest first."""
+    if not os.path.isdir(backup_dir()):
+        return []
+    return sorted(os.path.join(backup_dir(), name) for name in os.listdir(backup_dir())
+                  if os.path.isfile(os.path.join(backup_dir(), name, MANIFEST)))
+
+# --- Verify and restore ---
+
+def _load_manifest(snapshot):
+    with open(os.path.join(snapshot, MANIFEST)) as f:
+        return json.load(f)
+
+@contextlib.contextmanager
+def _plain_copy(snapshot, entry):
+    """Path of a snapshot file as a plain SQLite database (decompressed to a temp file if needed)."""
+    path = os.path.join(snapshot, entry["file"])
+    if not entry["compressed"]:
+        yield path
+        return
+    fd, plain = tempfile.mkstemp(suffix=".db", prefix="smartexp-restore-")
+    try:
+        with os.fdopen(fd, "wb") as f_out, gzip.open(path, "rb") as f_in:
+            shutil.copyfileobj(f_in, f_out, 1 << 20)
+        yield plain
+    finally:
+        os.remove(plain)
+
+def verify_snapshot(snapshot, full=False):
+    """
+    Problems found in a snapshot; an empty list means it is good. Each file
+    must match its checksum, schema version and expense count, and pass
+    PRAGMA quick_check (integrity_check with full=True).
+    """
+    try:
+        manifest = _load_manifest(snapshot)
+    except (OSError, ValueError) as e:
+        return [f"manifest: {e}"]
+    problems = []
+    check = "integrity_check" if full else "quick_check"
+    for entry in manifest["files"]:
+        path = os.path.join(snapshot, entry["file"])
+        if not os.path.exists(path):
+            problems.append(f"{entry['file']}: missing")
+            continue
+        if _sha256(path) != entry["sha256"]:
+            problems.append(f"{entry['file']}: checksum does not match")
+            continue
+        try:
+            with _plain_copy(snapshot, entry) as plain:
+                conn = sqlite3.connect(plain)
+                result = [row[0] for row in conn.execute(f"PRAGMA {check}")]
+                conn.close()
+                if result != ["ok"]:
+                    problems.append(f"{entry['file']}: {check}: {'; '.join(result[:5])}")
+                    continue
+                if _describe(plain) != (entry["user_version"], entry["expenses"]):
+                    problems.append(f"{entry['file']}: schema version or expense count differs from the manifest")
+        except (OSError, EOFError, sqlite3.DatabaseError) as e:
+            problems.append(f"{entry['file']}: {e}")
+    return problems
+
+def restore_snapshot(snapshot, full_check=False):
+    """
+    Copies a verified snapshot back over DB_NAME and the shard files it
+    holds (under SHARD_DIR). Shard files created since are left alone; users
+    the restored directory doesn't place there are purged from them by the
+    next rebalance. Raises ValueError if verification fails. Returns the
+    restored paths.
+    """
+    problems = verify_snapshot(snapshot, full_check)
+    if problems:
+        raise ValueError("snapshot failed verification: " + "; ".join(problems))
+    restored = []
+    for entry in _load_manifest(snapshot)["files"]:
+        target = database.shard_path(entry["shard"])
+        os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+        with _plain_copy(snapshot, entry) as plain:
+            src = sqlite3.connect(plain)
+            dst = sqlite3.connect(target)
+            # Through SQLite rather than a file copy, so a stale -wal of the old file can't be replayed over it
+            src.backup(dst)
+            dst.execute("PRAGMA journal_mode=WAL")
+            dst.close()
+            src.close()
+        restored.append(target)
+    database._routes.clear()
+    database._ready_shards.clear()
+    return restored
@@ -0,0 +1,131 @@
+"""
+Cost of budget alerts as a user's history grows.
+
+    python -m benchmarks.bench_alerts --sizes 1000 10000 100000
+
+For each size, one user is seeded with that many expenses in the current
+month. This is the worst case for the old dashboard path, which re-read the
+whole month to rebuild the category breakdown and total before comparing them
+with the thresholds. Then, per size:
+
+  write_*   database.add_expense, including the running-total and alert upkeep
+  alerts_*  analytics.generate_suggestions, uncached (reads budget_alerts)
+  legacy_*  the old breakdown + threshold scan, uncached
+
+Before timing, random inserts, updates and deletes are applied and the
+running totals are compared with a GROUP BY over the expenses table. Any
+mismatch exits with status 1.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import database
+from ai_engine import analytics
+from benchmarks import seed as seeder
+from benchmarks.common import print_table, save_results, summarize
+
+def legacy_suggestions(user_id):
+    """The pre-alerts dashboard check: scan the month twice, then compare with fixed thresholds."""
+    current_month = datetime.now().strftime("%Y-%m")
+    breakdown = {}
+    for row in database.get_expenses(user_id=user_id, month=current_month):
+        breakdown[row['category']] = breakdown.get(row['category'], 0) + row['amount']
+    suggestions = []
+    for category, amount in breakdown.items():
+        limit = database.DEFAULT_CATEGORY_BUDGETS.get(category, database.DEFAULT_CATEGORY_LIMIT)
+        if amount > limit:
+            suggestions.append(f"High spending in {category}")
+    total = sum(row['amount'] for row in database.get_expenses(user_id=user_id, month=current_month))
+    if total > database.DEFAULT_MONTHLY_BUDGET:
+        suggestions.append("Total monthly spending is high")
+    return suggestions
+
+def timed(func, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)
+
+def check_consistency(user_id, operations, rng):
+    """Applies random writes, then returns the (month, category) keys whose running total is wrong."""
+    categories = list(database.DEFAULT_CATEGORY_BUDGETS)
+    ids = [row['id'] for row in database.get_expenses(user_id=user_id)]
+    for _ in range(operations):
+        op = rng.random()
+        if op < 0.5 or not ids:
+            date = rng.choice([None, "2024-02-10"])
+            database.add_expense("check", rng.randint(1, 9000) + 0.25, rng.choice(categories), user_id, date)
+        elif op < 0.8:
+            database.update_expense(rng.choice(ids), user_id, "check", rng.randint(1, 9000) + 0.5, rng.choice(categories))
+        else:
+            database.delete_expense(ids.pop(rng.randrange(len(ids))), user_id)
+
+    conn = database.get_connection()
+    expected = {}
+    for month, category, total in conn.execute(
+            "SELECT substr(date, 1, 7), category, SUM(amount_minor) FROM expenses WHERE user_id = ? GROUP BY 1, 2", (user_id,)):
+        expected[(month, category)] = total
+        expected[(month, database.ALL_CATEGORIES)] = expected.get((month, database.ALL_CATEGORIES), 0) + total
+    kept = {(month, category): total for month, category, total in conn.execute(
+        "SELECT month, category, total_minor FROM monthly_totals WHERE user_id = ?", (user_id,))}
+    conn.close()
+    return sorted(key for key in set(expected) | set(kept) if expected.get(key, 0) != kept.get(key, 0))
+
+def run_size(size, args, workdir):
+    db_path = os.path.join(workdir, f"alerts-{size}.db")
+    (user_id, _), = seeder.seed_database(db_path, users=1, expenses_per_user=size, days=1)
+    rng = random.Random(size)
+
+    mismatches = check_consistency(user_id, args.check_ops, rng)
+
+    categories = list(database.DEFAULT_CATEGORY_BUDGETS)
+    write = timed(lambda: database.add_expense("bench", rng.randint(50, 3000), rng.choice(categories), user_id), args.writes)
+    alerts = timed(lambda: analytics.generate_suggestions.uncached(user_id), args.reads)
+    legacy = timed(lambda: legacy_suggestions(user_id), args.reads)
+    return {
+        "history": size,
+        "write_p50_ms": write["p50_ms"],
+        "write_p99_ms": write["p99_ms"],
+        "alerts_p50_ms": alerts["p50_ms"],
+        "alerts_p99_ms": alerts["p99_ms"],
+        "legacy_p50_ms": legacy["p50_ms"],
+        "legacy_p99_ms": legacy["p99_ms"],
+        "mismatches": len(mismatches),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=20)
+    parser.add_argument("--check-ops", type=int, default=300, help="Random writes before the consistency check")
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-alerts-")
+    try:
+        rows = [run_size(size, args, workdir) for size in args.sizes]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows, ["history", "write_p50_ms", "write_p99_ms", "alerts_p50_ms", "alerts_p99_ms",
+                       "legacy_p50_ms", "legacy_p99_ms", "mismatches"])
+    if not args.no_save:
+        print(f"\nSaved {save_results('alerts', {'params': vars(args), 'sizes': rows}, args.output)}")
+    failed = sum(row["mismatches"] for row in rows)
+    if failed:
+        print(f"\nFAIL: {failed} running totals differ from the expenses table")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+"""
+End-to-end benchmark of the main web routes.
+
+    python -m benchmarks.bench_app --users 20 --expenses 1000
+    python -m benchmarks.bench_app --mode gunicorn --workers 4 --clients 16 --duration 20
+
+`client` mode drives the app in-process with the Flask test client, one
+request at a time, which isolates per-request cost. `gunicorn` mode starts a real
+local gunicorn and drives it from concurrent HTTP clients. Both run against a
+freshly seeded temporary database with OCR stubbed out (benchmarks/stub_app.py).
+Results are printed and saved as JSON under benchmarks/results/.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+from benchmarks import seed as seeder
+from benchmarks.common import ROOT, print_table, save_results, summarize
+from benchmarks.loadtest import post_form, wait_for_server
+
+ENDPOINTS = ["add_expense", "dashboard", "history", "chart_data", "chat", "upload_receipt"]
+CHAT_MESSAGES = ["how much total", "predict next month", "analyze my budget", "any anomaly", "food spending"]
+
+def _receipt_png():
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("L", (64, 64), color=255).save(buf, format="PNG")
+    return buf.getvalue()
+
+def _random_input(rng):
+    text, _ = rng.choice(seeder.TRAINING_DATA)
+    return f"{text} {rng.randint(50, 5000)}"
+
+# --- In-process (Flask test client) ---
+
+def _client_request(client, endpoint, rng, receipt):
+    if endpoint == "add_expense":
+        return client.post("/add_expense", data={"raw_input": _random_input(rng)})
+    if endpoint == "dashboard":
+        return client.get("/dashboard")
+    if endpoint == "history":
+        return client.get("/history")
+    if endpoint == "chart_data":
+        return client.get("/api/chart_data")
+    if endpoint == "chat":
+        return client.post("/api/chat", json={"message": rng.choice(CHAT_MESSAGES)})
+    if endpoint == "upload_receipt":
+        return client.post("/upload_receipt", data={"receipt": (io.BytesIO(receipt), "receipt.png")},
+                           content_type="multipart/form-data")
+    raise ValueError(endpoint)
+
+def run_client_mode(users, requests_per_endpoint, endpoints, rng):
+    from benchmarks import stub_app
+    app = stub_app.app
+    app.testing = True
+    receipt = _receipt_png()
+
+    clients = []
+    for _, username in users:
+        client = app.test_client()
+        client.post("/login", data={"username": username, "password": seeder.PASSWORD})
+        clients.append(client)
+
+    results = {}
+    for endpoint in endpoints:
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(requests_per_endpoint):
+            client = rng.choice(clients)
+            t0 = time.perf_counter()
+            response = _client_request(client, endpoint, rng, receipt)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{endpoint} returned {response.status_code}")
+        results[endpoint] = summarize(latencies, time.perf_counter() - started)
+    return results
+
+# --- Real gunicorn ---
+
+class _NoRedirects(urllib.request.HTTPErrorProcessor):
+    """Returns 3xx responses as-is (like the test client) and raises on 4xx/5xx."""
+
+    def http_response(self, request, response):
+        if response.status >= 400:
+            raise RuntimeError(f"{request.full_url} returned {response.status}")
+        return response
+
+    https_response = http_response
+
+def make_opener():
+    import http.cookiejar
+    jar = http.cookiejar.CookieJar()
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirects)
+
+def _multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; filename=\"{filename}\"\r\n"
+            f"Content-Type: image/png\r\n\r\n").encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+def _http_request(opener, base_url, endpoint, rng, receipt):
+    if endpoint == "add_expense":
+        return post_form(opener, base_url + "/add_expense", {"raw_input": _random_input(rng)}).read()
+    if endpoint == "dashboard":
+        return opener.open(base_url + "/dashboard", timeout=60).read()
+    if endpoint == "history":
+        return opener.open(base_url + "/history", timeout=60).read()
+    if endpoint == "chart_data":
+        return opener.open(base_url + "/api/chart_data", timeout=60).read()
+    if endpoint == "chat":
+        body = json.dumps({"message": rng.choice(CHAT_MESSAGES)}).encode()
+        req = urllib.request.Request(base_url + "/api/chat", data=body, headers={"Content-Type": "application/json"})
+        return opener.open(req, timeout=60).read()
+    if endpoint == "upload_receipt":
+        body, content_type = _multipart("receipt", "receipt.png", receipt)
+        req = urllib.request.Request(base_url + "/upload_receipt", data=body, headers={"Content-Type": content_type})
+        return opener.open(req, timeout=60).read()
+    raise ValueError(endpoint)
+
+def run_gunicorn_mode(db_path, upload_dir, users, args):
+    port = args.port
+    base_url = f"http://127.0.0.1:{port}"
+    # All virtual users log in from 127.0.0.1; keep the per-IP login limit out of the numbers
+    env = dict(os.environ, EXPENSES_DB=db_path, UPLOAD_FOLDER=upload_dir, RATE_LIMIT_STORE="off")
+    cmd = ["gunicorn", "benchmarks.stub_app:app", "-w", str(args.workers), "-b", f"127.0.0.1:{port}", "--timeout", "120"]
+    server = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    receipt = _receipt_png()
+    latencies = {e: [] for e in args.endpoints}
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = [0.0]
+
+    def start_clock():
+        stop_at[0] = time.time() + args.duration
+
+    ready = threading.Barrier(args.clients, action=start_clock)
+
+    def client(index):
+        rng = random.Random(index)
+        _, username = users[index % len(users)]
+        opener = make_opener()
+        post_form(opener, base_url + "/login", {"username": username, "password": seeder.PASSWORD})
+        ready.wait()
+        while time.time() < stop_at[0]:
+            endpoint = rng.choice(args.endpoints)
+            t0 = time.perf_counter()
+            try:
+                _http_request(opener, base_url, endpoint, rng, receipt)
+                with lock:
+                    latencies[endpoint].append((time.perf_counter() - t0) * 1000)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    try:
+        wait_for_server(base_url)
+        threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = {e: summarize(v, args.duration) for e, v in latencies.items()}
+    every = [v for values in latencies.values() for v in values]
+    results["_all"] = summarize(every, args.duration)
+    results["_all"]["errors"] = errors[0]
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["client", "gunicorn", "both"], default="client")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--expenses", type=int, default=500, help="Seeded expenses per user")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per endpoint in client mode")
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8775)
+    parser.add_argument("--output", help="Result JSON path (default: benchmarks/results/app-<timestamp>.json)")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-bench-")
+    db_path = os.path.join(workdir, "bench.db")
+    upload_dir = os.path.join(workdir, "uploads")
+    os.makedirs(upload_dir)
+    os.environ["UPLOAD_FOLDER"] = upload_dir
+    os.environ["RATE_LIMIT_STORE"] = "off"
+    try:
+        users = seeder.seed_database(db_path, args.users, args.expenses)
+        results = {"params": {"users": args.users, "expenses_per_user": args.expenses}}
+        if args.mode in ("client", "both"):
+            results["client"] = run_client_mode(users, args.requests, args.endpoints, random.Random(7))
+        if args.mode in ("gunicorn", "both"):
+            results["gunicorn"] = run_gunicorn_mode(db_path, upload_dir, users, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for mode in ("client", "gunicorn"):
+        if mode in results:
+            print(f"\n[{mode}]")
+            rows = [dict(endpoint=e, **s) for e, s in results[mode].items()]
+            print_table(rows, ["endpoint", "count", "rps", "p50_ms", "p90_ms", "p99_ms", "max_ms"])
+    if not args.no_save:
+        print(f"\nSaved {save_results('app', results, args.output)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Year archive (database.archive_closed_years) on a multi-year history.
+
+    python -m benchmarks.bench_archive --users 3 --expenses 60000 --years 4
+
+Seeds users with expenses spread over the last --years years, records what
+the read APIs return, archives every closed year and reads again. Compared
+per user: the full, yearly and recent monthly reports, get_expenses for this
+month and for an archived month, daily totals of both, searches (text, text
+within an archived year, filters only), series keys and histories, the
+recent list, an archived expense by id and the columns expense_store.py
+loads. Then an archived expense is updated and another deleted, and the
+report (partly from archive_summaries) must still agree with the running
+monthly totals. Reported:
+
+  archive_s      wall time of the archive job
+  live_rows      rows left in the live expenses table, before -> after
+  <query>_ms     p50 latency before -> after archiving
+  mismatches     results that differ after archiving (exits 1 if any)
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+import database
+from benchmarks import seed as seeder
+from benchmarks.common import print_table, save_results, summarize
+
+def as_data(result):
+    """Rows (or a dict / tuple of them) as plain comparable values, floats rounded to the paisa."""
+    if isinstance(result, dict):
+        return {key: as_data(value) for key, value in result.items()}
+    if isinstance(result, (list, tuple)):
+        return [as_data(value) for value in result]
+    if isinstance(result, set):
+        return sorted(result)
+    if hasattr(result, "keys"):
+        return {key: as_data(result[key]) for key in result.keys()}
+    if isinstance(result, float):
+        return round(result, 2)
+    return result
+
+def sorted_rows(rows):
+    return sorted((as_data(row) for row in rows), key=repr)
+
+def read_apis(user_id, this_month, old_month, old_year, key, old_id):
+    """name -> callable returning a comparable result."""
+    return {
+        "report_all": lambda: sorted_rows(database.get_monthly_report(user_id)),
+        "report_year": lambda: sorted_rows(database.get_monthly_report(user_id, f"{old_year}-01-01", f"{old_year + 1}-01-01")),
+        "report_mid_year": lambda: sorted_rows(database.get_monthly_report(user_id, f"{old_year}-03-15", f"{old_year}-09-15")),
+        "report_3m": lambda: sorted_rows(database.get_monthly_report(user_id, f"{this_month}-01")),
+        "month_expenses": lambda: sorted_rows(database.get_expenses(user_id=user_id, month=this_month)),
+        "old_month_expenses": lambda: sorted_rows(database.get_expenses(user_id=user_id, month=old_month)),
+        "daily": lambda: as_data(database.get_daily_totals(user_id, this_month)),
+        "old_daily": lambda: as_data(database.get_daily_totals(user_id, old_month)),
+        "search": lambda: as_data(database.search_expenses(user_id, "chai")),
+        "search_old_year": lambda: as_data(database.search_expenses(user_id, "petrol", date_from=f"{old_year}-01-01",
+                                                                    date_to=f"{old_year}-12-31")),
+        "search_filters": lambda: as_data(database.search_expenses(user_id, min_amount=1000, page=3)),
+        "series_keys": lambda: as_data(database.get_series_keys(user_id)),
+        "series_history": lambda: as_data(database.get_series_history(user_id, *key)),
+        "recent": lambda: as_data(database.get_recent_expenses(user_id)),
+        "by_id": lambda: as_data(database.get_expense_by_id(old_id, user_id)),
+        "columns": lambda: as_data(database.get_expense_columns(user_id)),
+    }
+
+TIMED = ["month_expenses", "daily", "report_3m", "report_all", "search", "recent"]
+
+def timed(func, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)["p50_ms"]
+
+def live_rows():
+    conn = database.get_connection()
+    count = conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    conn.close()
+    return count
+
+def report_matches_totals(user_id):
+    """The monthly report agrees with monthly_totals for every month and category."""
+    report = {(r['month'], r['category']): round(r['total'], 2) for r in database.get_monthly_report(user_id)}
+    totals = {}
+    for month in {month for month, _ in report}:
+        for category, total in database.get_month_totals(user_id, month).items():
+            if category != database.ALL_CATEGORIES:
+                totals[(month, category)] = round(total, 2)
+    return report == totals
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=3)
+    parser.add_argument("--expenses", type=int, default=60000, help="Per user")
+    parser.add_argument("--years", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=database.MIGRATION_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    today = date.today()
+    this_month = today.strftime("%Y-%m")
+    old_year = today.year - 2
+    old_month = f"{old_year}-06"
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-archive-")
+    try:
+        seeded = seeder.seed_database(os.path.join(workdir, "archive.db"), users=args.users,
+                                      expenses_per_user=args.expenses, days=args.years * 365)
+        users = []
+        for user_id, _ in seeded:
+            old = database.get_expenses(user_id=user_id, month=old_month)
+            key = sorted(database.get_series_keys(user_id))[0]
+            apis = read_apis(user_id, this_month, old_month, old_year, key, old[0]['id'])
+            users.append((user_id, apis, {name: func() for name, func in apis.items()}, old))
+        rows_before = live_rows()
+        before_ms = {name: timed(users[0][1][name], args.repeat) for name in TIMED}
+
+        start = time.perf_counter()
+        moved = database.archive_closed_years(today.year, args.batch_size)
+        archive_s = time.perf_counter() - start
+        rows_after = live_rows()
+        after_ms = {name: timed(users[0][1][name], args.repeat) for name in TIMED}
+
+        wrong = []
+        for user_id, apis, expected, old in users:
+            wrong += [f"user {user_id}: {name}" for name, func in apis.items() if func() != expected[name]]
+            # Edits of archived rows keep the totals and summaries in step
+            database.update_expense(old[1]['id'], user_id, "edited archived expense", 4321.5, old[2]['category'])
+            database.delete_expense(old[3]['id'], user_id)
+            if not report_matches_totals(user_id):
+                wrong.append(f"user {user_id}: report vs totals after edits")
+        # A second run only sweeps rows backdated since the first
+        database.add_expense("backdated chai", 40, "Food & Dining", users[0][0], f"{old_year}-02-03")
+        if database.archive_closed_years(today.year, args.batch_size) != {old_year: 1}:
+            wrong.append("re-run did not move exactly the backdated expense")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    row = {
+        "users": args.users,
+        "expenses": args.users * args.expenses,
+        "archived": sum(moved.values()),
+        "archive_s": round(archive_s, 2),
+        "live_rows": f"{rows_before} -> {rows_after}",
+    }
+    for name in TIMED:
+        row[f"{name}_ms"] = f"{before_ms[name]} -> {after_ms[name]}"
+    row["mismatches"] = len(wrong)
+    print_table([row], list(row))
+    print(f"\nPartitions: {', '.join(f'{year}: {count}' for year, count in sorted(moved.items()))}")
+    if not args.no_save:
+        print(f"\nSaved {save_results('archive', {'params': vars(args), 'result': row, 'moved': moved}, args.output)}")
+    if wrong:
+        print("\nFAIL: results differ after archiving:\n  " + "\n  ".join(wrong))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Request latency while backup.py snapshots a large database.
+
+    python -m benchmarks.bench_backup --users 4 --expenses 100000 --workers 2
+
+Seeds --users users with --expenses each into one file. --workers processes,
+like gunicorn workers, then add expenses and read monthly reports in a loop
+while the main process runs, in turn:
+
+  idle            no backup, for --seconds
+  pause=P         backup.create_snapshot with BACKUP_PAUSE=P, for each --pauses
+  gzip            the same with compress=True and the first --pauses value
+
+Reported per phase: backup wall time and MB/s of database copied, and the
+workers' write / report latency. Each snapshot is checked with
+backup.verify_snapshot, and its expense count must lie between the counts
+before and after the backup (it is one point in time while writes go on).
+Finally the writers are stopped, one more snapshot is restored into a new
+location, and every user's report and expense count there must match the
+source. Exits 1 on any failed check.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import backup
+import database
+from benchmarks import seed as seeder
+from benchmarks.common import ROOT, print_table, save_results, summarize
+
+def worker(user_ids, stop_path):
+    """Runs inside a child process; prints one JSON line of (finished at, kind, ms) samples."""
+    rng = random.Random(os.getpid())
+    categories = list(database.DEFAULT_CATEGORY_BUDGETS)
+    month_start = time.strftime("%Y-%m-01")
+    samples, locked = [], 0
+    while not os.path.exists(stop_path):
+        user_id = rng.choice(user_ids)
+        start = time.perf_counter()
+        try:
+            if rng.random() < 0.5:
+                database.add_expense("bench chai", rng.randint(50, 3000), rng.choice(categories), user_id)
+                kind = "write"
+            else:
+                database.get_monthly_report(user_id, month_start)
+                kind = "read"
+        except sqlite3.OperationalError:
+            locked += 1
+            continue
+        samples.append((time.time(), kind, (time.perf_counter() - start) * 1000))
+    print(json.dumps({"samples": samples, "locked": locked}))
+
+def start_workers(db_path, user_ids, stop_path, count):
+    env = dict(os.environ, EXPENSES_DB=db_path, SHARDS="")
+    code = f"from benchmarks.bench_backup import worker; worker({user_ids!r}, {stop_path!r})"
+    return [subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+            for _ in range(count)]
+
+def expense_count():
+    conn = database.get_connection()
+    count = conn.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+    conn.close()
+    return count
+
+def _user_ids():
+    conn = database.get_connection()
+    ids = [r['user_id'] for r in conn.execute("SELECT user_id FROM users ORDER BY user_id")]
+    conn.close()
+    return ids
+
+def run_backup(pause, compress):
+    """One snapshot; returns (phase row, problems)."""
+    backup.BACKUP_PAUSE = pause
+    before = expense_count()
+    start = time.time()
+    snapshot = backup.create_snapshot(compress=compress)
+    end = time.time()
+    after = expense_count()
+    with open(os.path.join(snapshot, backup.MANIFEST)) as f:
+        files = json.load(f)["files"]
+    size = sum(entry["bytes"] for entry in files)
+    problems = backup.verify_snapshot(snapshot)
+    saved = sum(entry["expenses"] for entry in files)
+    if not before <= saved <= after:
+        problems.append(f"{saved} expenses in the snapshot, {before} before and {after} after it")
+    row = {"phase": f"gzip pause={pause}" if compress else f"pause={pause}", "start": start, "end": end,
+           "backup_s": round(end - start, 2), "mb_s": round(size / 1e6 / (end - start), 1),
+           "stored_mb": round(sum(entry["stored_bytes"] for entry in files) / 1e6, 1)}
+    return row, problems
+
+def phase_latency(samples, start, end):
+    stats = {}
+    for kind in ("write", "read"):
+        latencies = [ms for at, k, ms in samples if k == kind and start <= at <= end]
+        summary = summarize(latencies)
+        stats[f"{kind}s"] = len(latencies)
+        stats[f"{kind}_p50_ms"] = summary["p50_ms"]
+        stats[f"{kind}_p99_ms"] = summary["p99_ms"]
+    return stats
+
+def reports(user_ids):
+    return {user_id: ([tuple(r) for r in database.get_monthly_report(user_id)],
+                      len(database.get_expenses(user_id=user_id))) for user_id in user_ids}
+
+def check_restore(workdir):
+    """Snapshot with the writers stopped, restore elsewhere, compare every user; returns problems."""
+    backup.BACKUP_PAUSE = 0
+    snapshot = backup.create_snapshot(compress=True)
+    user_ids = _user_ids()
+    expected = reports(user_ids)
+    source = database.DB_NAME
+    database.DB_NAME = os.path.join(workdir, "restored", "main.db")
+    try:
+        backup.restore_snapshot(snapshot)
+        got = reports(user_ids)
+    finally:
+        database.DB_NAME = source
+        database._routes.clear()
+    return [f"user {user_id}: restored report differs" for user_id in user_ids if got[user_id] != expected[user_id]]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--expenses", type=int, default=100000, help="Seeded per user")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Length of the idle phase")
+    parser.add_argument("--pauses", type=float, nargs="+", default=[1.0, 0.0], help="BACKUP_PAUSE values to run")
+    parser.add_argument("--pages", type=int, default=backup.BACKUP_PAGES)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-backup-")
+    source_db, source_dir = database.DB_NAME, backup.BACKUP_DIR
+    try:
+        db_path = os.path.join(workdir, "main.db")
+        seeded = seeder.seed_database(db_path, users=args.users, expenses_per_user=args.expenses, days=365)
+        user_ids = [user_id for user_id, _ in seeded]
+        backup.BACKUP_DIR = os.path.join(workdir, "backups")
+        backup.BACKUP_PAGES = args.pages
+        db_mb = os.path.getsize(db_path) / 1e6
+
+        stop_path = os.path.join(workdir, "stop")
+        procs = start_workers(db_path, user_ids, stop_path, args.workers)
+        time.sleep(2)  # workers import and connect
+        phases, problems = [], []
+        start = time.time()
+        time.sleep(args.seconds)
+        phases.append({"phase": "idle", "start": start, "end": time.time(), "backup_s": "-", "mb_s": "-",
+                       "stored_mb": "-"})
+        for pause, compress in [(pause, False) for pause in args.pauses] + [(args.pauses[0], True)]:
+            row, failed = run_backup(pause, compress)
+            phases.append(row)
+            problems += [f"{row['phase']}: {problem}" for problem in failed]
+            time.sleep(1)
+        open(stop_path, "w").close()
+        results = [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in procs]
+        samples = [sample for result in results for sample in result["samples"]]
+        problems += check_restore(workdir)
+    finally:
+        database.DB_NAME, backup.BACKUP_DIR = source_db, source_dir
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rows = []
+    for phase in phases:
+        row = {key: value for key, value in phase.items() if key not in ("start", "end")}
+        row.update(phase_latency(samples, phase["start"], phase["end"]))
+        rows.append(row)
+    print(f"Database: {db_mb:.0f} MB, {args.users * args.expenses} expenses, {args.workers} workers, "
+          f"{sum(result['locked'] for result in results)} locked\n")
+    print_table(rows, list(rows[0]))
+    if not args.no_save:
+        print(f"\nSaved {save_results('backup', {'params': vars(args), 'db_mb': round(db_mb, 1), 'phases': rows}, args.output)}")
+    if problems:
+        print("\nFAIL:\n  " + "\n  ".join(problems))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""
+Classifier quality and latency regression check.
+
+    python -m benchmarks.bench_classifier                  # compare against the stored baseline
+    python -m benchmarks.bench_classifier --update-baseline
+
+Runs ExpenseClassifier (the saved model, rules included) over the held-out
+corpus in benchmarks/classifier_corpus.py. It reports accuracy, macro-F1, a
+confusion matrix over the 10 categories and p50/p99 latency of predict (and of
+predict_batch, when the classifier has one). Exits with status 1 when accuracy
+drops by more than --max-accuracy-drop or p99 latency grows by more than
+--max-latency-ratio against benchmarks/baselines/classifier.json.
+
+It also reports how useful the confidences are: for a few thresholds, the
+share of the corpus that would go to the review queue and the accuracy of
+the predictions kept and flagged. When the pickled pipeline can be loaded,
+the compiled model's probabilities must match its predict_proba (exit 1
+otherwise).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from sklearn.metrics import accuracy_score, confusion_matrix, f1_score
+
+from ai_engine.classifier import MODEL_FILE, REVIEW_THRESHOLD, CompiledModel, ExpenseClassifier
+from benchmarks.classifier_corpus import HELDOUT_DATA
+from benchmarks.common import percentile, save_results
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "classifier.json")
+
+CATEGORIES = [
+    "Food & Dining", "Transportation", "Housing & Utilities", "Mobile & Communication", "Shopping",
+    "Health & Fitness", "Education", "Entertainment", "Gifts & Donations", "Financial / Others",
+]
+
+THRESHOLDS = [0.3, 0.5, REVIEW_THRESHOLD, 0.8, 0.95]
+
+def confidence_report(expected, predictions):
+    """Per threshold: share flagged, accuracy of the predictions kept and of the flagged ones."""
+    rows = []
+    for threshold in sorted(set(THRESHOLDS)):
+        kept = [label == e for e, (label, confidence) in zip(expected, predictions) if confidence >= threshold]
+        flagged = [label == e for e, (label, confidence) in zip(expected, predictions) if confidence < threshold]
+        rows.append({
+            "threshold": threshold,
+            "flagged_share": round(len(flagged) / len(expected), 4),
+            "kept_accuracy": round(sum(kept) / len(kept), 4) if kept else None,
+            "flagged_accuracy": round(sum(flagged) / len(flagged), 4) if flagged else None,
+        })
+    return rows
+
+def check_probabilities(texts):
+    """Largest difference between the compiled model's and the pickled pipeline's probabilities, or None."""
+    if not os.path.exists(MODEL_FILE):
+        return None
+    import joblib
+    pipeline = joblib.load(MODEL_FILE)
+    compiled = CompiledModel.from_pipeline(pipeline)
+    lowered = [t.lower().strip() for t in texts]
+    return float(abs(compiled.predict_proba(lowered) - pipeline.predict_proba(lowered)).max())
+
+def evaluate(classifier, repeat=20):
+    texts = [t for t, _ in HELDOUT_DATA]
+    expected = [c for _, c in HELDOUT_DATA]
+    predictions = [classifier.predict(t) for t in texts]
+    predicted = [label for label, _ in predictions]
+
+    single = []
+    for _ in range(repeat):
+        for text in texts:
+            start = time.perf_counter()
+            classifier.predict(text)
+            single.append((time.perf_counter() - start) * 1000)
+
+    result = {
+        "samples": len(texts),
+        "accuracy": round(accuracy_score(expected, predicted), 4),
+        "macro_f1": round(f1_score(expected, predicted, labels=CATEGORIES, average="macro", zero_division=0), 4),
+        "confusion_matrix": confusion_matrix(expected, predicted, labels=CATEGORIES).tolist(),
+        "errors": [{"text": t, "expected": e, "predicted": p} for t, e, p in zip(texts, expected, predicted) if e != p],
+        "predict": {"p50_ms": round(percentile(single, 50), 4), "p99_ms": round(percentile(single, 99), 4)},
+        "confidence": confidence_report(expected, predictions),
+        "probability_max_diff": check_probabilities(texts),
+    }
+
+    if hasattr(classifier, "predict_batch"):
+        per_item = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            classifier.predict_batch(texts)
+            per_item.append((time.perf_counter() - start) * 1000 / len(texts))
+        result["predict_batch"] = {
+            "p50_ms_per_item": round(percentile(per_item, 50), 4),
+            "p99_ms_per_item": round(percentile(per_item, 99), 4),
+        }
+    return result
+
+def print_report(result):
+    print(f"Samples: {result['samples']}  accuracy={result['accuracy']}  macro-F1={result['macro_f1']}")
+    print(f"predict: p50={result['predict']['p50_ms']}ms p99={result['predict']['p99_ms']}ms")
+    if "predict_batch" in result:
+        b = result["predict_batch"]
+        print(f"predict_batch: p50={b['p50_ms_per_item']}ms/item p99={b['p99_ms_per_item']}ms/item")
+
+    print(f"\nConfidence (REVIEW_THRESHOLD = {REVIEW_THRESHOLD}):")
+    print(f"{'threshold':>10}{'flagged':>9}{'kept acc':>10}{'flagged acc':>13}")
+    for r in result["confidence"]:
+        print(f"{r['threshold']:>10.2f}{r['flagged_share']:>9.0%}{r['kept_accuracy'] if r['kept_accuracy'] is not None else '-':>10}"
+              f"{r['flagged_accuracy'] if r['flagged_accuracy'] is not None else '-':>13}")
+    if result["probability_max_diff"] is not None:
+        print(f"compiled vs pipeline predict_proba: max difference {result['probability_max_diff']:.2e}")
+
+    short = [c.split()[0][:6] for c in CATEGORIES]
+    print("\nConfusion matrix (rows = expected, columns = predicted):")
+    print(" " * 8 + " ".join(f"{s:>6}" for s in short))
+    for name, row in zip(short, result["confusion_matrix"]):
+        print(f"{name:>7} " + " ".join(f"{v:>6}" for v in row))
+
+    if result["errors"]:
+        print("\nMisclassified:")
+        for e in result["errors"]:
+            print(f"  {e['text']!r}: expected {e['expected']}, got {e['predicted']}")
+
+def check_regression(result, baseline, max_accuracy_drop, max_latency_ratio):
+    failures = []
+    if result["accuracy"] < baseline["accuracy"] - max_accuracy_drop:
+        failures.append(f"accuracy {result['accuracy']} < baseline {baseline['accuracy']} - {max_accuracy_drop}")
+    if result["macro_f1"] < baseline["macro_f1"] - max_accuracy_drop:
+        failures.append(f"macro-F1 {result['macro_f1']} < baseline {baseline['macro_f1']} - {max_accuracy_drop}")
+    base_p99 = baseline["predict"]["p99_ms"]
+    if base_p99 and result["predict"]["p99_ms"] > base_p99 * max_latency_ratio:
+        failures.append(f"predict p99 {result['predict']['p99_ms']}ms > {max_latency_ratio}x baseline {base_p99}ms")
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20, help="Passes over the corpus for latency")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.02)
+    parser.add_argument("--max-latency-ratio", type=float, default=1.5)
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    classifier = ExpenseClassifier()
+    classifier.load_model()
+    result = evaluate(classifier, args.repeat)
+    print_report(result)
+    if not args.no_save:
+        print(f"\nSaved {save_results('classifier', result)}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        baseline = {k: result[k] for k in ("samples", "accuracy", "macro_f1", "predict")}
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("\nNo baseline yet; run with --update-baseline to create one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    failures = check_regression(result, baseline, args.max_accuracy_drop, args.max_latency_ratio)
+    if result["probability_max_diff"] is not None and result["probability_max_diff"] > 1e-9:
+        failures.append(f"compiled probabilities differ from the pipeline's by {result['probability_max_diff']}")
+    if failures:
+        print("\nREGRESSION:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print(f"\nOK against baseline (accuracy {baseline['accuracy']}, p99 {baseline['predict']['p99_ms']}ms)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Duplicate-entry check cost and accuracy for a user with a large history.
+
+    python -m benchmarks.bench_duplicates --rows 100000
+
+One user is seeded with --rows expenses. Then --checks new expenses are
+inserted with database.add_expense, and each is checked with
+database.find_duplicates. A third of them repeat an existing expense
+(same amount and date, the words shuffled or the case changed), as when a
+purchase is typed in and then scanned from the receipt. The rest are new
+purchases; they reuse an existing amount and date half of the time, so the
+text similarity has to tell them apart.
+
+Reported: find_duplicates p50/p99, how many repeats were flagged (recall),
+and how many new purchases were wrongly flagged. Exits 1 if a repeat was
+missed, or if the p99 is above --max-p99-ms: every insert in the app runs
+the check, so the slow tail has to stay under a millisecond too.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import database
+from ai_engine.pakistani_data import TRAINING_DATA
+from benchmarks import seed as seeder
+from benchmarks.common import print_table, save_results, summarize
+
+def variant(text, rng):
+    """The same purchase described slightly differently."""
+    words = text.split()
+    if len(words) > 1 and rng.random() < 0.5:
+        rng.shuffle(words)
+        return " ".join(words)
+    return text.upper() if rng.random() < 0.5 else text.title()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--checks", type=int, default=600)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--max-p99-ms", type=float, default=1.0)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-dupes-")
+    try:
+        (user_id, _), = seeder.seed_database(os.path.join(workdir, "dupes.db"), users=1,
+                                             expenses_per_user=args.rows, days=args.days)
+        existing = database.get_expenses(user_id=user_id)
+        rng = random.Random(7)
+        latencies = []
+        repeats = flagged_repeats = fresh = flagged_fresh = 0
+        for i in range(args.checks):
+            source = rng.choice(existing)
+            is_repeat = i % 3 == 0
+            if is_repeat:
+                text = variant(source['expense_text'], rng)
+            else:
+                text = rng.choice([t for t, _ in rng.sample(TRAINING_DATA, 5) if t != source['expense_text']] or ["misc"])
+            if is_repeat or rng.random() < 0.5:
+                amount, date = source['amount'], source['date'][:10]
+            else:
+                amount, date = float(rng.randint(1, 90000)), None
+            expense_id = database.add_expense(text, amount, source['category'], user_id, date)
+
+            start = time.perf_counter()
+            matches = database.find_duplicates(expense_id, user_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            if is_repeat:
+                repeats += 1
+                flagged_repeats += bool(matches)
+            else:
+                fresh += 1
+                flagged_fresh += bool(matches)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    summary = summarize(latencies)
+    row = {
+        "rows": args.rows,
+        "p50_ms": summary["p50_ms"],
+        "p99_ms": summary["p99_ms"],
+        "recall": round(flagged_repeats / repeats, 3) if repeats else 0.0,
+        "false_flags": f"{flagged_fresh}/{fresh}",
+    }
+    print_table([row], ["rows", "p50_ms", "p99_ms", "recall", "false_flags"])
+    if not args.no_save:
+        print(f"\nSaved {save_results('duplicates', {'params': vars(args), 'result': row, 'latency': summary}, args.output)}")
+
+    failed = False
+    if flagged_repeats < repeats:
+        print(f"\nFAIL: {repeats - flagged_repeats} repeated expenses were not flagged")
+        failed = True
+    if summary["p99_ms"] > args.max_p99_ms:
+        print(f"\nFAIL: p99 {summary['p99_ms']} ms is over {args.max_p99_ms} ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+Columnar expense store (expense_store.py) vs the row-based analytics path.
+
+    python -m benchmarks.bench_expense_store --sizes 1000 10000 100000
+
+For each size, one user is seeded with that many expenses over --days days.
+Reported per size:
+
+  load_ms        cold load of the user's columns from SQLite
+  append_ms      catching up after one new expense (get_columns after add_expense)
+  kb_per_10k     memory of the arrays per 10k expenses (allocated incl. spare capacity)
+  rows_kb_per_10k  the same for the list of sqlite3.Row the old path built
+  daily/forecast/anomalies  uncached analytics p50 in ms, old path -> store,
+                 and the speedup
+
+The old path is kept here as it was: the daily totals query, and the
+forecast and anomaly code that built pandas DataFrames from get_expenses()
+and used scikit-learn. Before timing, the store's daily totals are
+compared with database.get_daily_totals after inserts, and again after an
+update and a delete. The forecasts of both paths must match to the paisa. The anomaly lists come from two different Isolation
+Forest implementations (scikit-learn vs ai_engine/isolation.py), so only
+their overlap is checked. anomaly_agree is |both| / |either|, and it must be
+at least --min-anomaly-agree. Runs of scikit-learn with two different seeds
+agree about as well. Any failed check exits with status 1.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import database
+import expense_store
+from ai_engine import analytics
+from benchmarks import seed as seeder
+from benchmarks.common import print_table, save_results, summarize
+
+def legacy_forecast(user_id):
+    """predict_next_month_spending before the columnar store."""
+    from sklearn.linear_model import LinearRegression
+    import pandas as pd
+    from ai_engine import recurring
+
+    series = database.get_recurring_series(user_id)
+    bills = recurring.expected_total(series)
+    known = {(s['series_key'], s['category']) for s in series}
+    current_month = datetime.now().strftime("%Y-%m")
+    daily = {}
+    for row in database.get_expenses(user_id=user_id, month=current_month):
+        if (row['series_key'], row['category']) in known:
+            continue
+        daily[row['day']] = daily.get(row['day'], 0) + row['amount_minor']
+    daily = {database.day_to_iso(day): minor / 100 for day, minor in daily.items()}
+    if not daily:
+        return round(bills, 2)
+    if len(daily) == 1:
+        return round(list(daily.values())[0] * 30 + bills, 2)
+    df = pd.DataFrame(sorted(daily.items()), columns=['date', 'amount'])
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date')
+    df['day'] = (df['date'] - df['date'].min()).dt.days
+    df['cumulative'] = df['amount'].cumsum()
+    model = LinearRegression()
+    model.fit(df[['day']].to_numpy(), df['cumulative'])
+    return round(max(0, model.predict([[30]])[0]) + bills, 2)
+
+def legacy_anomalies(user_id):
+    """detect_anomalies before the columnar store."""
+    from sklearn.ensemble import IsolationForest
+    import pandas as pd
+
+    expenses = database.get_expenses(user_id=user_id)
+    if len(expenses) < 5:
+        return []
+    df = pd.DataFrame([{'amount': e['amount'], 'id': e['id'], 'text': e['expense_text']} for e in expenses])
+    model = IsolationForest(contamination=0.05, random_state=42)
+    df['anomaly'] = model.fit_predict(df[['amount']])
+    currency = analytics.profiles.get_profile(user_id).currency
+    return [f"⚠️ Anomaly: {row['text']} ({currency} {row['amount']}) seems unusual."
+            for _, row in df[df['anomaly'] == -1].iterrows()]
+
+def timed(func, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)["p50_ms"]
+
+def close(a, b):
+    return set(a) == set(b) and all(abs(a[k] - b[k]) < 1e-6 for k in a)
+
+def check_store(user_id, months):
+    """Months whose store totals differ from the SQL ones."""
+    store = expense_store.get_columns(user_id)
+    wrong = []
+    for month in months:
+        if not close(store.daily_totals(month), database.get_daily_totals(user_id, month)):
+            wrong.append(month)
+    return wrong
+
+def run_size(size, args, workdir):
+    (user_id, _), = seeder.seed_database(os.path.join(workdir, f"store-{size}.db"), users=1,
+                                         expenses_per_user=size, days=args.days)
+    rng = random.Random(size)
+    categories = list(database.DEFAULT_CATEGORY_BUDGETS)
+    current_month = datetime.now().strftime("%Y-%m")
+    months = sorted({r['date'][:7] for r in database.get_expenses(user_id=user_id)})
+
+    expense_store.clear()
+    start = time.perf_counter()
+    store = expense_store.get_columns(user_id)
+    load_ms = (time.perf_counter() - start) * 1000
+    kb_per_10k = store.nbytes / 1024 / size * 10000
+
+    tracemalloc.start()
+    rows = database.get_expenses(user_id=user_id)
+    rows_kb_per_10k = tracemalloc.get_traced_memory()[0] / 1024 / size * 10000
+    tracemalloc.stop()
+    del rows
+
+    appends = []
+    for _ in range(args.appends):
+        database.add_expense("bench", rng.randint(50, 3000), rng.choice(categories), user_id)
+        start = time.perf_counter()
+        expense_store.get_columns(user_id)
+        appends.append((time.perf_counter() - start) * 1000)
+    wrong = check_store(user_id, months)
+    ids = [r['id'] for r in database.get_expenses(user_id=user_id, month=current_month)]
+    database.update_expense(ids[0], user_id, "changed", 1234.5, rng.choice(categories))
+    database.delete_expense(ids[1], user_id)
+    wrong += check_store(user_id, months)
+
+    forecast_ok = abs(legacy_forecast(user_id) - analytics.predict_next_month_spending.uncached(user_id)) <= 0.01
+    old, new = set(legacy_anomalies(user_id)), set(analytics.detect_anomalies.uncached(user_id))
+    agree = len(old & new) / len(old | new) if old | new else 1.0
+
+    row = {
+        "expenses": size,
+        "load_ms": round(load_ms, 2),
+        "append_ms": summarize(appends)["p50_ms"],
+        "kb_per_10k": round(kb_per_10k, 1),
+        "rows_kb_per_10k": round(rows_kb_per_10k, 1),
+        "anomaly_agree": round(agree, 3),
+    }
+    paths = {
+        "daily": (lambda: database.get_daily_totals(user_id, current_month),
+                  lambda: analytics.get_daily_spending.uncached(user_id)),
+        "forecast": (lambda: legacy_forecast(user_id),
+                     lambda: analytics.predict_next_month_spending.uncached(user_id)),
+        "anomalies": (lambda: legacy_anomalies(user_id),
+                      lambda: analytics.detect_anomalies.uncached(user_id)),
+    }
+    for name, (old, new) in paths.items():
+        old_ms, new_ms = timed(old, args.repeat), timed(new, args.repeat)
+        row[f"{name}_ms"] = f"{old_ms} -> {new_ms}"
+        row[f"{name}_x"] = round(old_ms / new_ms, 1) if new_ms else 0.0
+    row["mismatches"] = len(wrong) + (not forecast_ok) + (agree < args.min_anomaly_agree)
+    return row
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--appends", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--min-anomaly-agree", type=float, default=0.6)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-store-")
+    try:
+        rows = [run_size(size, args, workdir) for size in args.sizes]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows, list(rows[0]))
+    if not args.no_save:
+        print(f"\nSaved {save_results('expense_store', {'params': vars(args), 'sizes': rows}, args.output)}")
+    failed = sum(row["mismatches"] for row in rows)
+    if failed:
+        print(f"\nFAIL: {failed} store results differ from the row-based path")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Login throughput under a password-guessing attack.
+
+    python -m benchmarks.bench_login --workers 2 --attackers 16 --duration 20
+
+For each scenario a sync gunicorn server starts on a fresh database. The
+attacker threads then post wrong passwords for a few victim accounts as fast
+as they can, from --attacker-ips loopback addresses (127.0.0.2, ...). At the
+same time, legitimate users log in with the right password at --legit-rate
+logins/s, spread over many accounts and addresses in 127.0.1.0/24. Reported
+per scenario: legit login success rate and p50/p99 latency, and attacker
+request rate with its status breakdown.
+
+Scenarios: rate limiting off vs the SQLite token-bucket store shared by all
+workers. Pass --hash-method to compare hash parameters, e.g. "scrypt:16384:8:1".
+"""
+import argparse
+import http.client
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+from benchmarks import seed as seeder
+from benchmarks.common import ROOT, print_table, save_results, summarize
+from benchmarks.loadtest import wait_for_server
+
+SCENARIOS = {
+    "no_limit": {"RATE_LIMIT_STORE": "off"},
+    "token_bucket": {"RATE_LIMIT_STORE": "sqlite"},
+}
+
+def post_login(port, source_ip, username, password):
+    """One login POST from source_ip; returns (status, milliseconds)."""
+    body = urllib.parse.urlencode({"username": username, "password": password})
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60, source_address=(source_ip, 0))
+    try:
+        conn.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+        response = conn.getresponse()
+        response.read()
+        return response.status, (time.perf_counter() - start) * 1000
+    finally:
+        conn.close()
+
+def run_scenario(name, extra_env, args):
+    workdir = tempfile.mkdtemp(prefix="smartexp-login-")
+    db_path = os.path.join(workdir, "login.db")
+    users = seeder.seed_database(db_path, users=args.legit_users + args.victims, expenses_per_user=0)
+    legit = [u for _, u in users[:args.legit_users]]
+    victims = [u for _, u in users[args.legit_users:]]
+
+    env = dict(os.environ, EXPENSES_DB=db_path, RATE_LIMIT_PATH=os.path.join(workdir, "ratelimit.db"), **extra_env)
+    if args.hash_method:
+        env["PASSWORD_HASH_METHOD"] = args.hash_method
+    cmd = ["gunicorn", "run:app", "-w", str(args.workers), "-b", f"127.0.0.1:{args.port}", "--timeout", "120"]
+    server = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for_server(f"http://127.0.0.1:{args.port}")
+        stop = threading.Event()
+        lock = threading.Lock()
+        attack_status = Counter()
+        legit_status = Counter()
+        legit_latencies = []
+
+        def attacker(index):
+            rng = random.Random(index)
+            ip = f"127.0.0.{2 + index % args.attacker_ips}"
+            while not stop.is_set():
+                status, _ = post_login(args.port, ip, rng.choice(victims), f"guess{rng.random()}")
+                with lock:
+                    attack_status[status] += 1
+
+        def legitimate(index):
+            rng = random.Random(1000 + index)
+            interval = args.legit_threads / args.legit_rate
+            next_at = time.perf_counter()
+            while not stop.is_set():
+                status, ms = post_login(args.port, f"127.0.1.{rng.randint(1, 250)}", rng.choice(legit), seeder.PASSWORD)
+                with lock:
+                    legit_status[status] += 1
+                    # 302 = logged in and redirected to the dashboard
+                    if status == 302:
+                        legit_latencies.append(ms)
+                next_at += interval
+                stop.wait(max(0.0, next_at - time.perf_counter()))
+
+        threads = [threading.Thread(target=attacker, args=(i,)) for i in range(args.attackers)]
+        threads += [threading.Thread(target=legitimate, args=(i,)) for i in range(args.legit_threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        stop.wait(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        legit_total = sum(legit_status.values())
+        summary = summarize(legit_latencies, elapsed)
+        return {
+            "scenario": name,
+            "legit_attempts": legit_total,
+            "legit_success": round(legit_status[302] / legit_total, 3) if legit_total else 0.0,
+            "legit_p50_ms": summary["p50_ms"],
+            "legit_p99_ms": summary["p99_ms"],
+            "attack_rps": round(sum(attack_status.values()) / elapsed, 1),
+            "attack_429": attack_status[429],
+            "attack_200": attack_status[200],
+            "legit_status": dict(legit_status),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--attackers", type=int, default=16)
+    parser.add_argument("--attacker-ips", type=int, default=8)
+    parser.add_argument("--victims", type=int, default=5)
+    parser.add_argument("--legit-users", type=int, default=100)
+    parser.add_argument("--legit-threads", type=int, default=4)
+    parser.add_argument("--legit-rate", type=float, default=5.0, help="Legit logins per second, all threads together")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--hash-method", help="PASSWORD_HASH_METHOD for the server")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    rows = [run_scenario(name, SCENARIOS[name], args) for name in args.scenarios]
+    print_table(rows, ["scenario", "legit_attempts", "legit_success", "legit_p50_ms", "legit_p99_ms",
+                       "attack_rps", "attack_429", "attack_200"])
+    if not args.no_save:
+        print(f"\nSaved {save_results('login', {'params': vars(args), 'scenarios': rows}, args.output)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
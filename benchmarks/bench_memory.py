@@ -0,0 +1,109 @@
+"""
+Per-worker memory of the web app, and what the serving path imports.
+
+    python -m benchmarks.bench_memory --expenses 2000
+
+Each case runs in a fresh interpreter, like a gunicorn worker. The worker
+imports run.py, logs in, then serves a dashboard, an /add_expense (the
+classifier) and two /api/chat questions (forecast, anomalies). Cases:
+
+  serving     the app as it is
+  old-import  the same, after importing pandas and scikit-learn first, which
+              is what the serving path loaded before it ran on NumPy alone
+
+Reported per case: resident memory after imports and after serving, and
+which of pandas / sklearn / scipy were loaded. Exits 1 if the `serving`
+worker loaded pandas or scikit-learn. pandas stays an optional extra
+(requirements-analysis.txt) for database.get_all_expenses_as_dataframe and
+notebooks.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from benchmarks import seed as seeder
+from benchmarks.common import ROOT, print_table, save_results
+
+HEAVY_MODULES = ["pandas", "sklearn", "scipy"]
+CASES = {
+    "serving": [],
+    "old-import": ["pandas", "sklearn.linear_model", "sklearn.ensemble", "sklearn.feature_extraction.text"],
+}
+
+def rss_mb():
+    """Current resident set size (Linux), else the peak from getrusage."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+def worker(preload, username):
+    """Runs inside the child process; prints one JSON line."""
+    import importlib
+    for name in preload:
+        importlib.import_module(name)
+    import run
+    result = {"rss_import_mb": rss_mb()}
+    client = run.app.test_client()
+    client.post("/login", data={"username": username, "password": seeder.PASSWORD})
+    for response in (client.get("/dashboard"),
+                     client.post("/add_expense", data={"raw_input": "chai 40"}),
+                     client.post("/api/chat", json={"message": "predict next month"}),
+                     client.post("/api/chat", json={"message": "any anomaly"})):
+        if response.status_code >= 400:
+            raise RuntimeError(f"request failed with {response.status_code}")
+    result["rss_served_mb"] = rss_mb()
+    result["loaded"] = [name for name in HEAVY_MODULES if name in sys.modules]
+    print(json.dumps(result))
+
+def run_case(preload, db_path, upload_dir, username):
+    env = dict(os.environ, EXPENSES_DB=db_path, UPLOAD_FOLDER=upload_dir, RATE_LIMIT_STORE="off")
+    code = f"from benchmarks.bench_memory import worker; worker({preload!r}, {username!r})"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    # The compiled classifier must exist, or the first worker would load the pickled one
+    from ai_engine.classifier import ExpenseClassifier
+    ExpenseClassifier().load_model()
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-memory-")
+    try:
+        db_path = os.path.join(workdir, "memory.db")
+        upload_dir = os.path.join(workdir, "uploads")
+        os.makedirs(upload_dir)
+        (_, username), = seeder.seed_database(db_path, users=1, expenses_per_user=args.expenses)
+        rows = [dict(case=case, **run_case(CASES[case], db_path, upload_dir, username)) for case in args.cases]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for row in rows:
+        row["loaded"] = ",".join(row["loaded"]) or "-"
+    print_table(rows, ["case", "rss_import_mb", "rss_served_mb", "loaded"])
+    if not args.no_save:
+        print(f"\nSaved {save_results('memory', {'params': vars(args), 'cases': rows}, args.output)}")
+    serving = next((row for row in rows if row["case"] == "serving"), None)
+    if serving and any(name in serving["loaded"].split(",") for name in ("pandas", "sklearn")):
+        print(f"\nFAIL: serving a dashboard loaded {serving['loaded']}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
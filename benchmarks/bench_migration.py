@@ -0,0 +1,201 @@
+"""
+Online schema migration on a large pre-migration database.
+
+    python -m benchmarks.bench_migration --rows 500000 --batch-size 5000
+
+Builds a database with the original schema: TEXT dates, REAL amounts and
+PRAGMA user_version 0. It then records what the old queries return for a
+sample of users: per-month report, month breakdown, daily totals and month
+row ids. After that, database.init_db() runs the pending migrations. During
+the migration, a writer thread keeps inserting rows without the new columns,
+the way older code does. Reported:
+
+  migrate_s          wall time of init_db
+  writer_p99_ms/max  insert latency seen by the concurrent writer, i.e. how
+                     long a backfill batch or an index build holds the
+                     write lock
+  untyped_rows       rows left without ts/amount_minor (must be 0, including
+                     the writer's rows, which the insert trigger fills)
+  mismatches         analytics results that differ from the old queries
+
+Exits 1 if any row is left untyped or any result differs.
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import database
+from benchmarks import seed as seeder
+from benchmarks.common import print_table, save_results, summarize
+
+def build_legacy_db(path, users, rows, months, batch=50000):
+    """The schema before migrations: only users and expenses, as the first version created them."""
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            security_pin TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            expense_text TEXT NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            date TEXT NOT NULL,
+            user_id INTEGER,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+    conn.executemany("INSERT INTO users (username, password_hash, security_pin) VALUES (?, '-', '0000')",
+                     [(seeder.username_for(i),) for i in range(users)])
+    rng = random.Random(5)
+    done = 0
+    while done < rows:
+        n = min(batch, rows - done)
+        # Paisa amounts make float sums drift, which the minor-unit columns must not change
+        conn.executemany("INSERT INTO expenses (expense_text, amount, category, date, user_id) VALUES (?, ?, ?, ?, ?)",
+                         [(t, a + rng.choice([0, 0.1, 0.25, 0.99]), cat, d, rng.randint(1, users))
+                          for t, a, cat, d in seeder.synthetic_expenses(n, days=months * 30, rng=rng)])
+        conn.commit()
+        done += n
+    conn.close()
+
+def legacy_results(path, user_ids):
+    """What the pre-migration queries returned (the old report SQL, the Python month scans)."""
+    conn = sqlite3.connect(path)
+    results = {}
+    for user_id in user_ids:
+        report = conn.execute('''
+            SELECT strftime('%Y-%m', date) AS month, category, COUNT(*), SUM(amount), AVG(amount), MAX(amount)
+            FROM expenses WHERE user_id = ? GROUP BY month, category
+        ''', (user_id,)).fetchall()
+        results[("report", user_id)] = {(m, c): (n, t, a, x) for m, c, n, t, a, x in report}
+        for month in {m for m, *_ in report}:
+            rows = conn.execute("SELECT id, amount, category, date FROM expenses WHERE user_id = ? AND strftime('%Y-%m', date) = ?",
+                                (user_id, month)).fetchall()
+            breakdown, daily = {}, {}
+            for _, amount, category, date in rows:
+                breakdown[category] = breakdown.get(category, 0) + amount
+                day = date.split(" ")[0]
+                daily[day] = daily.get(day, 0) + amount
+            results[("ids", user_id, month)] = sorted(r[0] for r in rows)
+            results[("breakdown", user_id, month)] = breakdown
+            results[("daily", user_id, month)] = dict(sorted(daily.items()))
+    conn.close()
+    return results
+
+def current_results(user_ids):
+    results = {}
+    for user_id in user_ids:
+        report = database.get_monthly_report(user_id)
+        results[("report", user_id)] = {(r['month'], r['category']): (r['count'], r['total'], r['average'], r['largest'])
+                                        for r in report}
+        for month in {r['month'] for r in report}:
+            totals = database.get_month_totals(user_id, month)
+            totals.pop(database.ALL_CATEGORIES, None)
+            results[("ids", user_id, month)] = sorted(r['id'] for r in database.get_expenses(user_id=user_id, month=month))
+            results[("breakdown", user_id, month)] = totals
+            results[("daily", user_id, month)] = database.get_daily_totals(user_id, month)
+    return results
+
+def same(old, new):
+    """Equal up to float noise: the old REAL sums drift by ~1e-9, the minor-unit sums are exact."""
+    if isinstance(old, dict):
+        return isinstance(new, dict) and set(old) == set(new) and all(same(old[k], new[k]) for k in old)
+    if isinstance(old, (list, tuple)):
+        return isinstance(new, (list, tuple)) and len(old) == len(new) and all(same(a, b) for a, b in zip(old, new))
+    if isinstance(old, float) or isinstance(new, float):
+        return abs(old - new) < 1e-6
+    return old == new
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--batch-size", type=int, default=database.MIGRATION_BATCH_SIZE)
+    parser.add_argument("--check-users", type=int, default=5, help="Users whose analytics are compared")
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-migrate-")
+    try:
+        path = os.path.join(workdir, "legacy.db")
+        start = time.perf_counter()
+        build_legacy_db(path, args.users, args.rows, args.months)
+        print(f"Built {args.rows} legacy rows in {time.perf_counter() - start:.1f}s")
+        # The writer only touches the last user, so the others can be compared with the legacy results
+        checked = list(range(1, min(args.check_users, args.users - 1) + 1))
+        expected = legacy_results(path, checked)
+
+        stop = threading.Event()
+        latencies = []
+
+        def writer():
+            conn = database.get_connection()
+            rng = random.Random(9)
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                conn.execute("INSERT INTO expenses (expense_text, amount, category, date, user_id) "
+                             "VALUES ('during migration', ?, 'Food & Dining', datetime('now'), ?)",
+                             (rng.randint(10, 999), args.users))
+                conn.commit()
+                latencies.append((time.perf_counter() - t0) * 1000)
+                time.sleep(0.002)
+            conn.close()
+
+        database.DB_NAME = path
+        thread = threading.Thread(target=writer)
+        thread.start()
+        start = time.perf_counter()
+        database.init_db(migration_batch_size=args.batch_size)
+        migrate_s = time.perf_counter() - start
+        stop.set()
+        thread.join()
+
+        conn = database.get_connection()
+        untyped = conn.execute("SELECT COUNT(*) FROM expenses WHERE ts IS NULL OR amount_minor IS NULL").fetchone()[0]
+        version = database.schema_version(conn)
+        conn.close()
+
+        actual = current_results(checked)
+        mismatches = [key for key in expected if not same(expected[key], actual.get(key))]
+        for key in mismatches[:5]:
+            print(f"  differs: {key}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    writes = summarize(latencies)
+    row = {
+        "rows": args.rows,
+        "batch_size": args.batch_size,
+        "schema_version": version,
+        "migrate_s": round(migrate_s, 2),
+        "writer_inserts": writes["count"],
+        "writer_p99_ms": writes["p99_ms"],
+        "writer_max_ms": writes["max_ms"],
+        "untyped_rows": untyped,
+        "checked": len(expected),
+        "mismatches": len(mismatches),
+    }
+    print_table([row], list(row))
+    if not args.no_save:
+        print(f"\nSaved {save_results('migration', {'params': vars(args), 'result': row}, args.output)}")
+    if untyped or mismatches:
+        print("\nFAIL: rows left untyped or analytics changed by the migration")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Multi-page receipt OCR (ai_engine.ocr.extract_pages): wall time against page count.
+
+    python -m benchmarks.bench_ocr --pages 1 2 4 8 --processes 4
+
+Generates a corpus in a temp directory: receipts with known items drawn at
+phone-scan resolution, saved as multi-frame TIFFs, image-only PDFs (scans),
+PDFs with a text layer (exported statements), and photos with up to four
+receipts side by side on a dark table. For each kind and page count:
+
+  pages        pages / receipts found (must equal the count generated)
+  prepare_ms   splitting the file into page images (load_pages)
+  serial_s     extract_pages with one process
+  pool_s       extract_pages on a pool of --processes (started before timing)
+  speedup      serial_s / pool_s
+  in_order     the receipt markers come back in page order
+  items        items parse_receipt_items found / items drawn
+
+The OCR columns need the tesseract binary; without it they show "-" and only
+the page splitting is measured and checked. Exits 1 if a file splits into
+the wrong number of pages or the pages come back out of order.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+from ai_engine import ocr
+from benchmarks.common import print_table, save_results
+
+ITEMS = ["Chicken Pulao", "Shami Kebab", "Cold Drink", "Naan", "Chai", "Biryani", "Raita", "Samosa"]
+
+def receipt_image(index, rng, width=1240, height=1754):
+    """A receipt page (150 dpi A5) with a marker line and 5 items; returns (image, items)."""
+    font = ImageFont.load_default(size=40)
+    image = Image.new("L", (width, height), 248)
+    draw = ImageDraw.Draw(image)
+    draw.text((80, 80), f"RECEIPT NO {1000 + index}", fill=10, font=font)
+    items = [(rng.choice(ITEMS), rng.randint(50, 900)) for _ in range(5)]
+    for line, (name, amount) in enumerate(items):
+        draw.text((80, 200 + line * 90), f"{name}  {amount}.00", fill=10, font=font)
+    draw.text((80, 200 + len(items) * 90 + 60), f"Total {sum(a for _, a in items)}.00", fill=10, font=font)
+    return image, items
+
+def make_tiff(path, pages, rng):
+    images, items = zip(*(receipt_image(i, rng) for i in range(pages)))
+    images[0].save(path, save_all=True, append_images=list(images[1:]), compression="tiff_deflate")
+    return [item for page in items for item in page]
+
+def make_pdf(path, pages, rng, text_layer):
+    from fpdf import FPDF
+    pdf = FPDF(format="A5")
+    items = []
+    for i in range(pages):
+        pdf.add_page()
+        if text_layer:
+            page_items = [(rng.choice(ITEMS), rng.randint(50, 900)) for _ in range(5)]
+            pdf.set_font("Arial", size=14)
+            pdf.cell(0, 10, f"RECEIPT NO {1000 + i}", ln=1)
+            for name, amount in page_items:
+                pdf.cell(0, 10, f"{name}  {amount}.00", ln=1)
+        else:
+            image, page_items = receipt_image(i, rng)
+            image_path = f"{path}.{i}.png"
+            image.save(image_path)
+            pdf.image(image_path, x=0, y=0, w=148)
+        items += page_items
+    pdf.output(path)
+    return items
+
+def make_photo(path, receipts, rng):
+    """Receipts side by side on a dark table, as one photo."""
+    images, items = zip(*(receipt_image(i, rng, 900, 1300) for i in range(receipts)))
+    table = Image.new("L", (receipts * 1000 + 100, 1600), 70)
+    for i, image in enumerate(images):
+        table.paste(image, (100 + i * 1000, 150 + rng.randint(0, 100)))
+    table.save(path, quality=90)
+    return [item for page in items for item in page]
+
+def has_tesseract():
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+def in_order(texts):
+    """The RECEIPT NO markers appear page by page in increasing order (pages where OCR missed one are skipped)."""
+    seen = []
+    for text in texts:
+        for token in text.split():
+            if token.isdigit() and 1000 <= int(token) < 2000:
+                seen.append(int(token))
+                break
+    return seen == sorted(seen)
+
+def items_found(texts, items):
+    found = [(item['desc'].strip(), item['amount']) for item in ocr.parse_receipt_items(texts)]
+    return sum(1 for name, amount in items if any(name in desc and amount == got for desc, got in found))
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def run_case(kind, count, path, items, args, tesseract):
+    pages, prepare_s = timed(lambda: ocr.load_pages(path))
+    row = {"kind": kind, "count": count, "pages": len(pages), "prepare_ms": round(prepare_s * 1000, 1),
+           "serial_s": "-", "pool_s": "-", "speedup": "-", "in_order": "-", "items": "-"}
+    if tesseract or kind == "pdf-text":
+        serial, serial_s = timed(lambda: ocr.extract_pages(path, processes=1))
+        pooled, pool_s = timed(lambda: ocr.extract_pages(path, processes=args.processes))
+        row.update(serial_s=round(serial_s, 3), pool_s=round(pool_s, 3),
+                   speedup=round(serial_s / pool_s, 2) if pool_s else "-",
+                   in_order=serial == pooled and in_order(pooled),
+                   items=f"{items_found(pooled, items)}/{len(items)}")
+    return row
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--kinds", nargs="+", default=["tiff", "pdf-scan", "pdf-text", "photo"])
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    tesseract = has_tesseract()
+    ocr.OCR_PROCESSES = args.processes
+    if tesseract and args.processes > 1:
+        # Start the pool outside the timings, as a long-running worker would have it
+        list(ocr._get_pool().map(abs, range(args.processes)))
+    rng = random.Random(7)
+    workdir = tempfile.mkdtemp(prefix="smartexp-ocr-")
+    rows = []
+    try:
+        for kind in args.kinds:
+            for count in args.pages:
+                if kind == "photo" and count > 4:
+                    continue
+                path = os.path.join(workdir, f"{kind}-{count}" + (".pdf" if kind.startswith("pdf") else
+                                                                  ".tiff" if kind == "tiff" else ".jpg"))
+                if kind == "tiff":
+                    items = make_tiff(path, count, rng)
+                elif kind == "photo":
+                    items = make_photo(path, count, rng)
+                else:
+                    items = make_pdf(path, count, rng, text_layer=kind == "pdf-text")
+                rows.append(run_case(kind, count, path, items, args, tesseract))
+    finally:
+        ocr._reset_pool()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows, list(rows[0]))
+    if not tesseract:
+        print("\ntesseract not found: OCR timings skipped, page splitting only (PDF text layers are still read)")
+    if not args.no_save:
+        print(f"\nSaved {save_results('ocr', {'params': vars(args), 'tesseract': tesseract, 'cases': rows}, args.output)}")
+    wrong = [row for row in rows if row["pages"] != row["count"] or row["in_order"] is False]
+    if wrong:
+        print("\nFAIL: " + ", ".join(f"{row['kind']} x{row['count']}" for row in wrong))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
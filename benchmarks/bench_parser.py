@@ -0,0 +1,91 @@
+"""
+Natural-language parser checks and throughput.
+
+    python -m benchmarks.bench_parser --cases 20000 --lines 20000
+
+The first part runs the property checks of tests/test_parser.py on --cases
+random expense lists and as many noise strings. Failures are printed with
+their input and the script exits 1.
+
+The second part times ai_engine.parser.parse_input on a bulk paste of --lines
+lines and compares it with the regex parser it replaced.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+
+from ai_engine.parser import parse_input
+from benchmarks.common import print_table, save_results
+from tests.test_parser import check_properties, random_case
+
+def legacy_parse_input(user_input):
+    """The pre-tokenizer parser from run.py, kept for the throughput comparison."""
+    def clean(t): return t.strip().strip(',').strip('and').strip()
+    items = []
+    pattern = re.compile(r'([a-zA-Z\s,]+?)(\d+(?:\.\d+)?)')
+    for text, amount_str in pattern.findall(user_input):
+        desc = clean(text)
+        if desc:
+            items.append((desc, float(amount_str)))
+    if not items:
+        match = re.search(r'(\d+(\.\d+)?)', user_input)
+        if match:
+            items.append((user_input.replace(match.group(1), "").strip(), float(match.group(1))))
+    return items
+
+# --- Throughput ---
+
+def bulk_paste(lines, seed):
+    rng = random.Random(seed)
+    return "\n".join(random_case(rng)[0].replace("\n", " ") for _ in range(lines))
+
+def time_parser(func, text, repeat):
+    best = None
+    items = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        items = len(func(text))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, items
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--lines", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    failures = check_properties(args.cases, args.seed)
+    print(f"Property checks: {2 * args.cases} inputs, {len(failures)} failures")
+    for line, expected, got in failures[:20]:
+        print(f"  input:    {line!r}\n  expected: {expected}\n  got:      {got}")
+
+    text = bulk_paste(args.lines, args.seed)
+    rows = []
+    results = {"params": vars(args), "failures": len(failures), "parsers": {}}
+    for name, func in (("tokenizer", parse_input), ("legacy_regex", legacy_parse_input)):
+        seconds, items = time_parser(func, text, args.repeat)
+        row = {
+            "parser": name,
+            "items": items,
+            "seconds": round(seconds, 4),
+            "lines_per_s": round(args.lines / seconds),
+            "mb_per_s": round(len(text.encode()) / seconds / 1e6, 2),
+        }
+        rows.append(row)
+        results["parsers"][name] = row
+    print(f"\nBulk paste: {args.lines} lines, {len(text.encode()) / 1e6:.2f} MB")
+    print_table(rows, ["parser", "items", "seconds", "lines_per_s", "mb_per_s"])
+
+    if not args.no_save:
+        print(f"\nSaved {save_results('parser', results, args.output)}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Receipt derivatives (receipts.py): size and serving cost vs the originals.
+
+    python -m benchmarks.bench_receipts --count 8 --width 4032 --height 3024
+
+Generates --count phone-camera-sized JPEG receipts (printed lines over
+sensor-like noise), stores them for one user as /upload_receipt does, and
+requests every variant through the Flask test client. Reported per variant:
+
+  kb            average file size, next to the original's
+  cold_ms       first request, which renders the file
+  warm_ms       later requests, served from the cache
+  no_draft_ms   rendering without decoding the JPEG at reduced scale
+
+plus the image bytes of a history page with all receipts as thumbnails vs
+as originals. Checked along the way: sizes fit the variant, WebP is served
+only to clients that accept it, the cache headers, a 304 for a known ETag,
+a 404 for another user, and that sweep_orphans removes exactly the files of
+receipts whose expenses were deleted. Exits 1 on any failed check.
+"""
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image, ImageDraw, ImageOps
+
+from benchmarks import seed as seeder
+from benchmarks.common import print_table, save_results, summarize
+
+def synthetic_receipt(index, width, height):
+    """JPEG bytes of a photographed receipt: noise for the camera sensor, dark lines of text."""
+    image = Image.merge("RGB", [Image.effect_noise((width, height), 24).point(lambda v: v + 100)] * 3)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([width // 5, 0, width * 4 // 5, height], fill=(235, 232, 225))
+    for line in range(60):
+        draw.text((width // 5 + 40, 40 + line * (height // 62)), f"ITEM {index}-{line} ........ {line * 37 % 900}.00",
+                  fill=(30, 30, 30))
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+def render_without_draft(source, size, grayscale):
+    """receipts._render before reduced-scale decoding."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        image = ImageOps.autocontrast(image.convert("L"), cutoff=1) if grayscale else image.convert("RGB")
+        image.save(io.BytesIO(), "PNG" if grayscale else "JPEG")
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, (time.perf_counter() - start) * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=8)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-receipts-")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(workdir, "uploads")
+    os.environ["RECEIPT_SWEEP_HOURS"] = "0"
+    wrong = []
+    try:
+        (user_id, username), = seeder.seed_database(os.path.join(workdir, "receipts.db"), users=1, expenses_per_user=10)
+        import database
+        import receipts
+        import run
+        client = run.app.test_client()
+        client.post("/login", data={"username": username, "password": seeder.PASSWORD})
+        database.register_user("other", "pw", "0000")
+        other = run.app.test_client()
+        other.post("/login", data={"username": "other", "password": "pw"})
+
+        names, expense_ids, original_bytes = [], [], 0
+        for index in range(args.count):
+            data = synthetic_receipt(index, args.width, args.height)
+            original_bytes += len(data)
+            name = receipts.save_upload(io.BytesIO(data), "IMG_0001.JPG")
+            names.append(name)
+            expense_ids.append(database.add_expense(f"receipt {index}", 100 + index, "Shopping", user_id, receipt=name))
+
+        rows = []
+        cases = [("thumb", "image/webp,*/*"), ("thumb", "image/jpeg,*/*"), ("medium", "image/webp,*/*"),
+                 ("medium", "*/*"), ("ocr", "*/*")]
+        for variant, accept in cases:
+            size, grayscale = receipts.VARIANTS[variant]
+            fmt = receipts.output_format(variant, accept)
+            cold, warm, no_draft, sizes = [], [], [], []
+            for name in names:
+                url = f"/receipts/{name}/{variant}"
+                response, ms = timed(lambda: client.get(url, headers={"Accept": accept}))
+                cold.append(ms)
+                sizes.append(len(response.data))
+                if response.mimetype != receipts.MIMETYPES[fmt] or max(Image.open(io.BytesIO(response.data)).size) > size:
+                    wrong.append(f"{variant} for {accept}: {response.mimetype} {Image.open(io.BytesIO(response.data)).size}")
+                if response.headers.get("Cache-Control") != receipts.CACHE_CONTROL:
+                    wrong.append(f"{variant}: Cache-Control {response.headers.get('Cache-Control')}")
+                if client.get(url, headers={"Accept": accept, "If-None-Match": response.headers["ETag"]}).status_code != 304:
+                    wrong.append(f"{variant}: no 304 for its ETag")
+                for _ in range(args.repeat):
+                    warm.append(timed(lambda: client.get(url, headers={"Accept": accept}))[1])
+                no_draft.append(timed(lambda: render_without_draft(os.path.join(receipts.UPLOAD_FOLDER, name),
+                                                                   size, grayscale))[1])
+            rows.append({
+                "variant": variant,
+                "format": fmt,
+                "kb": round(sum(sizes) / len(sizes) / 1024, 1),
+                "original_kb": round(original_bytes / len(names) / 1024, 1),
+                "cold_ms": summarize(cold)["p50_ms"],
+                "warm_ms": summarize(warm)["p50_ms"],
+                "no_draft_ms": summarize(no_draft)["p50_ms"],
+            })
+            if variant == "thumb" and fmt == "webp":
+                thumb_bytes = sum(sizes)
+
+        if other.get(f"/receipts/{names[0]}/thumb").status_code != 404:
+            wrong.append("another user can read the receipt")
+        history = client.get("/history").get_data(as_text=True)
+        if sum(f"/receipts/{name}/thumb" in history for name in names) != len(names):
+            wrong.append("history does not show every thumbnail")
+
+        # Delete half the expenses: exactly their receipts and cached copies go
+        gone = set(names[::2])
+        for name, expense_id in zip(names, expense_ids):
+            if name in gone:
+                database.delete_expense(expense_id, user_id)
+        removed = receipts.sweep_orphans(min_age=0)
+        left = set(os.listdir(receipts.UPLOAD_FOLDER))
+        derived = os.listdir(receipts.cache_dir())
+        if left & gone or not set(names) - gone <= left:
+            wrong.append("sweep removed the wrong originals")
+        if any(name.split(".")[0] in entry for name in gone for entry in derived) \
+                or removed["originals"] != len(gone) or removed["derivatives"] != len(gone) * len(cases):
+            wrong.append(f"sweep removed {removed}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(rows, list(rows[0]))
+    print(f"\nHistory page images for {len(names)} receipts: {thumb_bytes / 1024:.0f} KB of WebP thumbnails "
+          f"vs {original_bytes / 1024:.0f} KB of originals")
+    if not args.no_save:
+        results = {"params": vars(args), "variants": rows, "history_thumb_bytes": thumb_bytes,
+                   "history_original_bytes": original_bytes}
+        print(f"\nSaved {save_results('receipts', results, args.output)}")
+    if wrong:
+        print("\nFAIL:\n  " + "\n  ".join(wrong))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
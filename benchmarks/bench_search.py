@@ -0,0 +1,104 @@
+"""
+Full-text search vs a LIKE '%...%' scan.
+
+    python -m benchmarks.bench_search --rows 1000000
+
+Seeds one user with --rows synthetic expenses (FTS index maintained by the
+insert trigger), then times database.search_expenses against the equivalent
+`expense_text LIKE '%term%'` query for a set of terms, including transliterated
+spellings that only the FTS path can match.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import database
+from benchmarks import seed as seeder
+from benchmarks.common import print_table, save_results, summarize
+
+TERMS = ["chai", "chaye", "petrol", "patrol", "biryani", "careem", "bill", "kar", "zinger burger", "medicine"]
+
+def seed_rows(db_path, rows, batch=50000):
+    database.DB_NAME = db_path
+    database.init_db()
+    conn = database.get_connection()
+    c = conn.cursor()
+    c.execute("INSERT INTO users (username, password_hash, security_pin) VALUES ('search_bench', '-', '0000')")
+    user_id = c.lastrowid
+    rng = random.Random(1)
+    done = 0
+    while done < rows:
+        n = min(batch, rows - done)
+        c.executemany("INSERT INTO expenses (expense_text, amount, category, date, user_id) VALUES (?, ?, ?, ?, ?)",
+                      [(t, a, cat, d, user_id) for t, a, cat, d in seeder.synthetic_expenses(n, days=365, rng=rng)])
+        conn.commit()
+        done += n
+    conn.close()
+    return user_id
+
+def like_search(user_id, term, per_page=20):
+    conn = database.get_connection()
+    c = conn.cursor()
+    pattern = f"%{term}%"
+    c.execute("SELECT COUNT(*) FROM expenses WHERE user_id = ? AND expense_text LIKE ?", (user_id, pattern))
+    total = c.fetchone()[0]
+    c.execute("SELECT * FROM expenses WHERE user_id = ? AND expense_text LIKE ? ORDER BY date DESC LIMIT ?",
+              (user_id, pattern, per_page))
+    rows = c.fetchall()
+    conn.close()
+    return rows, total
+
+def time_calls(func, repeat):
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--terms", nargs="+", default=TERMS)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-search-")
+    try:
+        start = time.perf_counter()
+        user_id = seed_rows(os.path.join(workdir, "search.db"), args.rows)
+        seed_seconds = time.perf_counter() - start
+
+        rows = []
+        results = {"params": {"rows": args.rows, "seed_seconds": round(seed_seconds, 1)}, "terms": {}}
+        for term in args.terms:
+            fts_lat, (_, fts_total) = time_calls(lambda: database.search_expenses(user_id, term), args.repeat)
+            like_lat, (_, like_total) = time_calls(lambda: like_search(user_id, term), args.repeat)
+            fts, like = summarize(fts_lat), summarize(like_lat)
+            results["terms"][term] = {"fts": dict(fts, matches=fts_total), "like": dict(like, matches=like_total)}
+            rows.append({
+                "term": term,
+                "fts_matches": fts_total,
+                "like_matches": like_total,
+                "fts_p50_ms": fts["p50_ms"],
+                "like_p50_ms": like["p50_ms"],
+                "speedup": round(like["p50_ms"] / fts["p50_ms"], 1) if fts["p50_ms"] else "",
+            })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{args.rows} rows seeded in {seed_seconds:.1f}s\n")
+    print_table(rows, ["term", "fts_matches", "like_matches", "fts_p50_ms", "like_p50_ms", "speedup"])
+    if not args.no_save:
+        print(f"\nSaved {save_results('search', results, args.output)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
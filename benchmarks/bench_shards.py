@@ -0,0 +1,163 @@
+"""
+Concurrent expense writes with one database file vs users sharded over N files.
+
+    python -m benchmarks.bench_shards --shards 1 4 8 --workers 8 --users 64
+
+For each shard count, --users users are seeded into the main file and moved
+to their shards with database.rebalance_shards (1 = no sharding). Then
+--workers processes, like gunicorn workers, each add expenses for their own
+slice of the users for --seconds with database.add_expense. Reported per
+shard count:
+
+  inserts_s    committed inserts per second over all workers
+  p50/p99_ms   add_expense latency
+  locked       inserts that failed with "database is locked"
+  mismatches   users whose expense count or totals don't match what was
+               written, plus users whose monthly report changed when
+               rebalanced to the next shard count
+
+Exits 1 on any mismatch.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import database
+from benchmarks import seed as seeder
+from benchmarks.common import ROOT, print_table, save_results, summarize
+
+def shards_setting(shards):
+    return "" if shards <= 1 else str(shards)
+
+def worker(user_ids, start_at, seconds):
+    """Runs inside a child process; prints one JSON line."""
+    rng = random.Random(user_ids[0])
+    categories = list(database.DEFAULT_CATEGORY_BUDGETS)
+    added = {user_id: 0 for user_id in user_ids}
+    latencies, locked = [], 0
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = start_at + seconds
+    while time.time() < deadline:
+        user_id = rng.choice(user_ids)
+        start = time.perf_counter()
+        try:
+            database.add_expense("bench chai", rng.randint(50, 3000), rng.choice(categories), user_id)
+        except sqlite3.OperationalError:
+            locked += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        added[user_id] += 1
+    print(json.dumps({"latencies": latencies, "locked": locked, "added": added}))
+
+def run_writers(db_path, shards, user_ids, args):
+    env = dict(os.environ, EXPENSES_DB=db_path, SHARDS=shards_setting(shards))
+    start_at = time.time() + 2  # every worker imports and connects first
+    procs = []
+    for index in range(args.workers):
+        chunk = user_ids[index::args.workers]
+        code = f"from benchmarks.bench_shards import worker; worker({chunk!r}, {start_at!r}, {args.seconds!r})"
+        procs.append(subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, env=env,
+                                      stdout=subprocess.PIPE, text=True))
+    return [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in procs]
+
+def snapshot(user_ids):
+    return {user_id: [tuple(row) for row in database.get_monthly_report(user_id)] for user_id in user_ids}
+
+def check_counts(user_ids, seeded_counts, added):
+    """Users whose stored expenses or running totals don't add up to what was written."""
+    wrong = []
+    for user_id in user_ids:
+        expenses = database.get_expenses(user_id=user_id)
+        expected = seeded_counts[user_id] + added.get(str(user_id), 0)
+        totals = {}
+        for row in expenses:
+            totals[row['date'][:7]] = totals.get(row['date'][:7], 0) + row['amount_minor']
+        stored = {month: round(database.get_month_totals(user_id, month).get(database.ALL_CATEGORIES, 0) * 100)
+                  for month in totals}
+        if len(expenses) != expected or stored != totals:
+            wrong.append(user_id)
+    return wrong
+
+def run_config(shards, next_shards, args, workdir):
+    db_path = os.path.join(workdir, f"shards-{shards}", "main.db")
+    os.makedirs(os.path.dirname(db_path))
+    seeded = seeder.seed_database(db_path, users=args.users, expenses_per_user=args.expenses)
+    user_ids = [user_id for user_id, _ in seeded]
+    database._routes.clear()
+    database.rebalance_shards(shards_setting(shards))
+    seeded_counts = {user_id: args.expenses for user_id in user_ids}
+
+    results = run_writers(db_path, shards, user_ids, args)
+    latencies = [ms for result in results for ms in result["latencies"]]
+    added = {}
+    for result in results:
+        for user_id, count in result["added"].items():
+            added[user_id] = added.get(user_id, 0) + count
+
+    database.SHARDS = shards_setting(shards)
+    database._routes.clear()
+    wrong = check_counts(user_ids, seeded_counts, added)
+    # Rebalancing to another shard count must not change what users see
+    if next_shards is not None:
+        before = snapshot(user_ids)
+        database.rebalance_shards(shards_setting(next_shards))
+        database._routes.clear()
+        database.SHARDS = shards_setting(next_shards)
+        after = snapshot(user_ids)
+        wrong += [user_id for user_id in user_ids if before[user_id] != after[user_id]]
+    database.SHARDS = ""
+
+    summary = summarize(latencies, args.seconds)
+    return {
+        "shards": shards,
+        "workers": args.workers,
+        "inserts": len(latencies),
+        "inserts_s": round(len(latencies) / args.seconds, 1),
+        "p50_ms": summary["p50_ms"],
+        "p99_ms": summary["p99_ms"],
+        "max_ms": summary["max_ms"],
+        "locked": sum(result["locked"] for result in results),
+        "mismatches": len(set(wrong)),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--expenses", type=int, default=200, help="Seeded per user")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-shards-")
+    try:
+        rows = []
+        for index, shards in enumerate(args.shards):
+            next_shards = args.shards[(index + 1) % len(args.shards)] if len(args.shards) > 1 else None
+            rows.append(run_config(shards, next_shards, args, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    base = rows[0]["inserts_s"] or 1
+    for row in rows:
+        row["speedup"] = round(row["inserts_s"] / base, 2)
+    print_table(rows, list(rows[0]))
+    if not args.no_save:
+        print(f"\nSaved {save_results('shards', {'params': vars(args), 'configs': rows}, args.output)}")
+    failed = sum(row["mismatches"] for row in rows)
+    if failed:
+        print(f"\nFAIL: {failed} users with expenses or reports that don't match")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
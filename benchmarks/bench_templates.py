@@ -0,0 +1,226 @@
+"""
+Page rendering (templating.py) and static assets (assets.py).
+
+    python -m benchmarks.bench_templates --expenses 2000 --starts 3
+
+Seeds one user with --expenses expenses. Three parts:
+
+  pages     /dashboard and /history through the Flask test client with the
+            fragment cache on (hits), off (every request renders and
+            queries), and right after a write (a miss)
+  warm-up   fresh worker processes importing run.py, like gunicorn workers:
+            the time loading the templates takes and the first /dashboard
+            and /history, with the bytecode cache off, empty (the first
+            worker after a deploy) and filled by an earlier worker
+  assets    raw, gzip and brotli size of each fingerprinted asset
+
+Checked along the way: a cached page is the same HTML as an uncached one; a
+new expense and a currency change show up on the next request; another user
+never gets the first user's fragments; pages link the hashed assets and no
+CDN script; /assets/ sends the encoding the client accepts, the right bytes,
+a one-year immutable Cache-Control, Vary: Accept-Encoding, a 304 for a known
+ETag and a 404 for unknown names; the empty bytecode cache is filled. Exits
+1 on any failed check.
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks import seed as seeder
+from benchmarks.common import ROOT, print_table, save_results, summarize
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAGES = ("/dashboard", "/history")
+
+def worker(username):
+    """Runs inside a fresh interpreter; prints one JSON line of timings in ms."""
+    import templating
+    warm = templating.warm
+    spent = []
+
+    def timed_warm(app):
+        start = time.perf_counter()
+        warm(app)
+        spent.append((time.perf_counter() - start) * 1000)
+
+    templating.warm = timed_warm
+    start = time.perf_counter()
+    import run
+    result = {"import_ms": (time.perf_counter() - start) * 1000, "templates_ms": spent[0]}
+    client = run.app.test_client()
+    client.post("/login", data={"username": username, "password": seeder.PASSWORD})
+    for page in PAGES:
+        start = time.perf_counter()
+        if client.get(page).status_code != 200:
+            raise RuntimeError(f"{page} failed")
+        result[page] = (time.perf_counter() - start) * 1000
+    print(json.dumps(result))
+
+def start_worker(env, username):
+    code = f"from benchmarks.bench_templates import worker; worker({username!r})"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def warm_up(env, username, cache_dir, starts):
+    """Rows for the bytecode cache off / empty / filled, each the median of --starts workers."""
+    rows = []
+    for mode in ("off", "empty", "filled"):
+        runs = []
+        for _ in range(starts):
+            if mode == "empty":
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            runs.append(start_worker(dict(env, TEMPLATE_CACHE_DIR="off" if mode == "off" else cache_dir), username))
+        row = {"bytecode_cache": mode}
+        for key in ("import_ms", "templates_ms") + PAGES:
+            row[f"first {key}" if key in PAGES else key] = round(sorted(r[key] for r in runs)[len(runs) // 2], 1)
+        rows.append(row)
+    return rows
+
+def timed_get(client, url, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return summarize(latencies)["p50_ms"]
+
+def page_rows(templating, cache, client, repeat, wrong):
+    store = templating.fragment_cache
+    rows = []
+    for page in PAGES:
+        client.get(page)
+        cached_html = client.get(page).get_data(as_text=True)
+        row = {"page": page, "cached_ms": timed_get(client, page, repeat)}
+        templating.fragment_cache = cache.NullCache()
+        try:
+            if client.get(page).get_data(as_text=True) != cached_html:
+                wrong.append(f"{page}: cached HTML differs from a fresh render")
+            row["uncached_ms"] = timed_get(client, page, repeat)
+        finally:
+            templating.fragment_cache = store
+        after_write = []
+        for index in range(repeat):
+            client.post("/add_expense", data={"raw_input": f"chai {index + 1}"})
+            start = time.perf_counter()
+            client.get(page)
+            after_write.append((time.perf_counter() - start) * 1000)
+        row["after_write_ms"] = round(sorted(after_write)[len(after_write) // 2], 2)
+        row["kb"] = round(len(cached_html.encode()) / 1024, 1)
+        rows.append(row)
+    return rows
+
+def check_invalidation(client, other, wrong):
+    client.post("/add_expense", data={"raw_input": "zqxbench widget 4321"})
+    if "zqxbench" not in client.get("/history").get_data(as_text=True):
+        wrong.append("history does not show a new expense")
+    client.post("/update_settings", data={"currency": "EUR"})
+    if "EUR" not in client.get("/history").get_data(as_text=True):
+        wrong.append("history does not show the new currency")
+    if "zqxbench" in other.get("/history").get_data(as_text=True):
+        wrong.append("another user got the first user's history")
+
+def check_assets(client, assets, html, wrong):
+    """Rows of sizes per asset; appends failed header and content checks to wrong."""
+    links = re.findall(r'(?:href|src)="(/assets/[^"]+)"', html)
+    if len(links) != len(assets.ASSETS) or "cdn.jsdelivr" in html:
+        wrong.append(f"page links {links} instead of the hashed assets")
+    rows = []
+    for name in assets.ASSETS:
+        with open(os.path.join(assets.STATIC_FOLDER, name), "rb") as f:
+            data = f.read()
+        url = f"/assets/{assets.fingerprinted_name(name, data)}"
+        row = {"asset": name, "raw_kb": round(len(data) / 1024, 1)}
+        for accept, encoding in (("br, gzip", "br"), ("gzip", "gzip"), ("", None)):
+            response = client.get(url, headers={"Accept-Encoding": accept})
+            if encoding == "br" and assets.brotli is None:
+                encoding = "gzip"  # no .br copies without the brotli package
+            decode = {"br": brotli and brotli.decompress, "gzip": gzip.decompress}.get(encoding, bytes)
+            if response.status_code != 200 or response.content_encoding != encoding \
+                    or decode(response.data) != data:
+                wrong.append(f"{url} for {accept!r}: {response.status_code} {response.content_encoding}")
+            if response.headers.get("Cache-Control") != assets.CACHE_CONTROL \
+                    or "accept-encoding" not in response.headers.get("Vary", "").lower():
+                wrong.append(f"{url}: Cache-Control {response.headers.get('Cache-Control')!r}, "
+                             f"Vary {response.headers.get('Vary')!r}")
+            if client.get(url, headers={"Accept-Encoding": accept,
+                                        "If-None-Match": response.headers["ETag"]}).status_code != 304:
+                wrong.append(f"{url}: no 304 for its ETag")
+            if encoding:
+                row[f"{encoding}_kb"] = round(len(response.data) / 1024, 1)
+        row.setdefault("br_kb", "-")
+        rows.append(row)
+    for url in ("/assets/css/style.css", "/assets/../run.py"):
+        if client.get(url).status_code != 404:
+            wrong.append(f"{url} is served")
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--expenses", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--starts", type=int, default=3, help="Worker processes per bytecode cache mode")
+    parser.add_argument("--output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="smartexp-templates-")
+    cache_dir = os.path.join(workdir, "jinja")
+    env = {"UPLOAD_FOLDER": os.path.join(workdir, "uploads"), "ASSET_DIR": os.path.join(workdir, "assets"),
+           "RECEIPT_SWEEP_HOURS": "0", "RATE_LIMIT_STORE": "off"}
+    os.environ.update(env)
+    wrong = []
+    try:
+        db_path = os.path.join(workdir, "templates.db")
+        (user_id, username), = seeder.seed_database(db_path, users=1, expenses_per_user=args.expenses)
+        env = dict(os.environ, EXPENSES_DB=db_path)
+        startup = warm_up(env, username, cache_dir, args.starts)
+        if not os.listdir(cache_dir):
+            wrong.append("the bytecode cache stayed empty")
+
+        os.environ["TEMPLATE_CACHE_DIR"] = cache_dir
+        import cache
+        import database
+        database.DB_NAME = db_path
+        import assets
+        import run
+        import templating
+        client = run.app.test_client()
+        client.post("/login", data={"username": username, "password": seeder.PASSWORD})
+        database.register_user("other", "pw", "0000")
+        other = run.app.test_client()
+        other.post("/login", data={"username": "other", "password": "pw"})
+
+        pages = page_rows(templating, cache, client, args.repeat, wrong)
+        check_invalidation(client, other, wrong)
+        sizes = check_assets(client, assets, client.get("/dashboard").get_data(as_text=True), wrong)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"Pages ({args.expenses} expenses, p50 of {args.repeat}):")
+    print_table(pages, list(pages[0]))
+    print(f"\nWorker start (median of {args.starts}):")
+    print_table(startup, list(startup[0]))
+    print("\nAssets:")
+    print_table(sizes, ["asset", "raw_kb", "gzip_kb", "br_kb"])
+    if not args.no_save:
+        results = {"params": vars(args), "pages": pages, "startup": startup, "assets": sizes}
+        print(f"\nSaved {save_results('templates', results, args.output)}")
+    if wrong:
+        print("\nFAIL:\n  " + "\n  ".join(wrong))
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
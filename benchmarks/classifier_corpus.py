@@ -0,0 +1,72 @@
+# Held-out labelled inputs for the classifier benchmark (benchmarks/bench_classifier.py).
+# Written the way users actually type: misspellings, Roman-Urdu/English mixes and
+# multi-word items. None of these strings appear verbatim in ai_engine/pakistani_data.py;
+# keep it that way so the score measures generalisation.
+
+HELDOUT_DATA = [
+    # --- 1. FOOD & DINING ---
+    ("chicken biryani plate", "Food & Dining"), ("biriyani", "Food & Dining"), ("chaye", "Food & Dining"),
+    ("doodh pati chai", "Food & Dining"), ("cooking oil 5L", "Food & Dining"), ("dalda ghee pack", "Food & Dining"),
+    ("anday", "Food & Dining"), ("bread and eggs", "Food & Dining"), ("zinger", "Food & Dining"),
+    ("pizza hut", "Food & Dining"), ("nihari naan", "Food & Dining"), ("gol gappe", "Food & Dining"),
+    ("samose", "Food & Dining"), ("sabzi mandi", "Food & Dining"), ("ciggies", "Food & Dining"),
+    ("aata 10kg", "Food & Dining"), ("kfc deal", "Food & Dining"),
+
+    # --- 2. TRANSPORTATION ---
+    ("patrol", "Transportation"), ("petrol pump", "Transportation"), ("engine oil change", "Transportation"),
+    ("careem ride", "Transportation"), ("uber to office", "Transportation"), ("rickshaw kiraya", "Transportation"),
+    ("bykea ride", "Transportation"), ("daewoo ticket lahore", "Transportation"), ("motorway toll", "Transportation"),
+    ("bike puncture", "Transportation"), ("car service", "Transportation"), ("cng fill", "Transportation"),
+    ("metro bus card", "Transportation"), ("parking fee", "Transportation"), ("traffic challan", "Transportation"),
+
+    # --- 3. HOUSING & UTILITIES ---
+    ("bijli ka bill", "Housing & Utilities"), ("lesco bill", "Housing & Utilities"), ("sui gas bil", "Housing & Utilities"),
+    ("ghar ka kiraya", "Housing & Utilities"), ("house rent oct", "Housing & Utilities"), ("wifi bill", "Housing & Utilities"),
+    ("stormfibre", "Housing & Utilities"), ("ptcl internet", "Housing & Utilities"), ("paani ka tanker", "Housing & Utilities"),
+    ("maid ki salary", "Housing & Utilities"), ("plumber repair", "Housing & Utilities"), ("gas cylinder refill", "Housing & Utilities"),
+    ("k electric bill", "Housing & Utilities"), ("electrition", "Housing & Utilities"),
+
+    # --- 4. MOBILE & COMMUNICATION ---
+    ("jazz load", "Mobile & Communication"), ("zong package", "Mobile & Communication"), ("easy load", "Mobile & Communication"),
+    ("telenor bundle", "Mobile & Communication"), ("mobile balance", "Mobile & Communication"), ("ufone recharge", "Mobile & Communication"),
+    ("new sim", "Mobile & Communication"), ("internet package jazz", "Mobile & Communication"), ("top up", "Mobile & Communication"),
+    ("super card zong", "Mobile & Communication"),
+
+    # --- 5. SHOPPING ---
+    ("khaadi kurta", "Shopping"), ("new shoes", "Shopping"), ("joote", "Shopping"),
+    ("lawn suit", "Shopping"), ("daraz order", "Shopping"), ("outfitters jeans", "Shopping"),
+    ("perfume gift set", "Shopping"), ("hand bag", "Shopping"), ("bata chappal", "Shopping"),
+    ("kapre silai", "Shopping"), ("sunglass", "Shopping"), ("gul ahmed lawn", "Shopping"),
+    ("makeup kit", "Shopping"), ("wrist watch", "Shopping"),
+
+    # --- 6. HEALTH & FITNESS ---
+    ("doctor fees", "Health & Fitness"), ("dawaai", "Health & Fitness"), ("panadol strip", "Health & Fitness"),
+    ("medical stor", "Health & Fitness"), ("blood test chughtai", "Health & Fitness"), ("gym membership", "Health & Fitness"),
+    ("hair cut", "Health & Fitness"), ("barbar", "Health & Fitness"), ("cough syrup", "Health & Fitness"),
+    ("xray", "Health & Fitness"), ("protein shake", "Health & Fitness"), ("hospital bill", "Health & Fitness"),
+    ("parlour facial", "Health & Fitness"),
+
+    # --- 7. EDUCATION ---
+    ("school fees", "Education"), ("uni semester fee", "Education"), ("tution fee", "Education"),
+    ("text books", "Education"), ("notebook", "Education"), ("photo copy notes", "Education"),
+    ("stationary", "Education"), ("exam fees", "Education"), ("online course", "Education"),
+    ("school uniform", "Education"), ("pens and pencils", "Education"), ("academy fee", "Education"),
+
+    # --- 8. ENTERTAINMENT ---
+    ("netflix subscription", "Entertainment"), ("movie tickets", "Entertainment"), ("cinema popcorn", "Entertainment"),
+    ("spotify premium", "Entertainment"), ("pubg uc", "Entertainment"), ("ps5 game", "Entertainment"),
+    ("picnic murree", "Entertainment"), ("joyland rides", "Entertainment"), ("concert pass", "Entertainment"),
+    ("steam game", "Entertainment"), ("yt premium", "Entertainment"),
+
+    # --- 9. GIFTS & DONATIONS ---
+    ("birthday gift", "Gifts & Donations"), ("eidi for kids", "Gifts & Donations"), ("shaadi salami", "Gifts & Donations"),
+    ("zakaat", "Gifts & Donations"), ("sadqah", "Gifts & Donations"), ("masjid donation", "Gifts & Donations"),
+    ("fitra", "Gifts & Donations"), ("charity box", "Gifts & Donations"), ("wedding present", "Gifts & Donations"),
+    ("madrassa chanda", "Gifts & Donations"),
+
+    # --- 10. FINANCIAL / OTHERS ---
+    ("bank charges", "Financial / Others"), ("committee installment", "Financial / Others"), ("bc payment", "Financial / Others"),
+    ("loan qist", "Financial / Others"), ("udhar wapis", "Financial / Others"), ("car insurance premium", "Financial / Others"),
+    ("income tax", "Financial / Others"), ("gold ring investment", "Financial / Others"), ("savings", "Financial / Others"),
+    ("atm fee", "Financial / Others"),
+]
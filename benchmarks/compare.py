@@ -0,0 +1,46 @@
+"""
+Compares two saved benchmark result files.
+
+    python -m benchmarks.compare benchmarks/results/app-OLD.json benchmarks/results/app-NEW.json
+
+Prints p50/p99/rps side by side with the relative change for every timing
+summary found in both files.
+"""
+import argparse
+import json
+import sys
+
+def _summaries(node, path=()):
+    """Yields (path, summary) for every dict that looks like a summarize() result."""
+    if isinstance(node, dict):
+        if "p50_ms" in node and "p99_ms" in node:
+            yield path, node
+            return
+        for key, value in node.items():
+            yield from _summaries(value, path + (str(key),))
+
+def _change(old, new):
+    if not old:
+        return ""
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        old = dict(_summaries(json.load(f)["results"]))
+    with open(args.candidate) as f:
+        new = dict(_summaries(json.load(f)["results"]))
+
+    print(f"{'benchmark':<40} {'p50 old':>9} {'p50 new':>9} {'Δ':>8} {'p99 old':>9} {'p99 new':>9} {'Δ':>8}")
+    for path in sorted(old.keys() & new.keys()):
+        a, b = old[path], new[path]
+        print(f"{'/'.join(path):<40} {a['p50_ms']:>9} {b['p50_ms']:>9} {_change(a['p50_ms'], b['p50_ms']):>8} "
+              f"{a['p99_ms']:>9} {b['p99_ms']:>9} {_change(a['p99_ms'], b['p99_ms']):>8}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,154 @@
+"""
+Load test: sync gunicorn (Procfile deployment) vs the ASGI entry point.
+
+    python -m benchmarks.loadtest --workers 2 --clients 16 --duration 15
+
+Starts each server on a fresh temporary database, registers a user, seeds a
+month of expenses and then hammers a mix of /api/chat, /api/chart_data,
+/history and /dashboard from concurrent clients. Prints p50/p99 per mode.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+from benchmarks.common import ROOT, percentile
+
+MODES = {
+    "sync": ["gunicorn", "run:app"],
+    "asgi": ["gunicorn", "asgi:application", "-k", "uvicorn.workers.UvicornWorker"],
+}
+
+def wait_for_server(base_url, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(base_url + "/login", timeout=2)
+            return
+        except Exception:
+            time.sleep(0.3)
+    raise RuntimeError(f"Server at {base_url} did not come up")
+
+def make_opener():
+    jar = http.cookiejar.CookieJar()
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+
+def post_form(opener, url, fields):
+    data = urllib.parse.urlencode(fields).encode()
+    return opener.open(url, data=data, timeout=60)
+
+def login(base_url, username):
+    opener = make_opener()
+    post_form(opener, base_url + "/register", {"username": username, "password": "bench", "pin": "0000"})
+    post_form(opener, base_url + "/login", {"username": username, "password": "bench"})
+    return opener
+
+def seed(opener, base_url, count):
+    items = ["biryani", "petrol", "careem", "chai", "electricity bill", "shirt", "medicine", "books", "netflix", "zakat"]
+    for _ in range(count):
+        raw = f"{random.choice(items)} {random.randint(50, 5000)}"
+        post_form(opener, base_url + "/add_expense", {"raw_input": raw})
+
+def hit(opener, base_url, path):
+    if path == "/api/chat":
+        body = json.dumps({"message": random.choice(["total", "predict", "analyze my budget", "anomaly"])}).encode()
+        req = urllib.request.Request(base_url + path, data=body, headers={"Content-Type": "application/json"})
+        return opener.open(req, timeout=60).read()
+    return opener.open(base_url + path, timeout=60).read()
+
+def run_clients(base_url, clients, duration, paths):
+    latencies = {p: [] for p in paths}
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = [0.0]
+
+    def start_clock():
+        stop_at[0] = time.time() + duration
+
+    # Clock starts once every client has registered and seeded its data
+    ready = threading.Barrier(clients, action=start_clock)
+
+    def client(index):
+        opener = login(base_url, f"bench_{index}")
+        seed(opener, base_url, 20)
+        ready.wait()
+        while time.time() < stop_at[0]:
+            path = random.choice(paths)
+            start = time.perf_counter()
+            try:
+                hit(opener, base_url, path)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies[path].append(elapsed)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+def run_mode(mode, args):
+    db_path = tempfile.mktemp(suffix=".db")
+    env = dict(os.environ, EXPENSES_DB=db_path, RATE_LIMIT_STORE="off")
+    cmd = MODES[mode] + ["-w", str(args.workers), "-b", f"127.0.0.1:{args.port}", "--timeout", "120"]
+    server = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_for_server(base_url)
+        latencies, errors = run_clients(base_url, args.clients, args.duration, args.paths)
+    finally:
+        server.terminate()
+        server.wait()
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+    every = [v for values in latencies.values() for v in values]
+    result = {
+        "mode": mode,
+        "requests": len(every),
+        "errors": errors,
+        "rps": round(len(every) / args.duration, 1),
+        "p50_ms": round(percentile(every, 50), 2),
+        "p99_ms": round(percentile(every, 99), 2),
+        "endpoints": {
+            path: {"count": len(values), "p50_ms": round(percentile(values, 50), 2), "p99_ms": round(percentile(values, 99), 2)}
+            for path, values in latencies.items()
+        }
+    }
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["sync", "asgi"], choices=sorted(MODES))
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--paths", nargs="+", default=["/api/chat", "/api/chart_data", "/history", "/dashboard"])
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args(argv)
+
+    results = [run_mode(mode, args) for mode in args.modes]
+
+    print(f"{'mode':<6} {'reqs':>7} {'err':>5} {'rps':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for r in results:
+        print(f"{r['mode']:<6} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8} {r['p50_ms']:>9} {r['p99_ms']:>9}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
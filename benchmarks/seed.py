@@ -0,0 +1,89 @@
+"""
+Seeds a SQLite database with synthetic users and expenses.
+
+    python -m benchmarks.seed --db /tmp/bench.db --users 50 --expenses 2000
+
+Descriptions come from the classifier vocabulary in ai_engine/pakistani_data.py,
+with amounts drawn from a per-category range. Every seeded user has the
+password "bench" and PIN "0000".
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+import database
+from ai_engine.pakistani_data import TRAINING_DATA
+
+PASSWORD = "bench"
+PIN = "0000"
+
+AMOUNT_RANGES = {
+    "Food & Dining": (50, 3000),
+    "Transportation": (100, 8000),
+    "Housing & Utilities": (1500, 60000),
+    "Mobile & Communication": (100, 3000),
+    "Shopping": (300, 15000),
+    "Health & Fitness": (200, 10000),
+    "Education": (500, 40000),
+    "Entertainment": (200, 5000),
+    "Gifts & Donations": (100, 20000),
+    "Financial / Others": (500, 30000),
+}
+
+def username_for(index):
+    return f"bench_user_{index}"
+
+def synthetic_expenses(count, days=90, rng=None):
+    """Yields (text, amount, category, date_str) spread over the last `days` days."""
+    rng = rng or random.Random(42)
+    now = datetime.now()
+    for _ in range(count):
+        text, category = rng.choice(TRAINING_DATA)
+        low, high = AMOUNT_RANGES.get(category, (100, 5000))
+        when = now - timedelta(days=rng.randint(0, days - 1), seconds=rng.randint(0, 86399))
+        yield text, float(rng.randint(low, high)), category, when.strftime("%Y-%m-%d %H:%M:%S")
+
+def seed_database(db_path, users=10, expenses_per_user=500, days=90, seed=42):
+    """Creates the schema in db_path and fills it. Returns the list of (user_id, username)."""
+    rng = random.Random(seed)
+    database.DB_NAME = db_path
+    database.init_db()
+    password_hash = generate_password_hash(PASSWORD)
+
+    conn = database.get_connection()
+    c = conn.cursor()
+    seeded = []
+    for i in range(users):
+        username = username_for(i)
+        c.execute("INSERT OR IGNORE INTO users (username, password_hash, security_pin) VALUES (?, ?, ?)",
+                  (username, password_hash, PIN))
+        c.execute("SELECT user_id FROM users WHERE username = ?", (username,))
+        user_id = c.fetchone()[0]
+        c.executemany("INSERT INTO expenses (expense_text, amount, category, date, user_id, ts, amount_minor) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      [(t, a, cat, d, user_id, database.to_timestamp(d), database.to_minor(a))
+                       for t, a, cat, d in synthetic_expenses(expenses_per_user, days, rng)])
+        database._rebuild_totals(c, user_id)
+        database._bump_data_version(c, user_id)
+        seeded.append((user_id, username))
+    conn.commit()
+    conn.close()
+    return seeded
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--expenses", type=int, default=500, help="Expenses per user")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    seeded = seed_database(args.db, args.users, args.expenses, args.days, args.seed)
+    print(f"Seeded {len(seeded)} users x {args.expenses} expenses into {args.db}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
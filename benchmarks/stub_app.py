@@ -0,0 +1,26 @@
+"""
+The web app with OCR replaced by a canned receipt, so /upload_receipt can be
+benchmarked without Tesseract. Serve it with `gunicorn benchmarks.stub_app:app`.
+"""
+from ai_engine import ocr as ai_ocr
+
+STUB_RECEIPT_TEXT = """SAVOUR FOODS
+Chicken Pulao 450.00
+Shami Kebab 120.00
+Cold Drink 100.00
+Total 670.00
+Thank you"""
+
+def stub_extract_text(image_path):
+    return STUB_RECEIPT_TEXT
+
+def stub_extract_pages(path, processes=None):
+    return [STUB_RECEIPT_TEXT]
+
+def install():
+    ai_ocr.extract_text = stub_extract_text
+    ai_ocr.extract_pages = stub_extract_pages
+
+install()
+
+from run import app  # noqa: E402
@@ -0,0 +1,215 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+import database
+
+class LRUCache:
+    """Small thread-safe in-process LRU cache used for per-user responses."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value, user_id=None):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Drops every entry whose key carries this user_id in position 1."""
+        with self._lock:
+            for key in [k for k in self._data if isinstance(k, tuple) and len(k) > 1 and k[1] == user_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+_TOUCH_INTERVAL = 1.0  # seconds between accessed_at updates of one entry
+
+class SQLiteCache:
+    """
+    Cache stored in a local SQLite file, shared by all gunicorn workers on the host.
+    By default the file lives in /dev/shm (RAM-backed) when it exists.
+    """
+
+    def __init__(self, path, max_entries=20000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                user_id INTEGER,
+                value BLOB NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_user ON cache_entries (user_id)")
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread; sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        conn = self._conn()
+        row = conn.execute("SELECT value, accessed_at FROM cache_entries WHERE key = ?", (repr(key),)).fetchone()
+        if row is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        # Reads count as use for the size cap; a write per hit is skipped while the stamp is fresh
+        now = datetime.now().timestamp()
+        if now - row[1] >= _TOUCH_INTERVAL:
+            conn.execute("UPDATE cache_entries SET accessed_at = ? WHERE key = ?", (now, repr(key)))
+            conn.commit()
+        return pickle.loads(row[0])
+
+    def set(self, key, value, user_id=None):
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO cache_entries (key, user_id, value, accessed_at) VALUES (?, ?, ?, ?)",
+                     (repr(key), user_id, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), datetime.now().timestamp()))
+        # Cheap size cap: trim the least recently used entries once we go over budget
+        conn.execute('''
+            DELETE FROM cache_entries WHERE key IN (
+                SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_entries,))
+        conn.commit()
+
+    def invalidate(self, user_id):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries WHERE user_id = ?", (user_id,))
+        conn.commit()
+
+    def clear(self):
+        conn = self._conn()
+        conn.execute("DELETE FROM cache_entries")
+        conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        entries = self._conn().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+class NullCache:
+    """Backend used when caching is switched off (ANALYTICS_CACHE=off)."""
+
+    hits = 0
+    misses = 0
+
+    def get(self, key, default=None):
+        self.misses += 1
+        return default
+
+    def set(self, key, value, user_id=None):
+        pass
+
+    def invalidate(self, user_id):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {"backend": "off", "entries": 0, "hits": 0, "misses": self.misses, "hit_rate": 0.0}
+
+def _default_sqlite_path():
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "smartexp_analytics_cache.db")
+
+_analytics_cache = None
+_analytics_lock = threading.Lock()
+
+def get_analytics_cache():
+    """
+    Returns the process-wide analytics cache, creating it on first use.
+    Backend is picked with ANALYTICS_CACHE = memory (default) | sqlite | off.
+    """
+    global _analytics_cache
+    if _analytics_cache is None:
+        with _analytics_lock:
+            if _analytics_cache is None:
+                backend = os.environ.get("ANALYTICS_CACHE", "memory").lower()
+                if backend == "sqlite":
+                    path = os.environ.get("ANALYTICS_CACHE_PATH", _default_sqlite_path())
+                    _analytics_cache = SQLiteCache(path)
+                elif backend == "off":
+                    _analytics_cache = NullCache()
+                else:
+                    _analytics_cache = LRUCache(max_entries=int(os.environ.get("ANALYTICS_CACHE_SIZE", 4096)))
+                # Write-through invalidation: drop a user's entries as soon as their data changes
+                database.on_write(_analytics_cache.invalidate)
+    return _analytics_cache
+
+_MISSING = object()  # cached results can be None or empty
+
+def cached_per_user(func):
+    """
+    Caches an analytics function of (user_id, *args).
+    Results are keyed by user, data version and current month, so a write in any
+    worker makes older entries unreachable even before they are invalidated.
+    Callers must treat the returned value as read-only.
+    """
+    @wraps(func)
+    def wrapper(user_id, *args):
+        backend = get_analytics_cache()
+        version, _ = database.get_data_version(user_id)
+        key = (func.__name__, user_id, version, datetime.now().strftime("%Y-%m")) + args
+        result = backend.get(key, _MISSING)
+        if result is _MISSING:
+            result = func(user_id, *args)
+            backend.set(key, result, user_id=user_id)
+        return result
+    wrapper.uncached = func
+    return wrapper
@@ -0,0 +1,39 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Max CPU-heavy jobs (OCR, model fit, PDF) running at once per worker process
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", os.cpu_count() or 2))
+# Max password hashes computed at once; kept below CPU_WORKERS so a login flood can't starve OCR/PDF jobs
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+# Max requests handled at once per ASGI worker process
+REQUEST_CONCURRENCY = int(os.environ.get("REQUEST_CONCURRENCY", 32))
+# Max blocking queries (run_io_bound) running at once per worker process
+IO_WORKERS = int(os.environ.get("IO_WORKERS", 8))
+
+_cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hash")
+# Shared by every request: Flask gives each async view a new event loop, whose default pool would die with it
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+
+def run_cpu_bound(func, *args, **kwargs):
+    """
+    Runs a CPU-heavy call on the bounded executor and waits for the result.
+    Request threads still block, but only CPU_WORKERS of these jobs compete for the CPU.
+    """
+    # Copy the context so per-request state (profiling recorder) follows the job
+    ctx = contextvars.copy_context()
+    return _cpu_executor.submit(ctx.run, func, *args, **kwargs).result()
+
+def run_password_hash(func, *args, **kwargs):
+    """Runs a password hash/verify call on its own small executor (see HASH_WORKERS)."""
+    return _hash_executor.submit(func, *args, **kwargs).result()
+
+async def run_io_bound(func, *args, **kwargs):
+    """
+    Runs a blocking I/O call (SQLite queries) on the bounded IO_WORKERS pool, so
+    an async view can wait on several at once (asyncio.gather).
+    """
+    ctx = contextvars.copy_context()
+    return await asyncio.wrap_future(_io_executor.submit(ctx.run, func, *args, **kwargs))
@@ -1,17 +1,222 @@
+import calendar
+import glob
+import json
+import os
+import re
 import sqlite3
-from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import threading
+import time
+from datetime import date, datetime, timedelta
 
-DB_NAME = "expenses.db"
+import passwords
 
-def get_connection():
-    """Establishes and returns a database connection."""
-    conn = sqlite3.connect(DB_NAME)
+DB_NAME = os.environ.get("EXPENSES_DB", "expenses.db")
+# Connection class used by get_connection (profiling swaps in a timed subclass)
+connection_factory = sqlite3.Connection
+
+# Callbacks run with the user_id after any committed expense write (cache invalidation etc.)
+_write_listeners = []
+# Callbacks run with (user_id, {(series_key, category), ...}) after expenses are added, changed or removed
+_expense_listeners = []
+
+# Budgets used until a user saves their own (profiles.py re-exports these)
+DEFAULT_CATEGORY_BUDGETS = {
+    "Food & Dining": 30000,
+    "Transportation": 15000,
+    "Housing & Utilities": 50000,
+    "Mobile & Communication": 3000,
+    "Shopping": 20000,
+    "Health & Fitness": 10000,
+    "Education": 25000,
+    "Entertainment": 5000,
+    "Gifts & Donations": 10000,
+    "Financial / Others": 20000
+}
+DEFAULT_CATEGORY_LIMIT = 20000
+DEFAULT_MONTHLY_BUDGET = 100000
+DEFAULT_ALERT_THRESHOLD = 0.8
+
+# monthly_totals / budget_alerts use this category for the whole month
+ALL_CATEGORIES = ""
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+_EPOCH = date(1970, 1, 1)
+
+def to_minor(amount):
+    """Amount in minor units (paisa, cents), as stored in amount_minor."""
+    return int(round(amount * 100))
+
+def to_timestamp(date_str):
+    """
+    'YYYY-MM-DD HH:MM:SS' -> ts column. The wall-clock time is counted as UTC,
+    so ts // 86400 is the calendar day the user entered. Raises ValueError on
+    any other format.
+    """
+    return calendar.timegm(datetime.strptime(date_str, DATE_FORMAT).timetuple())
+
+def day_number(iso_date):
+    """'YYYY-MM-DD' -> day column value (days since 1970-01-01)."""
+    return (datetime.strptime(iso_date, "%Y-%m-%d").date() - _EPOCH).days
+
+def day_to_iso(day):
+    return (_EPOCH + timedelta(days=day)).isoformat()
+
+def month_days(month):
+    """'YYYY-MM' -> (first day, first day of the next month) as day numbers."""
+    first = datetime.strptime(month, "%Y-%m").date()
+    following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return (first - _EPOCH).days, (following - _EPOCH).days
+
+def translit_key(text):
+    """
+    Reduces each word to a consonant skeleton so transliterated Urdu spellings
+    meet: chai/chaye -> "ch", petrol/patrol -> "ptrl", biryani/biriyani -> "brn".
+    """
+    if not text:
+        return ""
+    keys = []
+    for word in re.findall(r"[^\W\d_]+", text.lower()):
+        word = word.replace("ph", "f").replace("q", "k")
+        skeleton = word[0] + re.sub(r"[aeiouy]", "", word[1:])
+        keys.append(re.sub(r"(.)\1+", r"\1", skeleton))
+    return " ".join(keys)
+
+# Words that don't tell one recurring bill from another ("March electricity bill" = "electricity")
+_SERIES_STOPWORDS = {
+    "bill", "bills", "payment", "paid", "pay", "fee", "fees", "charges", "monthly", "month", "weekly", "yearly", "annual",
+    "subscription", "renewal", "for", "of", "the", "my", "rs", "pkr", "ka", "ki", "ke",
+    "jan", "january", "feb", "february", "mar", "march", "apr", "april", "may", "jun", "june",
+    "jul", "july", "aug", "august", "sep", "sept", "september", "oct", "october",
+    "nov", "november", "dec", "december",
+}
+
+def series_key(text):
+    """
+    Normalized description used to group repeats of the same bill: digits,
+    month names and filler words dropped, the rest reduced with translit_key
+    and sorted ("Netflix subscription March" and "netflx" both give "ntflx").
+    """
+    if not text:
+        return ""
+    words = re.findall(r"[^\W\d_]+", text.lower())
+    kept = [w for w in words if w not in _SERIES_STOPWORDS] or words
+    return " ".join(sorted(set(translit_key(" ".join(kept)).split())))
+
+def _trigrams(text):
+    """Character trigrams of each word's translit_key skeleton (word order doesn't matter)."""
+    grams = set()
+    for word in translit_key(text).split():
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def _jaccard(grams_a, grams_b):
+    if not grams_a or not grams_b:
+        return 0.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+def text_similarity(a, b):
+    """Jaccard similarity of the trigram sets, 0..1 ("KFC zinger" vs "zinger burger kfc" ~ 0.7)."""
+    return _jaccard(_trigrams(a), _trigrams(b))
+
+def get_connection(user_id=None):
+    """
+    Establishes and returns a database connection: to DB_NAME, or with a
+    user_id to the file holding that user's data (see "Sharding" below).
+    """
+    path = _user_db(user_id)
+    if path != DB_NAME and path not in _ready_shards:
+        _init_shard(path)
+    return _open(path)
+
+def _open(path):
+    conn = sqlite3.connect(path, factory=connection_factory)
     conn.row_factory = sqlite3.Row  # Access columns by name
+    # Used by the full-text search triggers
+    conn.create_function("translit_key", 1, translit_key, deterministic=True)
+    conn.create_function("series_key", 1, series_key, deterministic=True)
     return conn
 
-def init_db():
-    """Initializes the database with users and expenses tables."""
+# A new connection parses the whole schema (partitions, FTS triggers) before its
+# first query, ~0.5 ms. Checks that run on every insert read through a
+# connection kept per thread instead; it stays in autocommit, so each query
+# sees the latest commit, and is reopened after a fork or if the file was replaced.
+_readers = threading.local()
+
+def _reader(user_id):
+    path = _user_db(user_id)
+    if path != DB_NAME and path not in _ready_shards:
+        _init_shard(path)
+    if getattr(_readers, "pid", None) != os.getpid():
+        _readers.pid, _readers.conns = os.getpid(), {}
+    inode = os.stat(path).st_ino
+    kept = _readers.conns.get(path)
+    if kept is None or kept[0] != inode:
+        if kept is not None:
+            kept[1].close()
+        kept = _readers.conns[path] = (inode, _open(path))
+    return kept[1]
+
+# --- Sharding ---
+# All workers write to DB_NAME, and SQLite lets one connection write at a time.
+# With SHARDS=N each user's expenses, totals, alerts, profile and budgets go to
+# one of N files in SHARD_DIR (shard_000.db, ...), picked by user_id when the
+# user registers; SHARDS=user gives every user a file of their own. DB_NAME
+# stays the directory: users, sessions, and users.shard, which records where
+# each user lives (NULL = DB_NAME itself, e.g. users from before sharding).
+# Changing SHARDS only places new users; rebalance_shards moves the others.
+# Workers remember where a user lives, so move users with the app stopped.
+
+SHARDS = os.environ.get("SHARDS", "")
+SHARD_DIR = os.environ.get("SHARD_DIR")  # default: "shards" next to DB_NAME
+
+_routes = {}  # (DB_NAME, user_id) -> path of the user's file
+_ready_shards = set()  # shard files whose schema this process has brought up to date
+_shards_lock = threading.Lock()
+
+def shard_name(user_id, shards=None):
+    """The shard a new user goes to under SHARDS (or `shards`); None when sharding is off."""
+    shards = SHARDS if shards is None else str(shards)
+    if shards == "user":
+        return f"user_{user_id}"
+    if not shards or int(shards) <= 1:
+        return None
+    return f"shard_{user_id % int(shards):03d}"
+
+def shard_path(shard):
+    """File of a shard; None is DB_NAME."""
+    if shard is None:
+        return DB_NAME
+    return os.path.join(SHARD_DIR or os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), "shards"), f"{shard}.db")
+
+def expense_databases():
+    """DB_NAME, then every shard file that exists."""
+    return [DB_NAME] + sorted(glob.glob(shard_path("*")))
+
+def _user_db(user_id):
+    if user_id is None or not SHARDS:
+        return DB_NAME
+    key = (DB_NAME, user_id)
+    path = _routes.get(key)
+    if path is None:
+        conn = _open(DB_NAME)
+        row = conn.execute("SELECT shard FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        conn.close()
+        path = _routes[key] = shard_path(row['shard'] if row else shard_name(user_id))
+    return path
+
+def _init_shard(path, batch_size=None):
+    with _shards_lock:
+        if path in _ready_shards:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = _open(path)
+        _init_expense_schema(conn, batch_size or MIGRATION_BATCH_SIZE)
+        conn.close()
+        _ready_shards.add(path)
+
+def init_db(migration_batch_size=None):
+    """Initializes the database with users and expenses tables, and brings existing shards up to date."""
     conn = get_connection()
     c = conn.cursor()
     
@@ -24,7 +229,34 @@ def init_db():
             security_pin TEXT
         )
     ''')
+    # Where the user's data lives (see "Sharding"); NULL = this file
+    if "shard" not in _columns(c, "users"):
+        c.execute("ALTER TABLE users ADD COLUMN shard TEXT")
     
+    # Server-side sessions (see sessions.py); data is the serialized Flask session
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sessions (
+            sid TEXT PRIMARY KEY,
+            user_id INTEGER,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)")
+    
+    conn.commit()
+    
+    batch_size = migration_batch_size or MIGRATION_BATCH_SIZE
+    _init_expense_schema(conn, batch_size)
+    conn.close()
+    for path in expense_databases()[1:]:
+        _init_shard(path, batch_size)
+
+def _init_expense_schema(conn, batch_size):
+    """Expense, totals, budget and profile tables, with pending migrations; run on DB_NAME and on each shard."""
+    # Readers, and backup.py copying the file, don't wait for writers (nor writers for them)
+    conn.execute("PRAGMA journal_mode=WAL")
+    c = conn.cursor()
     c.execute('''
         CREATE TABLE IF NOT EXISTS expenses (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -37,19 +269,692 @@ def init_db():
         )
     ''')
     
+    # Per-user data version, bumped on every expense write (used for ETags / caching)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS data_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+    
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date)")
+    
+    # Per-user preferences; version is bumped on every change so cached copies can be checked cheaply
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS user_profiles (
+            user_id INTEGER PRIMARY KEY,
+            currency TEXT NOT NULL DEFAULT 'PKR',
+            monthly_budget REAL,
+            alert_threshold REAL NOT NULL DEFAULT 0.8,
+            version INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS category_budgets (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            monthly_limit REAL NOT NULL,
+            PRIMARY KEY (user_id, category)
+        )
+    ''')
+    
+    # Budget crossings: one row per (month, category, level) while the total stays above it
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS budget_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            level TEXT NOT NULL,
+            total REAL NOT NULL,
+            budget REAL NOT NULL,
+            created_at TEXT NOT NULL,
+            UNIQUE (user_id, month, category, level)
+        )
+    ''')
+    
+    # Closed years moved out of expenses (see "Year archive" below)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS archive_partitions (
+            year INTEGER PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            first_day INTEGER NOT NULL,
+            following_day INTEGER NOT NULL,
+            rows INTEGER NOT NULL DEFAULT 0,
+            archived_at TEXT
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS archive_summaries (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            total_minor INTEGER NOT NULL,
+            max_minor INTEGER NOT NULL,
+            PRIMARY KEY (user_id, month, category)
+        )
+    ''')
+    
+    # Categories users confirmed or corrected, with what the classifier said (see ai_engine/train.py --feedback)
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS classifier_feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            expense_text TEXT NOT NULL,
+            predicted TEXT NOT NULL,
+            category TEXT NOT NULL,
+            confidence REAL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_classifier_feedback_user ON classifier_feedback (user_id)")
+    conn.commit()
+    
+    # Column changes and backfills of existing tables (see MIGRATIONS below)
+    migrate(conn, batch_size)
+    
+    _init_recurring(c)
+    
+    _init_search(conn, batch_size)
+    
     conn.commit()
+
+# --- Schema migrations ---
+# Each entry upgrades the schema by one step. PRAGMA user_version records the last
+# step applied, so init_db only runs the pending ones. Steps must be safe to re-run:
+# another worker may have started the same step.
+
+# Rows per backfill transaction. After each batch the migration sleeps for
+# MIGRATION_PAUSE times as long as the batch took, so that other connections
+# (whose busy handler retries with a growing delay) get the write lock
+MIGRATION_BATCH_SIZE = 5000
+MIGRATION_PAUSE = 1.0
+
+def _columns(c, table):
+    c.execute(f"PRAGMA table_xinfo({table})")
+    return {row['name'] for row in c.fetchall()}
+
+def _backfill(conn, sql, batch_size, max_id=None):
+    """Runs `sql` (with `id > ? AND id <= ?`) over expenses in id ranges, committing each range."""
+    c = conn.cursor()
+    if max_id is None:
+        c.execute("SELECT MAX(id) FROM expenses")
+        max_id = c.fetchone()[0] or 0
+    for start in range(0, max_id, batch_size):
+        began = time.perf_counter()
+        c.execute(sql, (start, min(start + batch_size, max_id)))
+        conn.commit()
+        _yield_lock(began)
+
+def _yield_lock(began):
+    time.sleep((time.perf_counter() - began) * MIGRATION_PAUSE)
+
+def _migrate_series_key(conn, batch_size):
+    """1: expenses.series_key, the normalized description used by ai_engine/recurring.py."""
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    if "series_key" not in _columns(c, "expenses"):
+        c.execute("ALTER TABLE expenses ADD COLUMN series_key TEXT")
+    # Triggers first, so rows written during the backfill get a key too
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_series_insert AFTER INSERT ON expenses BEGIN
+            UPDATE expenses SET series_key = series_key(new.expense_text) WHERE id = new.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_series_update AFTER UPDATE OF expense_text ON expenses BEGIN
+            UPDATE expenses SET series_key = series_key(new.expense_text) WHERE id = new.id;
+        END
+    ''')
+    conn.commit()
+    _backfill(conn, "UPDATE expenses SET series_key = series_key(expense_text) "
+                    "WHERE id > ? AND id <= ? AND series_key IS NULL", batch_size)
+
+def _migrate_typed_columns(conn, batch_size):
+    """
+    2: integer columns next to the text date and the REAL amount. ts holds
+    seconds (see to_timestamp), day = ts / 86400 is a generated column, and
+    amount_minor holds paisa. Analytics filter and sum on these, so they don't
+    need string slicing and their sums don't drift. Triggers fill them for
+    rows written without them.
+    """
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    if "ts" not in _columns(c, "expenses"):
+        c.execute("ALTER TABLE expenses ADD COLUMN ts INTEGER")
+        c.execute("ALTER TABLE expenses ADD COLUMN amount_minor INTEGER")
+        c.execute("ALTER TABLE expenses ADD COLUMN day INTEGER GENERATED ALWAYS AS (ts / 86400) VIRTUAL")
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_typed_insert AFTER INSERT ON expenses
+        WHEN new.ts IS NULL OR new.amount_minor IS NULL BEGIN
+            UPDATE expenses SET ts = CAST(strftime('%s', new.date) AS INTEGER),
+                                amount_minor = CAST(ROUND(new.amount * 100) AS INTEGER)
+            WHERE id = new.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_typed_update AFTER UPDATE OF date, amount ON expenses
+        WHEN new.ts IS old.ts AND new.amount_minor IS old.amount_minor BEGIN
+            UPDATE expenses SET ts = CAST(strftime('%s', new.date) AS INTEGER),
+                                amount_minor = CAST(ROUND(new.amount * 100) AS INTEGER)
+            WHERE id = new.id;
+        END
+    ''')
+    conn.commit()
+    _backfill(conn, '''
+        UPDATE expenses SET ts = CAST(strftime('%s', date) AS INTEGER),
+                            amount_minor = CAST(ROUND(amount * 100) AS INTEGER)
+        WHERE id > ? AND id <= ? AND (ts IS NULL OR amount_minor IS NULL)
+    ''', batch_size)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_day ON expenses (user_id, day)")
+    # Duplicate check: same user and amount within a few days
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_amount_ts ON expenses (user_id, amount_minor, ts)")
+    c.execute("DROP INDEX IF EXISTS idx_expenses_user_amount_date")
+    conn.commit()
+
+def _migrate_minor_totals(conn, batch_size):
+    """
+    3: monthly_totals (running per-month totals) in minor units, rebuilt from
+    amount_minor one user per transaction. Writes in between keep the totals
+    of rebuilt users current; the others are recomputed when their turn comes.
+    """
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    if "total_minor" not in _columns(c, "monthly_totals"):
+        c.execute("DROP TABLE IF EXISTS monthly_totals")
+        c.execute('''
+            CREATE TABLE monthly_totals (
+                user_id INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                category TEXT NOT NULL,
+                total_minor INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, month, category)
+            )
+        ''')
+    c.execute("SELECT DISTINCT user_id FROM expenses WHERE user_id IS NOT NULL")
+    user_ids = [row['user_id'] for row in c.fetchall()]
+    conn.commit()
+    for user_id in user_ids:
+        began = time.perf_counter()
+        c.execute("BEGIN IMMEDIATE")
+        _rebuild_totals(c, user_id)
+        conn.commit()
+        _yield_lock(began)
+
+def _migrate_rewrite_counter(conn, batch_size):
+    """
+    4: data_versions.rewrites, bumped when existing expense rows change
+    (update, delete, reset). While it stays the same, a user's expenses have
+    only grown, so expense_store.py can append instead of reloading.
+    """
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    if "rewrites" not in _columns(c, "data_versions"):
+        c.execute("ALTER TABLE data_versions ADD COLUMN rewrites INTEGER NOT NULL DEFAULT 0")
+    conn.commit()
+
+def _migrate_receipt_column(conn, batch_size):
+    """
+    5: expenses.receipt, the stored upload (see receipts.py) an expense was
+    read from, on the live table and on every year partition. NULL for typed
+    expenses. The partial index serves the ownership check when a receipt
+    image is requested and the sweep of files no expense points at.
+    """
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    for table in _sources(c):
+        if "receipt" not in _columns(c, table):
+            c.execute(f"ALTER TABLE {table} ADD COLUMN receipt TEXT")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_receipt ON {table} (receipt) WHERE receipt IS NOT NULL")
+    conn.commit()
+
+def _migrate_confidence_columns(conn, batch_size):
+    """
+    6: expenses.confidence, the classifier's probability for the category it
+    picked (1.0 when a rule picked it, NULL for rows from before), and
+    expenses.needs_review, set when that was below REVIEW_THRESHOLD until the
+    user confirms or corrects the category. On the live table and every year
+    partition; the partial index finds a user's review queue.
+    """
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    for table in _sources(c):
+        columns = _columns(c, table)
+        if "confidence" not in columns:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN confidence REAL")
+        if "needs_review" not in columns:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN needs_review INTEGER NOT NULL DEFAULT 0")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_review ON {table} (user_id) WHERE needs_review = 1")
+    conn.commit()
+
+MIGRATIONS = [
+    (1, _migrate_series_key),
+    (2, _migrate_typed_columns),
+    (3, _migrate_minor_totals),
+    (4, _migrate_rewrite_counter),
+    (5, _migrate_receipt_column),
+    (6, _migrate_confidence_columns),
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn, batch_size=MIGRATION_BATCH_SIZE):
+    """Applies the pending MIGRATIONS in order. Returns the versions applied."""
+    applied = []
+    for version, step in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        step(conn, batch_size)
+        conn.execute("BEGIN IMMEDIATE")
+        if schema_version(conn) < version:
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            applied.append(version)
+        conn.commit()
+    return applied
+
+def _init_recurring(c):
+    """Series index on expenses (the column and its triggers come from migration 1) and the detected recurring series."""
+    c.execute("CREATE INDEX IF NOT EXISTS idx_expenses_series ON expenses (user_id, series_key, category, date)")
+    # One row per detected bill; see ai_engine/recurring.py
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS recurring_series (
+            user_id INTEGER NOT NULL,
+            series_key TEXT NOT NULL,
+            category TEXT NOT NULL,
+            description TEXT NOT NULL,
+            period TEXT NOT NULL,
+            period_days REAL NOT NULL,
+            amount REAL NOT NULL,
+            occurrences INTEGER NOT NULL,
+            confidence REAL NOT NULL,
+            last_date TEXT NOT NULL,
+            next_date TEXT NOT NULL,
+            PRIMARY KEY (user_id, series_key, category)
+        )
+    ''')
+
+def _init_search(conn, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Full-text index over expense descriptions, kept in sync by triggers.
+    Columns: the text itself, its transliteration skeleton, and an owner token
+    ("u<user_id>") so a user's search only walks that user's postings.
+    """
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    c.execute("SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'")
+    created = c.fetchone() is None
+    
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            expense_text, phonetic, owner,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_insert AFTER INSERT ON expenses BEGIN
+            INSERT INTO expenses_fts (rowid, expense_text, phonetic, owner)
+            VALUES (new.id, new.expense_text, translit_key(new.expense_text), 'u' || new.user_id);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_delete AFTER DELETE ON expenses BEGIN
+            DELETE FROM expenses_fts WHERE rowid = old.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_update AFTER UPDATE OF expense_text, user_id ON expenses BEGIN
+            UPDATE expenses_fts
+            SET expense_text = new.expense_text, phonetic = translit_key(new.expense_text), owner = 'u' || new.user_id
+            WHERE rowid = old.id;
+        END
+    ''')
+    
+    # Rows up to max_id existed before the insert trigger; later ones are indexed by it
+    c.execute("SELECT MAX(id) FROM expenses")
+    max_id = c.fetchone()[0] or 0
+    conn.commit()
+    
+    if created:
+        # Index rows that existed before search was added
+        _backfill(conn, '''
+            INSERT INTO expenses_fts (rowid, expense_text, phonetic, owner)
+            SELECT id, expense_text, translit_key(expense_text), 'u' || user_id FROM expenses
+            WHERE id > ? AND id <= ?
+        ''', batch_size, max_id)
+
+# --- Year archive ---
+# archive_closed_years moves the expenses of closed years out of the live table
+# into one table per year (expenses_y2023, ...) in the same file, listed in
+# archive_partitions, so the live table and its indexes only hold recent
+# years. Reads take the live table plus the partitions their date range
+# overlaps (_sources). Rows keep their ids, so ids stay unique and the search
+# index still points at them. An expense backdated into an archived year is
+# written to the live table and moved by the next run. archive_summaries holds
+# per-month count / total / largest of the archived rows, so reports over
+# whole archived years don't scan them.
+
+EXPENSE_COLUMNS = ("id, expense_text, amount, category, date, user_id, series_key, ts, amount_minor, receipt, "
+                   "confidence, needs_review")
+
+def _partition_table(year):
+    return f"expenses_y{int(year)}"
+
+def _year_days(year):
+    """(first, following) day numbers of a year."""
+    return (date(year, 1, 1) - _EPOCH).days, (date(year + 1, 1, 1) - _EPOCH).days
+
+def _partitions(c, first_day=None, following_day=None):
+    """Catalog rows of the partitions overlapping [first_day, following_day); None leaves a side open."""
+    c.execute('''
+        SELECT year, table_name, first_day, following_day FROM archive_partitions
+        WHERE (? IS NULL OR following_day > ?) AND (? IS NULL OR first_day < ?)
+        ORDER BY year
+    ''', (first_day, first_day, following_day, following_day))
+    return c.fetchall()
+
+def _sources(c, first_day=None, following_day=None):
+    """The live table, then the partitions a day range overlaps."""
+    return ["expenses"] + [p['table_name'] for p in _partitions(c, first_day, following_day)]
+
+def _union(sources, select):
+    """`select`, a template with a {table} field, over each source, joined with UNION ALL."""
+    return " UNION ALL ".join(select.format(table=table) for table in sources)
+
+def _create_partition(c, year):
+    """Creates one year's partition (table, indexes, triggers, catalog row) if needed. Returns its table name."""
+    table = _partition_table(year)
+    c.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            expense_text TEXT NOT NULL,
+            amount REAL NOT NULL,
+            category TEXT NOT NULL,
+            date TEXT NOT NULL,
+            user_id INTEGER,
+            series_key TEXT,
+            ts INTEGER,
+            amount_minor INTEGER,
+            day INTEGER GENERATED ALWAYS AS (ts / 86400) VIRTUAL,
+            receipt TEXT,
+            confidence REAL,
+            needs_review INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_day ON {table} (user_id, day)")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_receipt ON {table} (receipt) WHERE receipt IS NOT NULL")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_review ON {table} (user_id) WHERE needs_review = 1")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_user_amount_ts ON {table} (user_id, amount_minor, ts)")
+    c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_series ON {table} (user_id, series_key, category, date)")
+    # Archived rows can still be edited or deleted: keep the search index and series key in step
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+            DELETE FROM expenses_fts WHERE rowid = old.id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF expense_text, user_id ON {table} BEGIN
+            UPDATE expenses_fts
+            SET expense_text = new.expense_text, phonetic = translit_key(new.expense_text), owner = 'u' || new.user_id
+            WHERE rowid = old.id;
+        END
+    ''')
+    c.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_series_update AFTER UPDATE OF expense_text ON {table} BEGIN
+            UPDATE {table} SET series_key = series_key(new.expense_text) WHERE id = new.id;
+        END
+    ''')
+    first, following = _year_days(year)
+    c.execute('''
+        INSERT INTO archive_partitions (year, table_name, first_day, following_day) VALUES (?, ?, ?, ?)
+        ON CONFLICT(year) DO NOTHING
+    ''', (year, table, first, following))
+    return table
+
+def _summarize_partition(c, year):
+    """Recomputes archive_summaries and the row count of one partition."""
+    table = _partition_table(year)
+    c.execute("DELETE FROM archive_summaries WHERE month >= ? AND month <= ?", (f"{year}-01", f"{year}-12"))
+    c.execute(f'''
+        INSERT INTO archive_summaries (user_id, month, category, count, total_minor, max_minor)
+        SELECT user_id, strftime('%Y-%m', day * 86400, 'unixepoch') AS month, category,
+               COUNT(*), SUM(amount_minor), MAX(amount_minor)
+        FROM {table} WHERE user_id IS NOT NULL AND day IS NOT NULL
+        GROUP BY user_id, month, category
+    ''')
+    c.execute(f"UPDATE archive_partitions SET rows = (SELECT COUNT(*) FROM {table}), archived_at = ? WHERE year = ?",
+              (datetime.now().strftime(DATE_FORMAT), year))
+
+def _refresh_summaries(c, table, user_id, keys):
+    """Recomputes a user's archive_summaries rows for {(month, category)} after an archived expense changed."""
+    for month, category in keys:
+        first, following = month_days(month)
+        c.execute("DELETE FROM archive_summaries WHERE user_id = ? AND month = ? AND category = ?",
+                  (user_id, month, category))
+        c.execute(f'''
+            INSERT INTO archive_summaries (user_id, month, category, count, total_minor, max_minor)
+            SELECT ?, ?, ?, COUNT(*), SUM(amount_minor), MAX(amount_minor) FROM {table}
+            WHERE user_id = ? AND category = ? AND day >= ? AND day < ?
+            HAVING COUNT(*) > 0
+        ''', (user_id, month, category, user_id, category, first, following))
+
+def _expense_table(c, expense_id, user_id):
+    """The table holding one of a user's expenses: the live table, else its partition, else None."""
+    for table in _sources(c):
+        c.execute(f"SELECT 1 FROM {table} WHERE id = ? AND user_id = ?", (expense_id, user_id))
+        if c.fetchone():
+            return table
+    return None
+
+def archive_closed_years(before_year=None, batch_size=MIGRATION_BATCH_SIZE):
+    """
+    Moves the expenses dated before Jan 1 of `before_year` (default: this year)
+    to their year's partition, in id ranges like the migrations, then
+    recomputes the summaries of the years that received rows. Safe to re-run
+    and to run while the app is serving: every read sees the same rows before
+    and after a batch, so data versions are left alone. Each shard is archived
+    in turn. Returns {year: rows moved}.
+    """
+    cutoff, _ = _year_days(before_year or date.today().year)
+    moved = {}
+    for path in expense_databases():
+        for year, count in _archive_database(path, cutoff, batch_size).items():
+            moved[year] = moved.get(year, 0) + count
+    return moved
+
+def _archive_database(path, cutoff, batch_size):
+    conn = _open(path)
+    c = conn.cursor()
+    c.execute("SELECT MAX(id) FROM expenses")
+    max_id = c.fetchone()[0] or 0
+    moved = {}
+    for start in range(0, max_id, batch_size):
+        began = time.perf_counter()
+        ids = (start, min(start + batch_size, max_id))
+        c.execute("BEGIN IMMEDIATE")
+        c.execute('''
+            SELECT DISTINCT CAST(strftime('%Y', day * 86400, 'unixepoch') AS INTEGER) AS year FROM expenses
+            WHERE id > ? AND id <= ? AND day < ?
+        ''', ids + (cutoff,))
+        for year in [row['year'] for row in c.fetchall()]:
+            table = _create_partition(c, year)
+            window = ids + _year_days(year)
+            c.execute(f'''
+                INSERT INTO {table} ({EXPENSE_COLUMNS}) SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE id > ? AND id <= ? AND day >= ? AND day < ?
+            ''', window)
+            # The delete trigger drops the rows from the search index; they are indexed again from the partition
+            c.execute("DELETE FROM expenses WHERE id > ? AND id <= ? AND day >= ? AND day < ? RETURNING id", window)
+            moved_ids = [row['id'] for row in c.fetchall()]
+            c.execute(f'''
+                INSERT INTO expenses_fts (rowid, expense_text, phonetic, owner)
+                SELECT id, expense_text, translit_key(expense_text), 'u' || user_id FROM {table}
+                WHERE id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(moved_ids),))
+            moved[year] = moved.get(year, 0) + len(moved_ids)
+        conn.commit()
+        _yield_lock(began)
+    
+    for year in sorted(moved):
+        began = time.perf_counter()
+        c.execute("BEGIN IMMEDIATE")
+        _summarize_partition(c, year)
+        conn.commit()
+        _yield_lock(began)
     conn.close()
+    return moved
+
+# --- Moving users between shards ---
+
+# Per-user tables besides expenses and the archive, copied as they are by move_user
+_USER_TABLES = ["monthly_totals", "data_versions", "budget_alerts", "recurring_series",
+                "user_profiles", "category_budgets", "classifier_feedback"]
+
+def _copy_columns(c, table):
+    """Stored columns of a table, leaving out generated columns and an id the target file assigns."""
+    c.execute(f"PRAGMA main.table_xinfo({table})")
+    return ", ".join(r['name'] for r in c.fetchall() if r['hidden'] == 0 and not (r['pk'] and r['name'] == 'id'))
+
+def _delete_user_data(c, schema, user_id):
+    c.execute(f"SELECT table_name FROM {schema}.archive_partitions")
+    partitions = [r['table_name'] for r in c.fetchall()]
+    for table in ["expenses"] + partitions + _USER_TABLES + ["archive_summaries"]:
+        c.execute(f"DELETE FROM {schema}.{table} WHERE user_id = ?", (user_id,))
+        if table in partitions:
+            c.execute(f"UPDATE {schema}.archive_partitions SET rows = rows - ? WHERE table_name = ?", (c.rowcount, table))
+
+def move_user(user_id, shard):
+    """
+    Moves all of a user's data to `shard` (None = DB_NAME) and records it in
+    users.shard. In WAL mode a commit is atomic within one file only, so this
+    takes three: copy into the target, point the directory at it, then delete
+    the user from the source. A move cut short leaves a copy nobody reads,
+    which rebalance_shards removes. Expense ids are renumbered by the target
+    file, and archived expenses go to its live table until the next archive
+    run. Returns the number of expenses moved.
+    """
+    conn = _open(DB_NAME)
+    row = conn.execute("SELECT shard FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    conn.close()
+    if row is None:
+        raise ValueError(f"unknown user {user_id}")
+    source, target = shard_path(row['shard']), shard_path(shard)
+    if source == target:
+        return 0
+    for path in (source, target):
+        if path != DB_NAME:
+            _init_shard(path)
+    
+    conn = _open(target)
+    c = conn.cursor()
+    c.execute("ATTACH DATABASE ? AS source", (source,))
+    c.execute("BEGIN IMMEDIATE")
+    # Leftovers of an earlier move back to this file
+    _delete_user_data(c, "main", user_id)
+    columns = _copy_columns(c, "expenses")
+    c.execute("SELECT table_name FROM source.archive_partitions ORDER BY year")
+    moved = 0
+    # Archived years first, so the new ids keep roughly the same order
+    for table in [r['table_name'] for r in c.fetchall()] + ["expenses"]:
+        c.execute(f"INSERT INTO main.expenses ({columns}) SELECT {columns} FROM source.{table} "
+                  f"WHERE user_id = ? ORDER BY id", (user_id,))
+        moved += c.rowcount
+    for table in _USER_TABLES:
+        columns = _copy_columns(c, table)
+        c.execute(f"INSERT INTO main.{table} ({columns}) SELECT {columns} FROM source.{table} WHERE user_id = ?",
+                  (user_id,))
+    # New ids: workers holding the user's expense columns must reload them
+    _bump_data_version(c, user_id, rewrite=True)
+    conn.commit()
+    conn.close()
+    
+    conn = _open(DB_NAME)
+    conn.execute("UPDATE users SET shard = ? WHERE user_id = ?", (shard, user_id))
+    conn.commit()
+    conn.close()
+    _routes.pop((DB_NAME, user_id), None)
+    
+    conn = _open(source)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    _delete_user_data(c, "main", user_id)
+    conn.commit()
+    conn.close()
+    return moved
+
+def _purge_misplaced():
+    """Removes the data of users from every file that is not theirs (left by moves cut short)."""
+    conn = _open(DB_NAME)
+    placed = {r['user_id']: shard_path(r['shard']) for r in conn.execute("SELECT user_id, shard FROM users")}
+    conn.close()
+    purged = 0
+    for path in expense_databases():
+        conn = _open(path)
+        c = conn.cursor()
+        c.execute("SELECT user_id FROM data_versions UNION SELECT user_id FROM monthly_totals "
+                  "UNION SELECT user_id FROM user_profiles")
+        misplaced = [r['user_id'] for r in c.fetchall() if r['user_id'] in placed and placed[r['user_id']] != path]
+        if misplaced:
+            c.execute("BEGIN IMMEDIATE")
+            for user_id in misplaced:
+                _delete_user_data(c, "main", user_id)
+            conn.commit()
+            purged += len(misplaced)
+        conn.close()
+    return purged
+
+def rebalance_shards(shards=None, dry_run=False):
+    """
+    Moves every user who is not where SHARDS (or `shards`) would place them
+    now: after the shard count changed, or with sharding off to bring
+    everyone back into DB_NAME. Returns [(user_id, from shard, to shard)].
+    """
+    conn = _open(DB_NAME)
+    users = conn.execute("SELECT user_id, shard FROM users ORDER BY user_id").fetchall()
+    conn.close()
+    moves = [(r['user_id'], r['shard'], shard_name(r['user_id'], shards)) for r in users
+             if r['shard'] != shard_name(r['user_id'], shards)]
+    if not dry_run:
+        _purge_misplaced()
+        for user_id, _, shard in moves:
+            move_user(user_id, shard)
+    return moves
+
+def shard_stats():
+    """Per database file: the users placed there, their expenses (archived included) and the file size."""
+    conn = _open(DB_NAME)
+    placed = {r['shard']: r['users'] for r in conn.execute("SELECT shard, COUNT(*) AS users FROM users GROUP BY shard")}
+    conn.close()
+    stats = []
+    for path in expense_databases():
+        shard = None if path == DB_NAME else os.path.splitext(os.path.basename(path))[0]
+        conn = _open(path)
+        c = conn.cursor()
+        expenses = 0
+        for table in _sources(c):
+            c.execute(f"SELECT COUNT(*) FROM {table}")
+            expenses += c.fetchone()[0]
+        conn.close()
+        stats.append({"shard": shard, "users": placed.get(shard, 0), "expenses": expenses,
+                      "bytes": os.path.getsize(path)})
+    return stats
 
 def register_user(username, password, security_pin):
     """Registers a new user with a security PIN."""
     conn = get_connection()
     c = conn.cursor()
-    password_hash = generate_password_hash(password)
+    password_hash = passwords.hash_password(password)
     
     try:
         # Store security_pin as text suitable for exact matching (could hash it too for extra security, but keeping simple for this scope)
         c.execute("INSERT INTO users (username, password_hash, security_pin) VALUES (?, ?, ?)", 
                   (username, password_hash, security_pin))
+        c.execute("UPDATE users SET shard = ? WHERE user_id = ?", (shard_name(c.lastrowid), c.lastrowid))
         conn.commit()
         return True
     except sqlite3.IntegrityError:
@@ -65,10 +970,19 @@ def check_user(username, password):
     user = c.fetchone()
     conn.close()
     
-    if user and check_password_hash(user['password_hash'], password):
+    if user and passwords.verify_password(user['password_hash'], password):
+        if passwords.needs_rehash(user['password_hash']):
+            # Transparent upgrade to the configured PASSWORD_HASH_METHOD
+            _set_password_hash(user['user_id'], passwords.hash_password(password))
         return user['user_id']
     return None
 
+def _set_password_hash(user_id, password_hash):
+    conn = get_connection()
+    conn.execute("UPDATE users SET password_hash = ? WHERE user_id = ?", (password_hash, user_id))
+    conn.commit()
+    conn.close()
+
 def check_security_pin(username, pin):
     """Verifies if the PIN matches the username."""
     conn = get_connection()
@@ -85,36 +999,592 @@ def update_password(username, new_password):
     """Updates password for a user."""
     conn = get_connection()
     c = conn.cursor()
-    password_hash = generate_password_hash(new_password)
+    password_hash = passwords.hash_password(new_password)
     c.execute("UPDATE users SET password_hash = ? WHERE username = ?", (password_hash, username))
     conn.commit()
     conn.close()
 
-def add_expense(expense_text, amount, category, user_id, custom_date=None):
-    """Adds a new expense linked to a user. Supports backdating."""
+# --- Sessions & profiles ---
+
+def load_session(sid, now):
+    """
+    Returns the session row joined with the owner's profile columns, or None if
+    missing/expired. One query serves both the session and the profile version
+    check, unless the profile is on a shard.
+    """
+    conn = get_connection()
+    c = conn.cursor()
+    c.execute('''
+        SELECT s.data, s.user_id, s.expires_at,
+               p.currency, p.monthly_budget, p.alert_threshold, COALESCE(p.version, 0) AS profile_version
+        FROM sessions s
+        LEFT JOIN user_profiles p ON p.user_id = s.user_id
+        WHERE s.sid = ? AND s.expires_at > ?
+    ''', (sid, now))
+    row = c.fetchone()
+    conn.close()
+    if row is not None and _user_db(row['user_id']) != DB_NAME:
+        profile = get_profile_row(row['user_id'])
+        row = dict(row, **(dict(profile) if profile else {}))
+    return row
+
+def save_session(sid, user_id, data, expires_at):
+    conn = get_connection()
+    conn.execute("INSERT OR REPLACE INTO sessions (sid, user_id, data, expires_at) VALUES (?, ?, ?, ?)",
+                 (sid, user_id, data, expires_at))
+    conn.commit()
+    conn.close()
+
+def touch_session(sid, expires_at):
     conn = get_connection()
+    conn.execute("UPDATE sessions SET expires_at = ? WHERE sid = ?", (expires_at, sid))
+    conn.commit()
+    conn.close()
+
+def delete_session(sid):
+    conn = get_connection()
+    conn.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+    conn.commit()
+    conn.close()
+
+def delete_user_sessions(user_id, keep_sid=None):
+    """Logs a user out everywhere (e.g. after a password reset), optionally keeping one session."""
+    conn = get_connection()
+    conn.execute("DELETE FROM sessions WHERE user_id = ? AND sid IS NOT ?", (user_id, keep_sid))
+    conn.commit()
+    conn.close()
+
+def purge_expired_sessions(now):
+    conn = get_connection()
+    conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+    conn.commit()
+    conn.close()
+
+def get_profile_row(user_id):
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute('''
+        SELECT currency, monthly_budget, alert_threshold, version AS profile_version
+        FROM user_profiles WHERE user_id = ?
+    ''', (user_id,))
+    row = c.fetchone()
+    conn.close()
+    return row
+
+def get_category_budgets(user_id):
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute("SELECT category, monthly_limit FROM category_budgets WHERE user_id = ?", (user_id,))
+    rows = c.fetchall()
+    conn.close()
+    return {r['category']: r['monthly_limit'] for r in rows}
+
+def save_profile(user_id, currency, monthly_budget, alert_threshold, category_budgets):
+    """
+    Replaces a user's preferences and bumps the profile version.
+    This month's budget alerts are re-checked against the new limits, and the
+    data version is bumped so cached analytics are recomputed.
+    """
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute('''
+        INSERT INTO user_profiles (user_id, currency, monthly_budget, alert_threshold, version)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT(user_id) DO UPDATE SET
+            currency = excluded.currency,
+            monthly_budget = excluded.monthly_budget,
+            alert_threshold = excluded.alert_threshold,
+            version = version + 1
+    ''', (user_id, currency, monthly_budget, alert_threshold))
+    c.execute("DELETE FROM category_budgets WHERE user_id = ?", (user_id,))
+    c.executemany("INSERT INTO category_budgets (user_id, category, monthly_limit) VALUES (?, ?, ?)",
+                  [(user_id, category, limit) for category, limit in category_budgets.items()])
+    _check_month_alerts(c, user_id, datetime.now().strftime("%Y-%m"))
+    _bump_data_version(c, user_id)
+    conn.commit()
+    conn.close()
+    _notify_write(user_id)
+
+def _bump_data_version(c, user_id, rewrite=False):
+    """
+    Increments the user's data version inside the caller's transaction.
+    rewrite=True when existing expenses were changed or removed, not just added.
+    """
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rewrites = 1 if rewrite else 0
+    c.execute('''
+        INSERT INTO data_versions (user_id, version, updated_at, rewrites) VALUES (?, 1, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at,
+                                           rewrites = rewrites + excluded.rewrites
+    ''', (user_id, now, rewrites))
+
+def _rebuild_totals(c, user_id=None):
+    """Recomputes monthly_totals from expenses and their partitions (migration, seeding) and re-checks this month's alerts."""
+    where, params = ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+    c.execute(f"DELETE FROM monthly_totals {where}", params)
+    sources = _sources(c)
+    rows = _union(sources, "SELECT user_id, day, category, amount_minor FROM {table} WHERE day IS NOT NULL "
+                           + where.replace("WHERE", "AND"))
+    c.execute(f'''
+        INSERT INTO monthly_totals (user_id, month, category, total_minor, count)
+        SELECT user_id, strftime('%Y-%m', day * 86400, 'unixepoch') AS month, category, SUM(amount_minor), COUNT(*)
+        FROM ({rows})
+        GROUP BY user_id, month, category
+    ''', params * len(sources))
+    c.execute('''
+        INSERT INTO monthly_totals (user_id, month, category, total_minor, count)
+        SELECT user_id, month, ?, SUM(total_minor), SUM(count)
+        FROM monthly_totals WHERE category != ? {}
+        GROUP BY user_id, month
+    '''.format(where.replace("WHERE", "AND")), (ALL_CATEGORIES, ALL_CATEGORIES) + params)
+    month = datetime.now().strftime("%Y-%m")
+    c.execute(f"SELECT DISTINCT user_id FROM monthly_totals WHERE month = ? {where.replace('WHERE', 'AND')}",
+              (month,) + params)
+    for row in c.fetchall():
+        _check_month_alerts(c, row['user_id'], month)
+
+def _apply_totals(c, user_id, changes):
+    """
+    Adds {(month, category): (amount_minor, count)} deltas to the running totals and
+    re-checks the alerts of each touched category and of the month. Runs in the
+    caller's transaction; the cost depends on the number of touched keys, not
+    on the size of the user's history.
+    """
+    months = {}
+    for (month, category), (amount, count) in changes.items():
+        month_amount, month_count = months.get(month, (0, 0))
+        months[month] = (month_amount + amount, month_count + count)
+    changes = dict(changes)
+    for month, delta in months.items():
+        changes[(month, ALL_CATEGORIES)] = delta
+
+    for (month, category), (amount, count) in changes.items():
+        if not amount and not count:
+            continue
+        c.execute('''
+            INSERT INTO monthly_totals (user_id, month, category, total_minor, count) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, month, category) DO UPDATE SET
+                total_minor = total_minor + excluded.total_minor, count = count + excluded.count
+        ''', (user_id, month, category, amount, count))
+        c.execute("DELETE FROM monthly_totals WHERE user_id = ? AND month = ? AND category = ? AND count <= 0",
+                  (user_id, month, category))
+        _check_alert(c, user_id, month, category)
+
+def _budget_for(c, user_id, category):
+    """(limit, alert_threshold) from the user's profile, falling back to the defaults."""
+    c.execute('''
+        SELECT p.alert_threshold, p.monthly_budget, b.monthly_limit
+        FROM (SELECT 1)
+        LEFT JOIN user_profiles p ON p.user_id = ?
+        LEFT JOIN category_budgets b ON b.user_id = ? AND b.category = ?
+    ''', (user_id, user_id, category))
+    row = c.fetchone()
+    threshold = row['alert_threshold'] if row['alert_threshold'] is not None else DEFAULT_ALERT_THRESHOLD
+    if category == ALL_CATEGORIES:
+        limit = row['monthly_budget'] if row['monthly_budget'] is not None else DEFAULT_MONTHLY_BUDGET
+    elif row['monthly_limit'] is not None:
+        limit = row['monthly_limit']
+    else:
+        limit = DEFAULT_CATEGORY_BUDGETS.get(category, DEFAULT_CATEGORY_LIMIT)
+    return limit, threshold
+
+def _check_alert(c, user_id, month, category):
+    """Records a 'warning' / 'exceeded' alert when the running total is over it, drops it when back under."""
+    c.execute("SELECT total_minor FROM monthly_totals WHERE user_id = ? AND month = ? AND category = ?",
+              (user_id, month, category))
+    row = c.fetchone()
+    total_minor = row['total_minor'] if row else 0
+    total = total_minor / 100
+    limit, threshold = _budget_for(c, user_id, category)
+    limit_minor = to_minor(limit)
+    now = datetime.now().strftime(DATE_FORMAT)
+    for level, crossed in (("warning", limit_minor > 0 and total_minor >= limit_minor * threshold),
+                           ("exceeded", total_minor > limit_minor)):
+        if crossed:
+            c.execute('''
+                INSERT INTO budget_alerts (user_id, month, category, level, total, budget, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(user_id, month, category, level) DO UPDATE SET
+                    total = excluded.total, budget = excluded.budget
+            ''', (user_id, month, category, level, total, limit, now))
+        else:
+            c.execute("DELETE FROM budget_alerts WHERE user_id = ? AND month = ? AND category = ? AND level = ?",
+                      (user_id, month, category, level))
+
+def _check_month_alerts(c, user_id, month):
+    """Re-checks every category of one month (after a budget change)."""
+    c.execute("SELECT category FROM monthly_totals WHERE user_id = ? AND month = ?", (user_id, month))
+    categories = {row['category'] for row in c.fetchall()}
+    c.execute("SELECT DISTINCT category FROM budget_alerts WHERE user_id = ? AND month = ?", (user_id, month))
+    categories.update(row['category'] for row in c.fetchall())
+    for category in categories:
+        _check_alert(c, user_id, month, category)
+
+def get_month_totals(user_id, month):
+    """{category: total} for one month from the running totals; the '' key holds the month total."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute("SELECT category, total_minor FROM monthly_totals WHERE user_id = ? AND month = ?", (user_id, month))
+    rows = c.fetchall()
+    conn.close()
+    return {r['category']: r['total_minor'] / 100 for r in rows}
+
+def get_daily_totals(user_id, month):
+    """{'YYYY-MM-DD': total} for the days of one month that have expenses, in date order."""
+    first, following = month_days(month)
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    sources = _sources(c, first, following)
+    rows = _union(sources, "SELECT day, amount_minor FROM {table} WHERE user_id = ? AND day >= ? AND day < ?")
+    c.execute(f"SELECT day, SUM(amount_minor) AS total_minor FROM ({rows}) GROUP BY day ORDER BY day",
+              (user_id, first, following) * len(sources))
+    rows = c.fetchall()
+    conn.close()
+    return {day_to_iso(r['day']): r['total_minor'] / 100 for r in rows}
+
+def get_budget_alerts(user_id, month):
+    """Alerts recorded for one month, exceeded first, then by how far over budget."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute('''
+        SELECT category, level, total, budget, created_at FROM budget_alerts
+        WHERE user_id = ? AND month = ?
+        ORDER BY level = 'exceeded' DESC, total / budget DESC
+    ''', (user_id, month))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def on_write(callback):
+    """Registers callback(user_id), called after every committed write to expenses or budgets."""
+    if callback not in _write_listeners:
+        _write_listeners.append(callback)
+
+def _notify_write(user_id):
+    for callback in _write_listeners:
+        try:
+            callback(user_id)
+        except Exception as e:
+            print(f"Write listener error: {e}")
+
+def on_expense_change(callback):
+    """Registers callback(user_id, keys), keys being the (series_key, category) pairs a committed write touched."""
+    if callback not in _expense_listeners:
+        _expense_listeners.append(callback)
+
+def _notify_expense_change(user_id, keys):
+    for callback in _expense_listeners:
+        try:
+            callback(user_id, keys)
+        except Exception as e:
+            print(f"Expense listener error: {e}")
+
+def get_series_history(user_id, key, category, limit=24):
+    """The latest `limit` expenses of one (series_key, category) group, oldest first."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    sources = _sources(c)
+    latest = _union(sources, '''
+        SELECT * FROM (SELECT expense_text, amount_minor, day, date FROM {table}
+                       WHERE user_id = ? AND series_key = ? AND category = ? ORDER BY date DESC LIMIT ?)
+    ''')
+    c.execute(f"SELECT expense_text, amount_minor, day FROM ({latest}) ORDER BY date DESC LIMIT ?",
+              (user_id, key, category, limit) * len(sources) + (limit,))
+    rows = c.fetchall()
+    conn.close()
+    return rows[::-1]
+
+def get_series_keys(user_id, min_count=3):
+    """Every (series_key, category) group of a user with at least `min_count` expenses."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    sources = _sources(c)
+    rows = _union(sources, "SELECT series_key, category FROM {table} WHERE user_id = ?")
+    c.execute(f"SELECT series_key, category FROM ({rows}) GROUP BY series_key, category HAVING COUNT(*) >= ?",
+              (user_id,) * len(sources) + (min_count,))
+    rows = c.fetchall()
+    conn.close()
+    return {(r['series_key'], r['category']) for r in rows}
+
+def save_series(user_id, key, category, series):
+    """
+    Stores (or with series=None removes) a detected recurring series. The data
+    version is bumped only when the row actually changed, so cached forecasts
+    are recomputed.
+    """
+    conn = get_connection(user_id)
     c = conn.cursor()
+    c.execute("SELECT * FROM recurring_series WHERE user_id = ? AND series_key = ? AND category = ?",
+              (user_id, key, category))
+    old = c.fetchone()
+    if series is None:
+        if old is None:
+            conn.close()
+            return
+        c.execute("DELETE FROM recurring_series WHERE user_id = ? AND series_key = ? AND category = ?",
+                  (user_id, key, category))
+    else:
+        row = dict(series, user_id=user_id, series_key=key, category=category)
+        if old is not None and all(old[name] == value for name, value in row.items()):
+            conn.close()
+            return
+        c.execute('''
+            INSERT OR REPLACE INTO recurring_series
+                (user_id, series_key, category, description, period, period_days, amount,
+                 occurrences, confidence, last_date, next_date)
+            VALUES (:user_id, :series_key, :category, :description, :period, :period_days, :amount,
+                    :occurrences, :confidence, :last_date, :next_date)
+        ''', row)
+    _bump_data_version(c, user_id)
+    conn.commit()
+    conn.close()
+    _notify_write(user_id)
+
+def get_recurring_series(user_id):
+    """A user's detected recurring expenses, soonest due first."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute("SELECT * FROM recurring_series WHERE user_id = ? ORDER BY next_date", (user_id,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def get_data_version(user_id):
+    """Returns (version, updated_at datetime) for a user's expense data."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute("SELECT version, updated_at FROM data_versions WHERE user_id = ?", (user_id,))
+    row = c.fetchone()
+    conn.close()
     
-    # Use custom date if provided, else use current time
+    if not row:
+        return 0, None
+    return row['version'], datetime.strptime(row['updated_at'], "%Y-%m-%d %H:%M:%S")
+
+def get_expense_versions(user_id):
+    """(data version, rewrites) for a user; see _bump_data_version."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute("SELECT version, rewrites FROM data_versions WHERE user_id = ?", (user_id,))
+    row = c.fetchone()
+    conn.close()
+    return (row['version'], row['rewrites']) if row else (0, 0)
+
+def get_expense_columns(user_id, after_id=0):
+    """
+    (id, ts, amount_minor, category, series_key) tuples of a user's expenses
+    with id > after_id, in id order. Plain tuples, for expense_store.py.
+    """
+    conn = get_connection(user_id)
+    # A backdated expense can be archived before a worker catches up, so the partitions are walked too
+    sources = _sources(conn.cursor())
+    conn.row_factory = None
+    c = conn.cursor()
+    # Catching up walks the few newest rows by id; "+user_id" keeps the planner off the per-user index
+    user_filter = "+user_id" if after_id else "user_id"
+    rows = _union(sources, f"SELECT id, ts, amount_minor, category, series_key FROM {{table}} "
+                           f"WHERE {user_filter} = ? AND id > ?")
+    c.execute(f"{rows} ORDER BY id", (user_id, after_id) * len(sources))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def get_expense_texts(user_id, expense_ids):
+    """{id: expense_text} for a few of a user's expenses."""
+    if not expense_ids:
+        return {}
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    sources = _sources(c)
+    marks = ",".join("?" * len(expense_ids))
+    c.execute(_union(sources, f"SELECT id, expense_text FROM {{table}} WHERE user_id = ? AND id IN ({marks})"),
+              [user_id, *expense_ids] * len(sources))
+    rows = c.fetchall()
+    conn.close()
+    return {r['id']: r['expense_text'] for r in rows}
+
+def add_expense(expense_text, amount, category, user_id, custom_date=None, receipt=None,
+                confidence=None, needs_review=False):
+    """
+    Adds a new expense linked to a user. Supports backdating, and `receipt`
+    names the stored upload it was read from. `confidence` is the
+    classifier's for `category`; `needs_review` puts the expense in the
+    user's review queue. Returns the new expense id.
+    """
+    # Use custom date (YYYY-MM-DD) if provided, with the current time of day
     if custom_date:
-        # Assuming input is YYYY-MM-DD, append current time for consistency or default time
         date_str = f"{custom_date} {datetime.now().strftime('%H:%M:%S')}"
     else:
-        date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        date_str = datetime.now().strftime(DATE_FORMAT)
+    ts = to_timestamp(date_str)  # ValueError for a malformed custom_date
+    amount_minor = to_minor(amount)
         
+    conn = get_connection(user_id)
+    c = conn.cursor()
     c.execute('''
-        INSERT INTO expenses (expense_text, amount, category, date, user_id)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (expense_text, amount, category, date_str, user_id))
+        INSERT INTO expenses (expense_text, amount, category, date, user_id, ts, amount_minor, receipt,
+                              confidence, needs_review)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (expense_text, amount, category, date_str, user_id, ts, amount_minor, receipt, confidence, int(needs_review)))
+    expense_id = c.lastrowid
+    _apply_totals(c, user_id, {(date_str[:7], category): (amount_minor, 1)})
+    _bump_data_version(c, user_id)
     conn.commit()
     conn.close()
+    _notify_write(user_id)
+    _notify_expense_change(user_id, {(series_key(expense_text), category)})
+    return expense_id
 
-def get_expenses(user_id=None, month=None):
-    """Retrieves expenses filtered by user_id and optionally by month."""
+def has_receipt(user_id, receipt):
+    """True if one of the user's expenses, archived ones included, was read from this receipt."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    sources = _sources(c)
+    c.execute(_union(sources, "SELECT 1 FROM {table} WHERE receipt = ? AND user_id = ?"), (receipt, user_id) * len(sources))
+    found = c.fetchone() is not None
+    conn.close()
+    return found
+
+def get_receipts():
+    """Every receipt an expense points at, over all database files."""
+    receipts = set()
+    for path in expense_databases():
+        conn = _open(path)
+        c = conn.cursor()
+        for table in _sources(c):
+            c.execute(f"SELECT DISTINCT receipt FROM {table} WHERE receipt IS NOT NULL")
+            receipts.update(r['receipt'] for r in c.fetchall())
+        conn.close()
+    return receipts
+
+def find_duplicates(expense_id, user_id, window_days=3, min_similarity=0.4):
+    """
+    Earlier-entered expenses that look like the same purchase as `expense_id`:
+    same amount, dated within `window_days`, and a similar description. Uses
+    the (user_id, amount_minor, ts) index, so the cost doesn't depend on history
+    size. Returns rows with a `similarity` key, most similar first.
+    """
+    c = _reader(user_id).cursor()
+    c.execute("SELECT expense_text, amount_minor, ts FROM expenses WHERE id = ? AND user_id = ?", (expense_id, user_id))
+    new = c.fetchone()
+    if new is None or new['ts'] is None:
+        return []
+    window = window_days * 86400
+    low, high = new['ts'] - window, new['ts'] + window
+    # A backdated expense can be a duplicate of an archived one
+    sources = _sources(c, low // 86400, high // 86400 + 1)
+    c.execute(_union(sources, '''
+        SELECT id, expense_text, amount, category, date FROM {table}
+        WHERE user_id = ? AND amount_minor = ? AND ts BETWEEN ? AND ? AND id != ?
+    '''), (user_id, new['amount_minor'], low, high, expense_id) * len(sources))
+    rows = c.fetchall()
+    c.close()
+    
+    duplicates = []
+    grams = _trigrams(new['expense_text']) if rows else None
+    for row in rows:
+        similarity = _jaccard(grams, _trigrams(row['expense_text']))
+        if similarity >= min_similarity:
+            duplicates.append(dict(row, similarity=round(similarity, 2)))
+    return sorted(duplicates, key=lambda d: d['similarity'], reverse=True)
+
+def add_expenses_bulk(user_id, rows):
+    """
+    Inserts many expenses for one user in a single transaction.
+    rows: iterable of (expense_text, amount, category, date_str or None) with
+    date_str as 'YYYY-MM-DD HH:MM:SS' (ValueError otherwise), optionally
+    followed by confidence and needs_review (see add_expense).
+    The data version is bumped once for the whole batch. Returns the row count.
+    """
+    now = datetime.now().strftime(DATE_FORMAT)
+    rows = [(text, amount, category, date_str or now, user_id, to_timestamp(date_str or now), to_minor(amount),
+             *((review[0], int(review[1])) if review else (None, 0)))
+            for text, amount, category, date_str, *review in rows]
+    changes = {}
+    for _, _, category, date_str, _, _, amount_minor, _, _ in rows:
+        key = (date_str[:7], category)
+        total, count = changes.get(key, (0, 0))
+        changes[key] = (total + amount_minor, count + 1)
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.executemany('''
+        INSERT INTO expenses (expense_text, amount, category, date, user_id, ts, amount_minor, confidence, needs_review)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    count = c.rowcount
+    if count:
+        _apply_totals(c, user_id, changes)
+        _bump_data_version(c, user_id)
+    conn.commit()
+    conn.close()
+    if count:
+        _notify_write(user_id)
+        _notify_expense_change(user_id, {(series_key(text), category) for text, _, category, *_ in rows})
+    return count
+
+def get_user_id(username):
     conn = get_connection()
     c = conn.cursor()
+    c.execute("SELECT user_id FROM users WHERE username = ?", (username,))
+    row = c.fetchone()
+    conn.close()
+    return row['user_id'] if row else None
+
+def get_monthly_report(user_id, date_from=None, date_to=None, confident_only=False):
+    """
+    Per-month, per-category count/total/average computed in SQL.
+    date_from/date_to are 'YYYY-MM-DD' bounds (date_to exclusive), so the
+    (user_id, day) index is used. Archived years the range covers whole are
+    read from archive_summaries; partly covered ones are scanned.
+    confident_only leaves out expenses waiting in the review queue (archived
+    years are then scanned too).
+    """
+    first = day_number(date_from) if date_from else None
+    following = day_number(date_to) if date_to else None
+    scan = '''
+        SELECT strftime('%Y-%m', day * 86400, 'unixepoch') AS month, category, COUNT(*) AS count,
+               SUM(amount_minor) AS total_minor, MAX(amount_minor) AS max_minor
+        FROM {table}
+        WHERE user_id = ? AND day IS NOT NULL
+    '''
+    if confident_only:
+        scan += " AND needs_review = 0"
+    bounds = []
+    if first is not None:
+        scan += " AND day >= ?"
+        bounds.append(first)
+    if following is not None:
+        scan += " AND day < ?"
+        bounds.append(following)
+    scan += " GROUP BY month, category"
     
-    query = "SELECT * FROM expenses WHERE 1=1"
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    parts, params = [scan.format(table="expenses")], [user_id, *bounds]
+    for partition in _partitions(c, first, following):
+        if not confident_only and (first is None or first <= partition['first_day']) and \
+                (following is None or following >= partition['following_day']):
+            parts.append('''
+                SELECT month, category, count, total_minor, max_minor FROM archive_summaries
+                WHERE user_id = ? AND month >= ? AND month <= ?
+            ''')
+            params += [user_id, f"{partition['year']}-01", f"{partition['year']}-12"]
+        else:
+            parts.append(scan.format(table=partition['table_name']))
+            params += [user_id, *bounds]
+    c.execute(f'''
+        SELECT month, category, SUM(count) AS count, SUM(total_minor) / 100.0 AS total,
+               SUM(total_minor) / 100.0 / SUM(count) AS average, MAX(max_minor) / 100.0 AS largest
+        FROM ({" UNION ALL ".join(parts)})
+        GROUP BY month, category ORDER BY month, total DESC
+    ''', params)
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def get_expenses(user_id=None, month=None):
+    """Retrieves expenses filtered by user_id and optionally by month, archived years included."""
+    query = f"SELECT {EXPENSE_COLUMNS}, day FROM {{table}} WHERE 1=1"
     params = []
     
     if user_id:
@@ -122,48 +1592,295 @@ def get_expenses(user_id=None, month=None):
         params.append(user_id)
         
     if month:
-        query += " AND strftime('%Y-%m', date) = ?"
-        params.append(month)
-        
-    c.execute(query, params)
+        query += " AND day >= ? AND day < ?"
+        params.extend(month_days(month))
+    
+    # Every user's expenses: each shard in turn
+    rows = []
+    for path in [_user_db(user_id)] if user_id else expense_databases():
+        conn = get_connection(user_id) if user_id else _open(path)
+        c = conn.cursor()
+        sources = _sources(c, *month_days(month)) if month else _sources(c)
+        c.execute(_union(sources, query), params * len(sources))
+        rows += c.fetchall()
+        conn.close()
+    return rows
+
+def get_recent_expenses(user_id, limit=5):
+    """A user's `limit` latest-dated expenses, newest first (the dashboard list)."""
+    latest = f'''
+        SELECT * FROM (SELECT {EXPENSE_COLUMNS}, day FROM {{table}} WHERE user_id = ?
+                       ORDER BY day DESC, date DESC, id DESC LIMIT ?)
+    '''
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute(latest.format(table="expenses"), (user_id, limit))
     rows = c.fetchall()
+    partitions = _partitions(c)
+    # Archived years all end before the live rows start, unless the user has fewer than `limit` of them
+    if partitions and (len(rows) < limit or rows[-1]['day'] is None
+                       or rows[-1]['day'] < partitions[-1]['following_day']):
+        sources = ["expenses"] + [p['table_name'] for p in partitions]
+        c.execute(f"SELECT * FROM ({_union(sources, latest)}) ORDER BY day DESC, date DESC, id DESC LIMIT ?",
+                  (user_id, limit) * len(sources) + (limit,))
+        rows = c.fetchall()
     conn.close()
     return rows
 
 def get_all_expenses_as_dataframe(user_id=None):
     import pandas as pd
-    conn = get_connection()
-    query = "SELECT * FROM expenses"
+    query = f"SELECT {EXPENSE_COLUMNS}, day FROM {{table}}"
     params = []
     if user_id:
         query += " WHERE user_id = ?"
         params.append(user_id)
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
-    return df
+    frames = []
+    for path in [_user_db(user_id)] if user_id else expense_databases():
+        conn = get_connection(user_id) if user_id else _open(path)
+        sources = _sources(conn.cursor())
+        frames.append(pd.read_sql_query(_union(sources, query), conn, params=params * len(sources)))
+        conn.close()
+    return pd.concat(frames, ignore_index=True)
 
 def delete_expense(expense_id, user_id):
-    conn = get_connection()
+    conn = get_connection(user_id)
     c = conn.cursor()
-    c.execute("DELETE FROM expenses WHERE id = ? AND user_id = ?", (expense_id, user_id))
+    # Locked first, so the archive job can't move the row in between
+    c.execute("BEGIN IMMEDIATE")
+    table = _expense_table(c, expense_id, user_id) or "expenses"
+    c.execute(f"DELETE FROM {table} WHERE id = ? AND user_id = ? RETURNING amount_minor, category, date, series_key",
+              (expense_id, user_id))
+    old = c.fetchone()
+    changed = old is not None
+    if changed:
+        _apply_totals(c, user_id, {(old['date'][:7], old['category']): (-old['amount_minor'], -1)})
+        if table != "expenses":
+            _refresh_summaries(c, table, user_id, {(old['date'][:7], old['category'])})
+            c.execute("UPDATE archive_partitions SET rows = rows - 1 WHERE table_name = ?", (table,))
+        _bump_data_version(c, user_id, rewrite=True)
     conn.commit()
     conn.close()
+    if changed:
+        _notify_write(user_id)
+        _notify_expense_change(user_id, {(old['series_key'], old['category'])})
 
 def update_expense(expense_id, user_id, text, amount, category):
-    conn = get_connection()
+    conn = get_connection(user_id)
     c = conn.cursor()
-    c.execute("""
-        UPDATE expenses 
-        SET expense_text = ?, amount = ?, category = ?
+    c.execute("BEGIN IMMEDIATE")
+    table = _expense_table(c, expense_id, user_id) or "expenses"
+    c.execute(f"SELECT amount_minor, category, date, series_key, confidence, needs_review FROM {table} "
+              f"WHERE id = ? AND user_id = ?", (expense_id, user_id))
+    old = c.fetchone()
+    amount_minor = to_minor(amount)
+    # Editing an expense is reviewing it
+    c.execute(f"""
+        UPDATE {table} 
+        SET expense_text = ?, amount = ?, amount_minor = ?, category = ?, needs_review = 0
         WHERE id = ? AND user_id = ?
-    """, (text, amount, category, expense_id, user_id))
+    """, (text, amount, amount_minor, category, expense_id, user_id))
+    changed = c.rowcount
+    if changed:
+        if old['needs_review'] or old['category'] != category:
+            _record_feedback(c, user_id, text, old['category'], category, old['confidence'])
+        month = old['date'][:7]
+        changes = {(month, old['category']): (-old['amount_minor'], -1)}
+        previous = changes.get((month, category), (0, 0))
+        changes[(month, category)] = (previous[0] + amount_minor, previous[1] + 1)
+        _apply_totals(c, user_id, changes)
+        if table != "expenses":
+            _refresh_summaries(c, table, user_id, set(changes))
+        _bump_data_version(c, user_id, rewrite=True)
+    conn.commit()
+    conn.close()
+    if changed:
+        _notify_write(user_id)
+        _notify_expense_change(user_id, {(old['series_key'], old['category']), (series_key(text), category)})
+
+def _record_feedback(c, user_id, text, predicted, category, confidence):
+    c.execute('''
+        INSERT INTO classifier_feedback (user_id, expense_text, predicted, category, confidence, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (user_id, text, predicted, category, confidence, datetime.now().strftime(DATE_FORMAT)))
+
+def get_review_queue(user_id, limit=50):
+    """A user's expenses flagged for review, least confident first (archived ones included)."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    sources = _sources(c)
+    flagged = _union(sources, f"SELECT {EXPENSE_COLUMNS}, day FROM {{table}} WHERE user_id = ? AND needs_review = 1")
+    c.execute(f"SELECT * FROM ({flagged}) ORDER BY confidence, date DESC LIMIT ?", (user_id,) * len(sources) + (limit,))
+    rows = c.fetchall()
+    conn.close()
+    return rows
+
+def review_expense(expense_id, user_id, category):
+    """
+    Confirms (or corrects) the category of an expense in the review queue and
+    records the answer in classifier_feedback. Returns False if the user has
+    no such expense.
+    """
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    table = _expense_table(c, expense_id, user_id)
+    if table is None:
+        conn.rollback()
+        conn.close()
+        return False
+    c.execute(f"SELECT expense_text, amount_minor, category, date, series_key, confidence FROM {table} "
+              f"WHERE id = ? AND user_id = ?", (expense_id, user_id))
+    old = c.fetchone()
+    c.execute(f"UPDATE {table} SET category = ?, needs_review = 0 WHERE id = ? AND user_id = ?",
+              (category, expense_id, user_id))
+    corrected = old['category'] != category
+    if corrected:
+        month = old['date'][:7]
+        _apply_totals(c, user_id, {(month, old['category']): (-old['amount_minor'], -1),
+                                   (month, category): (old['amount_minor'], 1)})
+        if table != "expenses":
+            _refresh_summaries(c, table, user_id, {(month, old['category']), (month, category)})
+    _record_feedback(c, user_id, old['expense_text'], old['category'], category, old['confidence'])
+    # A new category changes the expense columns workers hold; a confirmation only the queue
+    _bump_data_version(c, user_id, rewrite=corrected)
+    conn.commit()
+    conn.close()
+    _notify_write(user_id)
+    if corrected:
+        _notify_expense_change(user_id, {(old['series_key'], old['category']), (old['series_key'], category)})
+    return True
+
+def get_classifier_feedback():
+    """(expense_text, predicted, category, confidence) of every confirmation and correction, over all files."""
+    rows = []
+    for path in expense_databases():
+        conn = _open(path)
+        c = conn.cursor()
+        c.execute("SELECT expense_text, predicted, category, confidence FROM classifier_feedback ORDER BY id")
+        rows += [tuple(r) for r in c.fetchall()]
+        conn.close()
+    return rows
+
+def get_confidence_counts():
+    """{confidence rounded to 0.001: expenses} over all files; expenses from before confidences were stored are left out."""
+    counts = {}
+    for path in expense_databases():
+        conn = _open(path)
+        c = conn.cursor()
+        for table in _sources(c):
+            c.execute(f"SELECT ROUND(confidence, 3) AS bucket, COUNT(*) AS n FROM {table} "
+                      f"WHERE confidence IS NOT NULL GROUP BY bucket")
+            for r in c.fetchall():
+                counts[r['bucket']] = counts.get(r['bucket'], 0) + r['n']
+        conn.close()
+    return counts
+
+def reset_account(user_id):
+    """Deletes all expenses of a user, archived ones included."""
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    for table in _sources(c):
+        c.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+        if table != "expenses":
+            c.execute("UPDATE archive_partitions SET rows = rows - ? WHERE table_name = ?", (c.rowcount, table))
+    c.execute("DELETE FROM archive_summaries WHERE user_id = ?", (user_id,))
+    c.execute("DELETE FROM monthly_totals WHERE user_id = ?", (user_id,))
+    c.execute("DELETE FROM budget_alerts WHERE user_id = ?", (user_id,))
+    c.execute("DELETE FROM recurring_series WHERE user_id = ?", (user_id,))
+    c.execute("DELETE FROM classifier_feedback WHERE user_id = ?", (user_id,))
+    _bump_data_version(c, user_id, rewrite=True)
     conn.commit()
     conn.close()
+    _notify_write(user_id)
 
 def get_expense_by_id(expense_id, user_id):
-    conn = get_connection()
+    conn = get_connection(user_id)
     c = conn.cursor()
-    c.execute("SELECT * FROM expenses WHERE id = ? AND user_id = ?", (expense_id, user_id))
+    sources = _sources(c)
+    c.execute(_union(sources, f"SELECT {EXPENSE_COLUMNS}, day FROM {{table}} WHERE id = ? AND user_id = ?"),
+              (expense_id, user_id) * len(sources))
     row = c.fetchone()
     conn.close()
     return row
+
+def _search_match_expression(query):
+    """Builds an FTS5 query: every word must match as a prefix or by its transliteration skeleton."""
+    clauses = []
+    for word in re.findall(r"[^\W_]+", query.lower()):
+        alternatives = [f'expense_text : "{word}"*']
+        skeleton = translit_key(word)
+        if skeleton:
+            alternatives.append(f'phonetic : "{skeleton}"')
+        clauses.append("(" + " OR ".join(alternatives) + ")")
+    return " AND ".join(clauses)
+
+def search_expenses(user_id, query=None, category=None, date_from=None, date_to=None,
+                    min_amount=None, max_amount=None, page=1, per_page=20):
+    """
+    Ranked, paginated search over a user's expenses.
+    Text matching uses the FTS index (prefix + transliteration fuzzy match);
+    dates are 'YYYY-MM-DD' and inclusive. Returns (rows, total_matches).
+    """
+    match = _search_match_expression(query) if query else ""
+    
+    filters = " AND e.user_id = ?"
+    params = [user_id]
+    if category:
+        filters += " AND e.category = ?"
+        params.append(category)
+    if date_from:
+        filters += " AND e.date >= ?"
+        params.append(date_from)
+    if date_to:
+        filters += " AND e.date < date(?, '+1 day')"
+        params.append(date_to)
+    if min_amount is not None:
+        filters += " AND e.amount >= ?"
+        params.append(min_amount)
+    if max_amount is not None:
+        filters += " AND e.amount <= ?"
+        params.append(max_amount)
+    
+    conn = get_connection(user_id)
+    c = conn.cursor()
+    # Archived years outside the date bounds are skipped
+    sources = _sources(c, day_number(date_from) if date_from else None,
+                       day_number(date_to) + 1 if date_to else None)
+    
+    columns = ", ".join(f"e.{name}" for name in EXPENSE_COLUMNS.split(", ")) + ", e.day"
+    prefix, prefix_params, arm_params = "", [], params
+    if match:
+        # Restrict the full-text walk to the user's own postings
+        match = f'owner : "u{user_id}" AND ({match})'
+        if len(sources) == 1:
+            # CROSS JOIN keeps the FTS index as the driving table (one MATCH, then rowid lookups)
+            source = "expenses_fts CROSS JOIN {table} e ON e.id = expenses_fts.rowid WHERE expenses_fts MATCH ?"
+            arm_params = [match] + params
+            rank = ", bm25(expenses_fts, 10.0, 1.0, 0.0) AS rank"
+        else:
+            # The index also holds archived rows: match once, then look the ids up in each table
+            prefix = '''
+                WITH matches AS MATERIALIZED (
+                    SELECT rowid, bm25(expenses_fts, 10.0, 1.0, 0.0) AS rank FROM expenses_fts WHERE expenses_fts MATCH ?
+                )
+            '''
+            prefix_params = [match]
+            source = "matches CROSS JOIN {table} e ON e.id = matches.rowid WHERE 1=1"
+            rank = ", matches.rank"
+        order = "rank, date DESC"
+    else:
+        source = "{table} e WHERE 1=1"
+        rank = ""
+        order = "date DESC, id DESC"
+    query_params = prefix_params + arm_params * len(sources)
+    
+    counts = _union(sources, f"SELECT COUNT(*) AS n FROM {source}{filters}")
+    c.execute(f"{prefix} SELECT SUM(n) FROM ({counts})", query_params)
+    total = c.fetchone()[0]
+    c.execute(f"{prefix} {_union(sources, f'SELECT {columns}{rank} FROM {source}{filters}')} "
+              f"ORDER BY {order} LIMIT ? OFFSET ?",
+              query_params + [per_page, (page - 1) * per_page])
+    rows = c.fetchall()
+    conn.close()
+    return rows, total
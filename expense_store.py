@@ -0,0 +1,153 @@
+"""
+Per-user expense columns (NumPy arrays) for analytics, cached in-process.
+
+The first time analytics need a user's expenses, they are loaded as one
+array per field (timestamp, amount in minor units, series code) instead of a list of sqlite3.Row objects, and totals are computed with
+vectorized operations. On later calls the user's data version decides what
+to do. If only expenses were added since the load (database.get_expense_versions
+reports no new rewrites), the new rows are appended by id. An update or
+delete reloads the user. This also picks up writes made by other workers.
+Stores are evicted least recently used first once their arrays take more
+than EXPENSE_STORE_MB (default 64).
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import database
+
+MAX_BYTES = int(float(os.environ.get("EXPENSE_STORE_MB", "64")) * 1024 * 1024)
+
+# Codes for (series_key, category) groups, shared by every user in the process
+_groups = {}
+_codes_lock = threading.Lock()
+
+def _code(table, key):
+    code = table.get(key)
+    if code is None:
+        code = table[key] = len(table)
+    return code
+
+class UserColumns:
+    """One user's expenses in id order. Only the first `size` entries of each array are in use."""
+    __slots__ = ('user_id', 'version', 'rewrites', 'max_id', 'size',
+                 'ids', 'ts', 'amount_minor', 'group')
+
+    def __init__(self, user_id, version, rewrites):
+        self.user_id = user_id
+        self.version = version
+        self.rewrites = rewrites
+        self.max_id = 0
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.ts = np.empty(0, dtype=np.int64)
+        self.amount_minor = np.empty(0, dtype=np.int64)
+        self.group = np.empty(0, dtype=np.int32)
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.ts.nbytes + self.amount_minor.nbytes + self.group.nbytes
+
+    def append(self, rows):
+        """Adds (id, ts, amount_minor, category, series_key) rows with ids above max_id."""
+        rows = [r for r in rows if r[0] > self.max_id]
+        if not rows:
+            return
+        self.max_id = rows[-1][0]
+        # Rows whose date couldn't be parsed have no ts; the SQL queries skip them too
+        rows = [r for r in rows if r[1] is not None]
+        start, end = self.size, self.size + len(rows)
+        if end > len(self.ids):
+            self._grow(max(end, 2 * len(self.ids), 64))
+        with _codes_lock:
+            groups = [_code(_groups, (r[4], r[3])) for r in rows]
+        self.ids[start:end] = [r[0] for r in rows]
+        self.ts[start:end] = [r[1] for r in rows]
+        self.amount_minor[start:end] = [r[2] for r in rows]
+        self.group[start:end] = groups
+        # Readers slice every array with one size, so it is set after the data is in place
+        self.size = end
+
+    def _grow(self, capacity):
+        for name in ('ids', 'ts', 'amount_minor', 'group'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def columns(self, *names):
+        n = self.size
+        return tuple(getattr(self, name)[:n] for name in names)
+
+    def amounts(self):
+        """(ids, amounts as floats) of every expense, in id order."""
+        ids, amount_minor = self.columns('ids', 'amount_minor')
+        return ids, amount_minor / 100
+
+    def daily_totals(self, month, exclude_groups=()):
+        """
+        {'YYYY-MM-DD': total} for the days of `month` that have expenses, as
+        database.get_daily_totals, optionally leaving out some (series_key, category) groups.
+        """
+        first, following = database.month_days(month)
+        ts, amount_minor, group = self.columns('ts', 'amount_minor', 'group')
+        days = ts // 86400
+        mask = (days >= first) & (days < following)
+        codes = [_groups[g] for g in exclude_groups if g in _groups]
+        if codes:
+            mask &= ~np.isin(group, codes)
+        offsets = days[mask] - first
+        counts = np.bincount(offsets, minlength=following - first)
+        totals = np.bincount(offsets, weights=amount_minor[mask], minlength=following - first)
+        return {database.day_to_iso(first + int(i)): float(totals[i]) / 100 for i in np.flatnonzero(counts)}
+
+_stores = OrderedDict()  # user_id -> UserColumns, least recently used first
+_lock = threading.Lock()
+
+def get_columns(user_id):
+    """A user's UserColumns, loaded, extended or reloaded as the data version requires."""
+    version, rewrites = database.get_expense_versions(user_id)
+    with _lock:
+        store = _stores.get(user_id)
+        if store is not None:
+            _stores.move_to_end(user_id)
+
+    if store is None or store.rewrites != rewrites:
+        store = UserColumns(user_id, version, rewrites)
+        store.append(database.get_expense_columns(user_id))
+        with _lock:
+            _stores[user_id] = store
+            _evict()
+    elif store.version != version:
+        rows = database.get_expense_columns(user_id, store.max_id)
+        with _lock:
+            store.append(rows)
+            store.version = max(store.version, version)
+            _evict()
+    return store
+
+def _evict():
+    total = sum(store.nbytes for store in _stores.values())
+    while total > MAX_BYTES and len(_stores) > 1:
+        _, store = _stores.popitem(last=False)
+        total -= store.nbytes
+
+def invalidate(user_id):
+    with _lock:
+        _stores.pop(user_id, None)
+
+def clear():
+    with _lock:
+        _stores.clear()
+
+def cache_stats():
+    with _lock:
+        stores = list(_stores.values())
+    return {
+        "entries": len(stores),
+        "expenses": sum(store.size for store in stores),
+        "bytes": sum(store.nbytes for store in stores),
+        "max_bytes": MAX_BYTES,
+    }
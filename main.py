@@ -1,131 +1,446 @@
+"""
+Command-line tool for batch work on the expenses database.
+
+    python main.py ingest --user ali notes.txt       # or: cat notes.txt | python main.py ingest --user ali
+    python main.py report --user ali --months 6
+    python main.py review --thresholds 0.4 0.6 0.8  # what REVIEW_THRESHOLD would flag and catch
+    python main.py archive                           # move last year and older out of the live table
+    python main.py shards --rebalance                # move users to the shards SHARDS places them on
+    python main.py backup --compress                 # online snapshot into BACKUP_DIR
+    python main.py receipts --sweep                  # delete receipt images no expense uses
+    python main.py verify backups/20240501-020000
+    python main.py restore backups/20240501-020000 --force
+    python main.py bench --lines 20000
+    python main.py vendor --check                    # vendored Chart.js == the pinned npm release
+
+ingest  Reads one entry per line, in the same free text the web form accepts
+        ("pizza 700 and coke 150"). A line can start with a YYYY-MM-DD date to
+        backdate it. Input is streamed, and every --batch-size items are
+        classified in one model call and inserted in one transaction.
+report  Prints per-month, per-category totals. The aggregation runs in SQLite.
+        --confident-only leaves out expenses whose category awaits review.
+review  For each candidate REVIEW_THRESHOLD: the share of stored expenses it
+        would flag, and of the categories users corrected, how many it would
+        have flagged. Read from the stored confidences; nothing is re-run.
+archive Moves the expenses of closed years (before --before, default this
+        year) into one table per year. Reads still include them.
+shards  Lists users, expenses and size per database file. --rebalance moves
+        users to where SHARDS (or --shards) places them; stop the app first.
+backup  Snapshots the database and every shard while the app keeps serving
+        (see backup.py). --list shows the snapshots taken so far.
+verify  Checks a snapshot's checksums, expense counts and SQLite integrity.
+restore Verifies a snapshot and copies it back over the database files; stop
+        the app first.
+receipts Counts stored receipt images and their cached copies. --sweep
+        deletes the ones whose expenses are gone (see receipts.py).
+bench   Runs ingest on synthetic input in a throwaway database and times each
+        stage (parse, classify, insert, report).
+vendor  Copies Chart.js and its license out of the pinned npm release into
+        static/js/ unchanged (see assets.VENDORED). --check only compares.
+
+ai_engine is imported only by the commands that need it, so `report` starts
+without loading sklearn.
+"""
+import argparse
+import json
+import os
+import random
 import re
 import sys
-import database
-import model
-import analysis
+import tempfile
+import time
+from collections import defaultdict
 from datetime import datetime
 
-class SmartExpenseManager:
-    def __init__(self):
-        print("Initializing Smart Expense Manager...")
-        database.init_db()
-        self.classifier = model.ExpenseClassifier()
-        # Ensure model is trained on startup
-        try:
-            self.classifier.load_model()
-        except:
-             # Basic handling if load fails (though load_model handles it)
-            self.classifier.train()
-
-    def parse_input(self, user_input):
-        """Extracts text and amount from input string.
-           Expected formats: "Pizza 1200", "1200 Pizza", "Uber 500", etc.
-        """
-        # Regex to find the last or first number in the string
-        # Match integer or float amounts (e.g. 1200, 1200.50)
-        match = re.search(r'(\d+(\.\d+)?)', user_input)
-        
-        if not match:
-            return None, None
-            
-        amount_str = match.group(1)
-        amount = float(amount_str)
-        
-        # Remove the amount from the text to get the description
-        text = user_input.replace(amount_str, "").strip()
-        
-        # Cleanup extra non-alphanumeric chars if any, but keep simple for now
-        return text, amount
-
-    def add_expense_flow(self):
-        print("\n--- Add New Expense ---")
-        print("Enter expense description and amount (e.g., 'Pizza 1200', 'Uber 500'). Type 'back' to cancel.")
-        user_input = input(">> ")
-        
-        if user_input.lower() == 'back':
-            return
-
-        text, amount = self.parse_input(user_input)
-        
-        if not text or amount is None:
-            print("❌ Error: Could not understand input. Please include both text and amount.")
-            return
-
-        print(f"Analyzing expense: '{text}' ($ {amount}) ...")
-        category = self.classifier.predict(text)
-        
-        print(f"🤖 AI Categorized as: [ {category} ]")
-        confirm = input(f"Is this correct? (y/n): ").strip().lower()
-        
-        final_category = category
-        if confirm != 'y':
-            print("Select correct category:")
-            cats = ["Food", "Travel", "Bills", "Shopping", "Health", "Others"]
-            for i, c in enumerate(cats):
-                print(f"{i+1}. {c}")
-            try:
-                choice = int(input("Enter choice (1-6): "))
-                final_category = cats[choice-1]
-            except:
-                print("Invalid choice, keeping AI prediction.")
-        
-        database.add_expense(text, amount, final_category)
-        print("✅ Expense saved successfully!")
-
-    def view_analysis_flow(self):
-        print("\n--- Financial Analysis ---")
-        total = analysis.get_monthly_total()
-        breakdown = analysis.get_category_breakdown()
-        suggestions = analysis.generate_suggestions()
-        
-        print(f"📅 Current Month Total: {total}")
-        print("\n📊 Category Breakdown:")
-        if not breakdown:
-            print("   No expenses recorded this month.")
+import database
+import profiles
+
+DATE_PREFIX_RE = re.compile(r'^\s*(\d{4}-\d{2}-\d{2})[\s,]+')
+MAX_REPORTED_ERRORS = 10
+
+def load_classifier():
+    from ai_engine.classifier import ExpenseClassifier
+    classifier = ExpenseClassifier()
+    classifier.load_model()
+    return classifier
+
+def iter_lines(paths):
+    """Yields lines from the given files ('-' = stdin) without reading them whole."""
+    for path in paths or ['-']:
+        if path == '-':
+            yield from sys.stdin
         else:
-            for cat, amt in breakdown.items():
-                print(f"   - {cat}: {amt}")
-        
-        print("\n💡 AI Suggestions:")
-        for sugg in suggestions:
-            print(f"   {sugg}")
-
-    def run(self):
-        print("\n==========================================")
-        print(" 💰 SMART EXPENSE MANAGER AI 💰")
-        print("==========================================")
-        
-        while True:
-            print("\nMAIN MENU:")
-            print("1. Add Expense")
-            print("2. View Analysis")
-            print("3. Show All Expenses")
-            print("4. Exit")
-            
+            with open(path, encoding='utf-8') as f:
+                yield from f
+
+def iter_items(lines, default_date, stats, timings):
+    """Parses lines into (text, amount, date_str or None); counts lines that didn't (fully) parse."""
+    from ai_engine.parser import parse_input
+
+    now_time = datetime.now().strftime('%H:%M:%S')
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        stats['lines'] += 1
+        start = time.perf_counter()
+        date = default_date
+        match = DATE_PREFIX_RE.match(line)
+        if match:
+            date = match.group(1)
+            line = line[match.end():]
+        leftovers = []
+        items = parse_input(line, leftovers)
+        timings['parse'] += time.perf_counter() - start
+
+        if date:
             try:
-                choice = input("Select option: ").strip()
-            except KeyboardInterrupt:
-                print("\nExiting...")
-                break
-                
-            if choice == '1':
-                self.add_expense_flow()
-            elif choice == '2':
-                self.view_analysis_flow()
-            elif choice == '3':
-                # Quick dump of recent expenses
-                params = input("Press Enter for full list or type 'month' for this month only: ")
-                month = datetime.now().strftime("%Y-%m") if 'month' in params else None
-                rows = database.get_expenses(month)
-                print(f"\n--- {'This Month' if month else 'All'} Expenses ({len(rows)}) ---")
-                for row in rows:
-                    print(f"[{row['date']}] {row['category']} | {row['expense_text']} | {row['amount']}")
-            elif choice == '4':
-                print("Goodbye!")
-                break
-            else:
-                print("Invalid option.")
+                datetime.strptime(date, '%Y-%m-%d')
+            except ValueError:
+                items = []
+        if not items:
+            stats['skipped'] += 1
+            if stats['skipped'] <= MAX_REPORTED_ERRORS:
+                print(f"line {number}: could not parse {line.strip()!r}", file=sys.stderr)
+            continue
+        if leftovers:
+            stats['partial'] += 1
+            if stats['partial'] <= MAX_REPORTED_ERRORS:
+                print(f"line {number}: not added {', '.join(leftovers)!r}", file=sys.stderr)
+        date_str = f"{date} {now_time}" if date else None
+        for text, amount in items:
+            yield text, amount, date_str
+
+def ingest(lines, user_id, classifier, batch_size=500, default_date=None, dry_run=False, timings=None):
+    """Classifies and inserts parsed items in batches. Returns (stats, timings)."""
+    from ai_engine.classifier import needs_review
+
+    stats = defaultdict(int)
+    timings = timings if timings is not None else defaultdict(float)
+
+    def flush(batch):
+        start = time.perf_counter()
+        predictions = classifier.predict_batch([text for text, _, _ in batch])
+        timings['classify'] += time.perf_counter() - start
+        start = time.perf_counter()
+        if not dry_run:
+            database.add_expenses_bulk(user_id, [(text, amount, category, date_str, confidence, needs_review(confidence))
+                                                 for (text, amount, date_str), (category, confidence)
+                                                 in zip(batch, predictions)])
+        timings['insert'] += time.perf_counter() - start
+        stats['items'] += len(batch)
+        stats['unsure'] += sum(needs_review(confidence) for _, confidence in predictions)
+        stats['batches'] += 1
+
+    batch = []
+    for item in iter_items(lines, default_date, stats, timings):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    return stats, timings
+
+def month_window(months, month=None):
+    """Returns (date_from, date_to) covering one YYYY-MM or the last `months` months (0 = all)."""
+    if month:
+        start = datetime.strptime(month, '%Y-%m')
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+        return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+    if not months:
+        return None, None
+    today = datetime.now()
+    index = today.year * 12 + today.month - 1 - (months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}-01", None
+
+def print_report(rows, currency="PKR", out=None):
+    out = out or sys.stdout
+    by_month = defaultdict(list)
+    for row in rows:
+        by_month[row['month']].append(row)
+    if not by_month:
+        print("No expenses in this period.", file=out)
+        return
+    for month, month_rows in by_month.items():
+        total = sum(r['total'] for r in month_rows)
+        count = sum(r['count'] for r in month_rows)
+        print(f"\n{month}  {currency} {total:,.0f}  ({count} expenses)", file=out)
+        for r in month_rows:
+            share = r['total'] / total * 100 if total else 0
+            print(f"  {r['category']:<24} {r['total']:>12,.0f}  {share:5.1f}%  "
+                  f"n={r['count']:<5} avg={r['average']:,.0f}  max={r['largest']:,.0f}", file=out)
+
+def resolve_user(username):
+    user_id = database.get_user_id(username)
+    if user_id is None:
+        sys.exit(f"Unknown user '{username}'. Register it in the web app first.")
+    return user_id
+
+# --- Commands ---
+
+def cmd_ingest(args):
+    database.init_db()
+    user_id = resolve_user(args.user)
+    start = time.perf_counter()
+    classifier = load_classifier()
+    from ai_engine import recurring
+    database.on_expense_change(recurring.update_series)
+    timings = defaultdict(float, load_model=time.perf_counter() - start)
+    stats, timings = ingest(iter_lines(args.files), user_id, classifier, args.batch_size, args.date, args.dry_run, timings)
+    action = "Classified" if args.dry_run else "Added"
+    print(f"{action} {stats['items']} expenses from {stats['lines']} lines "
+          f"({stats['skipped']} skipped, {stats['partial']} partly read, {stats['unsure']} to review) in {sum(timings.values()):.2f}s")
+    return 1 if stats['skipped'] and not stats['items'] else 0
+
+def cmd_report(args):
+    database.init_db()
+    user_id = resolve_user(args.user)
+    date_from, date_to = month_window(args.months, args.month)
+    print_report(database.get_monthly_report(user_id, date_from, date_to, confident_only=args.confident_only),
+                 profiles.get_profile(user_id).currency)
+    return 0
+
+def cmd_review(args):
+    from ai_engine.classifier import REVIEW_THRESHOLD
+    database.init_db()
+    counts = database.get_confidence_counts()
+    feedback = [(predicted, category, confidence) for _, predicted, category, confidence
+                in database.get_classifier_feedback() if confidence is not None]
+    wrong = [confidence for predicted, category, confidence in feedback if predicted != category]
+    stored = sum(counts.values())
+    print(f"{stored} expenses with a confidence, {len(feedback)} reviewed ({len(wrong)} corrected); "
+          f"REVIEW_THRESHOLD is {REVIEW_THRESHOLD}\n")
+    print(f"{'threshold':>10}{'flagged':>10}{'share':>8}{'caught':>10}{'missed':>8}")
+    for threshold in sorted(args.thresholds):
+        flagged = sum(n for confidence, n in counts.items() if confidence < threshold)
+        caught = sum(1 for confidence in wrong if confidence < threshold)
+        share = f"{flagged / stored:.0%}" if stored else "-"
+        print(f"{threshold:>10.2f}{flagged:>10}{share:>8}{caught:>10}{len(wrong) - caught:>8}")
+    return 0
+
+def cmd_archive(args):
+    database.init_db()
+    before_year = args.before or datetime.now().year
+    start = time.perf_counter()
+    moved = database.archive_closed_years(before_year, args.batch_size)
+    for year, count in sorted(moved.items()):
+        print(f"{year}: {count} expenses archived")
+    print(f"Archived {sum(moved.values())} expenses dated before {before_year} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+def cmd_shards(args):
+    database.init_db()
+    if args.rebalance:
+        shards = args.shards if args.shards is not None else database.SHARDS
+        start = time.perf_counter()
+        moves = database.rebalance_shards(shards, dry_run=args.dry_run)
+        for user_id, source, target in moves:
+            print(f"user {user_id}: {source or 'main'} -> {target or 'main'}")
+        action = "Would move" if args.dry_run else "Moved"
+        print(f"{action} {len(moves)} users in {time.perf_counter() - start:.2f}s\n")
+    print(f"{'shard':<16}{'users':>8}{'expenses':>12}{'MB':>10}")
+    for stats in database.shard_stats():
+        print(f"{stats['shard'] or 'main':<16}{stats['users']:>8}{stats['expenses']:>12}{stats['bytes'] / 1e6:>10.1f}")
+    return 0
+
+def cmd_backup(args):
+    import backup
+    if args.list:
+        for snapshot in backup.list_snapshots():
+            with open(os.path.join(snapshot, backup.MANIFEST)) as f:
+                files = json.load(f)["files"]
+            print(f"{snapshot}  {len(files)} files  {sum(e['expenses'] for e in files)} expenses  "
+                  f"{sum(e['stored_bytes'] for e in files) / 1e6:.1f} MB")
+        return 0
+    database.init_db()
+    if args.pause is not None:
+        backup.BACKUP_PAUSE = args.pause
+    start = time.perf_counter()
+    try:
+        snapshot = backup.create_snapshot(compress=args.compress)
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    with open(os.path.join(snapshot, backup.MANIFEST)) as f:
+        files = json.load(f)["files"]
+    size = sum(e['bytes'] for e in files)
+    stored = sum(e['stored_bytes'] for e in files)
+    print(f"Snapshot {snapshot}: {len(files)} files, {sum(e['expenses'] for e in files)} expenses, "
+          f"{size / 1e6:.1f} MB ({stored / 1e6:.1f} MB stored) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+def cmd_verify(args):
+    import backup
+    problems = backup.verify_snapshot(args.snapshot, full=args.full)
+    for problem in problems:
+        print(problem)
+    print("FAILED" if problems else "OK")
+    return 1 if problems else 0
+
+def cmd_restore(args):
+    import backup
+    if os.path.exists(database.DB_NAME) and not args.force:
+        print(f"Error: {database.DB_NAME} exists; pass --force to overwrite it", file=sys.stderr)
+        return 1
+    try:
+        restored = backup.restore_snapshot(args.snapshot, full_check=args.full)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for path in restored:
+        print(f"restored {path}")
+    return 0
+
+def cmd_receipts(args):
+    import receipts
+    database.init_db()
+    if args.sweep:
+        removed = receipts.sweep_orphans(args.min_age)
+        print(f"Removed {removed['originals']} receipts and {removed['derivatives']} cached copies "
+              f"({removed['bytes'] / 1e6:.1f} MB)")
+    referenced = database.get_receipts()
+    for label, folder, match in (("receipts", receipts.UPLOAD_FOLDER, receipts.is_receipt_name),
+                                 ("cached copies", receipts.cache_dir(), lambda name: not name.startswith('.'))):
+        names = [name for name in os.listdir(folder) if match(name)] if os.path.isdir(folder) else []
+        size = sum(os.path.getsize(os.path.join(folder, name)) for name in names)
+        print(f"{label:<14}{len(names):>8} files {size / 1e6:>10.1f} MB")
+    print(f"{'in use':<14}{len(referenced):>8} receipts")
+    return 0
+
+def synthetic_lines(count, seed=1):
+    from ai_engine.pakistani_data import TRAINING_DATA
+    rng = random.Random(seed)
+    phrases = [text for text, _ in TRAINING_DATA]
+    for _ in range(count):
+        items = [f"{rng.choice(phrases)} {rng.choice([rng.randint(50, 5000), f'{rng.randint(1, 50)}k', f'Rs {rng.randint(100, 999)}'])}"
+                 for _ in range(rng.randint(1, 3))]
+        yield " and ".join(items) + "\n"
+
+def cmd_bench(args):
+    workdir = tempfile.mkdtemp(prefix="smartexp-cli-")
+    database.DB_NAME = os.path.join(workdir, "bench.db")
+    try:
+        database.init_db()
+        database.register_user("cli_bench", "bench", "0000")
+        user_id = database.get_user_id("cli_bench")
+
+        start = time.perf_counter()
+        classifier = load_classifier()
+        timings = defaultdict(float, load_model=time.perf_counter() - start)
+        lines = list(synthetic_lines(args.lines))
+        stats, timings = ingest(lines, user_id, classifier, args.batch_size, timings=timings)
+
+        start = time.perf_counter()
+        database.get_monthly_report(user_id)
+        timings['report'] = time.perf_counter() - start
+
+        # One predict() call per item, for comparison with the batched path
+        sample = [text for text, _, _ in iter_items(lines[:args.single_sample], None, defaultdict(int), defaultdict(float))]
+        start = time.perf_counter()
+        for text in sample:
+            classifier.predict(text)
+        single_us = (time.perf_counter() - start) / max(len(sample), 1) * 1e6
+
+        items = stats['items']
+        print(f"{args.lines} lines -> {items} expenses, batch size {args.batch_size}\n")
+        print(f"{'stage':<12}{'seconds':>10}{'us/item':>10}{'items/s':>12}")
+        for stage in ('load_model', 'parse', 'classify', 'insert', 'report'):
+            seconds = timings[stage]
+            per_item = seconds / items * 1e6 if items else 0
+            rate = f"{items / seconds:,.0f}" if seconds and stage != 'load_model' else "-"
+            print(f"{stage:<12}{seconds:>10.3f}{per_item:>10.1f}{rate:>12}")
+        print(f"\nclassify one at a time: {single_us:.1f} us/item over {len(sample)} items")
+        return 0
+    finally:
+        for name in os.listdir(workdir):
+            os.remove(os.path.join(workdir, name))
+        os.rmdir(workdir)
+
+def cmd_vendor(args):
+    import assets
+    try:
+        changed = assets.vendor(check=args.check)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for name, (package, version, _) in assets.VENDORED.items():
+        state = ("differs" if args.check else "updated") if name in changed else "up to date"
+        print(f"{name:<24}{package}@{version:<10}{state}")
+    return 1 if args.check and changed else 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="Database file (default: EXPENSES_DB or expenses.db)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Bulk-add expenses from files or stdin")
+    ingest_parser.add_argument("files", nargs="*", help="Input files; '-' or none reads stdin")
+    ingest_parser.add_argument("--user", required=True)
+    ingest_parser.add_argument("--date", help="YYYY-MM-DD for lines without their own date")
+    ingest_parser.add_argument("--batch-size", type=int, default=500)
+    ingest_parser.add_argument("--dry-run", action="store_true", help="Parse and classify without inserting")
+    ingest_parser.set_defaults(func=cmd_ingest)
+
+    report_parser = commands.add_parser("report", help="Monthly totals per category")
+    report_parser.add_argument("--user", required=True)
+    report_parser.add_argument("--month", help="A single YYYY-MM")
+    report_parser.add_argument("--months", type=int, default=3, help="Last N months including this one; 0 = all")
+    report_parser.add_argument("--confident-only", action="store_true", help="Leave out expenses awaiting review")
+    report_parser.set_defaults(func=cmd_report)
+
+    review_parser = commands.add_parser("review", help="Compare review thresholds on the stored confidences")
+    review_parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9])
+    review_parser.set_defaults(func=cmd_review)
+
+    archive_parser = commands.add_parser("archive", help="Move closed years out of the live expenses table")
+    archive_parser.add_argument("--before", type=int, help="Archive years before this one (default: the current year)")
+    archive_parser.add_argument("--batch-size", type=int, default=database.MIGRATION_BATCH_SIZE)
+    archive_parser.set_defaults(func=cmd_archive)
+
+    shards_parser = commands.add_parser("shards", help="Show or rebalance the per-user database shards")
+    shards_parser.add_argument("--rebalance", action="store_true", help="Move users to the shard SHARDS places them on")
+    shards_parser.add_argument("--shards", help="Shard count or 'user' to rebalance to (default: SHARDS; '' = main file)")
+    shards_parser.add_argument("--dry-run", action="store_true", help="Only list the moves")
+    shards_parser.set_defaults(func=cmd_shards)
+
+    backup_parser = commands.add_parser("backup", help="Online snapshot of the database and shards")
+    backup_parser.add_argument("--compress", action="store_true", help="gzip each file of the snapshot")
+    backup_parser.add_argument("--pause", type=float, help="Sleep per copy step, times its length (default: BACKUP_PAUSE)")
+    backup_parser.add_argument("--list", action="store_true", help="List the snapshots instead")
+    backup_parser.set_defaults(func=cmd_backup)
+
+    verify_parser = commands.add_parser("verify", help="Check a snapshot")
+    verify_parser.add_argument("snapshot", help="Snapshot directory")
+    verify_parser.add_argument("--full", action="store_true", help="integrity_check instead of quick_check")
+    verify_parser.set_defaults(func=cmd_verify)
+
+    restore_parser = commands.add_parser("restore", help="Copy a snapshot back over the database files")
+    restore_parser.add_argument("snapshot", help="Snapshot directory")
+    restore_parser.add_argument("--force", action="store_true", help="Overwrite the existing database")
+    restore_parser.add_argument("--full", action="store_true", help="integrity_check instead of quick_check")
+    restore_parser.set_defaults(func=cmd_restore)
+
+    receipts_parser = commands.add_parser("receipts", help="Stored receipt images and their cached copies")
+    receipts_parser.add_argument("--sweep", action="store_true", help="Delete the ones no expense uses")
+    receipts_parser.add_argument("--min-age", type=float, help="Keep files newer than this many seconds (default: 3600)")
+    receipts_parser.set_defaults(func=cmd_receipts)
+
+    bench_parser = commands.add_parser("bench", help="Time each ingest stage on synthetic input")
+    bench_parser.add_argument("--lines", type=int, default=20000)
+    bench_parser.add_argument("--batch-size", type=int, default=500)
+    bench_parser.add_argument("--single-sample", type=int, default=500, help="Lines timed with per-item predict()")
+    bench_parser.set_defaults(func=cmd_bench)
+
+    vendor_parser = commands.add_parser("vendor", help="Copy the third-party static files from their npm releases")
+    vendor_parser.add_argument("--check", action="store_true", help="Only report files that differ (exit 1)")
+    vendor_parser.set_defaults(func=cmd_vendor)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.db:
+        database.DB_NAME = args.db
+    return args.func(args)
 
 if __name__ == "__main__":
-    app = SmartExpenseManager()
-    app.run()
+    sys.exit(main())
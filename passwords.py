@@ -0,0 +1,68 @@
+"""
+Password hashing with a configurable cost.
+
+PASSWORD_HASH_METHOD takes any werkzeug method string. The default
+"scrypt:32768:8:1" is werkzeug's own default. Lighter examples are
+"scrypt:16384:8:1" or "pbkdf2:sha256:600000". After a change, stored hashes
+that used another method are rehashed on the user's next successful login
+(see database.check_user).
+
+Hashing runs on the small HASH_WORKERS executor, so a burst of logins can use
+at most that many cores. Successful checks are remembered in-process for
+PASSWORD_CACHE_TTL seconds and a repeat login skips the hash. The key is an
+HMAC of the stored hash plus the password under a per-process random key, so
+plaintext passwords are never kept. Failed checks are never cached and always
+cost a full hash.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import concurrency
+
+PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+PASSWORD_CACHE_TTL = float(os.environ.get("PASSWORD_CACHE_TTL", 300))
+PASSWORD_CACHE_SIZE = 10000
+
+_cache_key = secrets.token_bytes(32)
+_verified = OrderedDict()  # digest -> expiry timestamp
+_verified_lock = threading.Lock()
+_canonical_method = None
+
+def hash_password(password):
+    return concurrency.run_password_hash(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+def _cache_digest(stored_hash, password):
+    return hmac.new(_cache_key, f"{stored_hash}\0{password}".encode(), hashlib.sha256).digest()
+
+def verify_password(stored_hash, password):
+    """check_password_hash on the hash executor, with a short-lived cache of successful checks."""
+    digest = _cache_digest(stored_hash, password) if PASSWORD_CACHE_TTL > 0 else None
+    if digest is not None:
+        with _verified_lock:
+            expiry = _verified.get(digest)
+            if expiry is not None and expiry > time.monotonic():
+                return True
+
+    ok = concurrency.run_password_hash(check_password_hash, stored_hash, password)
+    if ok and digest is not None:
+        with _verified_lock:
+            _verified[digest] = time.monotonic() + PASSWORD_CACHE_TTL
+            _verified.move_to_end(digest)
+            while len(_verified) > PASSWORD_CACHE_SIZE:
+                _verified.popitem(last=False)
+    return ok
+
+def needs_rehash(stored_hash):
+    """True when stored_hash was made with different parameters than PASSWORD_HASH_METHOD."""
+    global _canonical_method
+    if _canonical_method is None:
+        # werkzeug fills in defaults ("pbkdf2" -> "pbkdf2:sha256:<iterations>"); hash once to learn the full form
+        _canonical_method = generate_password_hash("", PASSWORD_HASH_METHOD).split("$", 1)[0]
+    return stored_hash.split("$", 1)[0] != _canonical_method
@@ -0,0 +1,90 @@
+"""
+Per-user preferences (currency, monthly budget, alert threshold, category budgets)
+cached in-process.
+
+The session lookup in sessions.py joins user_profiles, so each request already
+knows the current profile version. sync() compares that version with the
+cached copy and reloads only when they differ. After that, get_profile() in
+routes, the chatbot or analytics costs no queries. A change saved in another
+worker bumps the version and is picked up on this worker's next request.
+At most PROFILE_CACHE_SIZE profiles are kept, least recently used dropped first.
+"""
+import os
+
+import cache
+import database
+
+CURRENCIES = {
+    "PKR": "Pakistani Rupee",
+    "USD": "US Dollar",
+    "EUR": "Euro",
+    "GBP": "British Pound",
+    "AED": "UAE Dirham",
+    "SAR": "Saudi Riyal",
+}
+
+# Used until a user sets their own; database.py applies the same defaults to budget alerts
+DEFAULT_CATEGORY_BUDGETS = database.DEFAULT_CATEGORY_BUDGETS
+DEFAULT_MONTHLY_BUDGET = database.DEFAULT_MONTHLY_BUDGET
+DEFAULT_ALERT_THRESHOLD = database.DEFAULT_ALERT_THRESHOLD
+
+class Profile:
+    __slots__ = ('user_id', 'currency', 'monthly_budget', 'alert_threshold', 'category_budgets', 'version')
+
+    def __init__(self, user_id, currency, monthly_budget, alert_threshold, category_budgets, version):
+        self.user_id = user_id
+        self.currency = currency
+        self.monthly_budget = monthly_budget
+        self.alert_threshold = alert_threshold
+        self.category_budgets = category_budgets
+        self.version = version
+
+    def budget_for(self, category):
+        return self.category_budgets.get(category, database.DEFAULT_CATEGORY_LIMIT)
+
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', '10000'))
+
+# ("profile", user_id) -> Profile; the user id in position 1 is what LRUCache.invalidate matches
+_cache = cache.LRUCache(max_entries=PROFILE_CACHE_SIZE)
+
+def _build(user_id, row):
+    """Profile from a user_profiles row (or a session join row); None/missing means defaults, version 0."""
+    version = row['profile_version'] if row is not None and row['profile_version'] is not None else 0
+    budgets = dict(DEFAULT_CATEGORY_BUDGETS)
+    if version:
+        budgets.update(database.get_category_budgets(user_id))
+    return Profile(
+        user_id=user_id,
+        currency=(row['currency'] if version else None) or "PKR",
+        monthly_budget=row['monthly_budget'] if version and row['monthly_budget'] is not None else DEFAULT_MONTHLY_BUDGET,
+        alert_threshold=row['alert_threshold'] if version else DEFAULT_ALERT_THRESHOLD,
+        category_budgets=budgets,
+        version=version,
+    )
+
+def sync(user_id, row):
+    """Makes the cached profile match `row` (from the session join), reloading budgets only on a version change."""
+    version = row['profile_version'] if row is not None else 0
+    cached = _cache.get(("profile", user_id))
+    if cached is not None and cached.version == version:
+        return cached
+    profile = _build(user_id, row)
+    _cache.set(("profile", user_id), profile)
+    return profile
+
+def get_profile(user_id):
+    """Cached profile; loads it (two small queries) only the first time this process sees the user."""
+    cached = _cache.get(("profile", user_id))
+    if cached is not None:
+        return cached
+    return sync(user_id, database.get_profile_row(user_id))
+
+def update_profile(user_id, currency, monthly_budget, alert_threshold, category_budgets):
+    database.save_profile(user_id, currency, monthly_budget, alert_threshold, category_budgets)
+    invalidate(user_id)
+
+def invalidate(user_id):
+    _cache.invalidate(user_id)
+
+def cache_stats():
+    return _cache.stats()
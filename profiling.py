@@ -0,0 +1,274 @@
+"""
+Opt-in request profiling (PROFILING=1).
+
+Every request gets a recorder that collects time per phase:
+    db        SQLite execute/fetch time and query count (via database.connection_factory)
+    ml        model fit/predict in ai_engine.analytics
+    classify  ExpenseClassifier.predict
+    ocr       Tesseract in ai_engine.ocr
+    render    Jinja template rendering
+
+Phases are reported in a Server-Timing header and aggregated per process in
+Prometheus text format at /metrics. With PROFILE_SAMPLE_RATE > 0 a fraction of
+requests also runs under pyinstrument (or cProfile when it isn't installed) and
+the trace is written to PROFILE_DIR when the request took longer than
+PROFILE_SLOW_MS.
+"""
+import contextvars
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+import cache
+import database
+
+ENABLED = os.environ.get("PROFILING", "0") == "1"
+SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0))
+SLOW_MS = float(os.environ.get("PROFILE_SLOW_MS", 500))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+
+HISTOGRAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = contextvars.ContextVar("profiling_recorder", default=None)
+
+class PhaseRecorder:
+    """Accumulates (count, milliseconds) per phase for one request."""
+
+    def __init__(self):
+        self.phases = defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+
+    def add(self, name, elapsed_ms, count=1):
+        with self._lock:
+            entry = self.phases[name]
+            entry[0] += count
+            entry[1] += elapsed_ms
+
+@contextmanager
+def phase(name):
+    """Times the enclosed block under `name` for the current request; no-op when profiling is off."""
+    recorder = _current.get()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add(name, (time.perf_counter() - start) * 1000)
+
+# --- SQLite instrumentation ---
+
+class TimedCursor(sqlite3.Cursor):
+    def _timed(self, method, *args, is_query=False):
+        recorder = _current.get()
+        if recorder is None:
+            return method(self, *args)
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            recorder.add("db", (time.perf_counter() - start) * 1000, count=1 if is_query else 0)
+
+    def execute(self, *args):
+        return self._timed(sqlite3.Cursor.execute, *args, is_query=True)
+
+    def executemany(self, *args):
+        return self._timed(sqlite3.Cursor.executemany, *args, is_query=True)
+
+    def fetchone(self):
+        return self._timed(sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._timed(sqlite3.Cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._timed(sqlite3.Cursor.fetchall)
+
+class TimedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+# --- Process-wide metrics ---
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)              # (endpoint, method, status) -> count
+        self.duration_buckets = defaultdict(lambda: [0] * len(HISTOGRAM_BUCKETS))
+        self.duration_sum = defaultdict(float)
+        self.duration_count = defaultdict(int)
+        self.phase_seconds = defaultdict(float)       # (endpoint, phase) -> seconds
+        self.phase_calls = defaultdict(int)
+        self.slow_profiles = 0
+
+    def observe(self, endpoint, method, status, seconds, recorder):
+        with self._lock:
+            self.requests[(endpoint, method, status)] += 1
+            buckets = self.duration_buckets[endpoint]
+            for i, bound in enumerate(HISTOGRAM_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self.duration_sum[endpoint] += seconds
+            self.duration_count[endpoint] += 1
+            for name, (count, ms) in recorder.phases.items():
+                self.phase_seconds[(endpoint, name)] += ms / 1000
+                self.phase_calls[(endpoint, name)] += count
+
+    def render(self, extra_caches=None):
+        lines = []
+        with self._lock:
+            lines.append("# HELP smartexp_requests_total HTTP requests handled by this worker.")
+            lines.append("# TYPE smartexp_requests_total counter")
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'smartexp_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            lines.append("# HELP smartexp_request_duration_seconds Request latency.")
+            lines.append("# TYPE smartexp_request_duration_seconds histogram")
+            for endpoint, buckets in sorted(self.duration_buckets.items()):
+                for bound, count in zip(HISTOGRAM_BUCKETS, buckets):
+                    lines.append(f'smartexp_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                total = self.duration_count[endpoint]
+                lines.append(f'smartexp_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {total}')
+                lines.append(f'smartexp_request_duration_seconds_sum{{endpoint="{endpoint}"}} {self.duration_sum[endpoint]:.6f}')
+                lines.append(f'smartexp_request_duration_seconds_count{{endpoint="{endpoint}"}} {total}')
+
+            lines.append("# HELP smartexp_phase_seconds_total Time spent per request phase (db, ml, classify, ocr, render).")
+            lines.append("# TYPE smartexp_phase_seconds_total counter")
+            for (endpoint, name), seconds in sorted(self.phase_seconds.items()):
+                lines.append(f'smartexp_phase_seconds_total{{endpoint="{endpoint}",phase="{name}"}} {seconds:.6f}')
+            lines.append("# HELP smartexp_phase_calls_total Calls per phase (for db: queries executed).")
+            lines.append("# TYPE smartexp_phase_calls_total counter")
+            for (endpoint, name), count in sorted(self.phase_calls.items()):
+                lines.append(f'smartexp_phase_calls_total{{endpoint="{endpoint}",phase="{name}"}} {count}')
+
+            lines.append("# HELP smartexp_slow_profiles_total Sampled slow requests dumped to PROFILE_DIR.")
+            lines.append("# TYPE smartexp_slow_profiles_total counter")
+            lines.append(f"smartexp_slow_profiles_total {self.slow_profiles}")
+
+        caches = {"analytics": cache.get_analytics_cache()}
+        caches.update(extra_caches or {})
+        lines.append("# HELP smartexp_cache_hits_total Cache hits by cache.")
+        lines.append("# TYPE smartexp_cache_hits_total counter")
+        for name, backend in caches.items():
+            lines.append(f'smartexp_cache_hits_total{{cache="{name}"}} {backend.hits}')
+        lines.append("# HELP smartexp_cache_misses_total Cache misses by cache.")
+        lines.append("# TYPE smartexp_cache_misses_total counter")
+        for name, backend in caches.items():
+            lines.append(f'smartexp_cache_misses_total{{cache="{name}"}} {backend.misses}')
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+# --- Slow-request sampling ---
+
+def _start_profiler():
+    try:
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        return "pyinstrument", profiler
+    except ImportError:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return "cprofile", profiler
+
+def _dump_profile(kind, profiler, elapsed_ms, endpoint):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    name = f"{stamp}_{endpoint}_{int(elapsed_ms)}ms"
+    if kind == "pyinstrument":
+        path = os.path.join(PROFILE_DIR, name + ".html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+    else:
+        path = os.path.join(PROFILE_DIR, name + ".prof")
+        profiler.dump_stats(path)
+    return path
+
+def _stop_profiler(kind, profiler):
+    if kind == "pyinstrument":
+        profiler.stop()
+    else:
+        profiler.disable()
+
+# --- Flask wiring ---
+
+def install(app, extra_caches=None):
+    """Attaches the profiling hooks and the /metrics endpoint to a Flask app."""
+    from flask import Response, g, request, before_render_template, template_rendered
+
+    database.connection_factory = TimedConnection
+
+    @app.before_request
+    def _start_request():
+        g._profile_recorder = PhaseRecorder()
+        g._profile_token = _current.set(g._profile_recorder)
+        g._profile_start = time.perf_counter()
+        g._profiler = _start_profiler() if SAMPLE_RATE and random.random() < SAMPLE_RATE else None
+
+    @app.after_request
+    def _finish_request(response):
+        recorder = getattr(g, "_profile_recorder", None)
+        if recorder is None:
+            return response
+        elapsed = time.perf_counter() - g._profile_start
+        endpoint = request.endpoint or "unknown"
+
+        if g._profiler:
+            kind, profiler = g._profiler
+            _stop_profiler(kind, profiler)
+            g._profiler = None
+            if elapsed * 1000 >= SLOW_MS:
+                _dump_profile(kind, profiler, elapsed * 1000, endpoint)
+                metrics.slow_profiles += 1
+
+        if endpoint != "prometheus_metrics":
+            metrics.observe(endpoint, request.method, response.status_code, elapsed, recorder)
+
+        entries = []
+        for name, (count, ms) in sorted(recorder.phases.items()):
+            desc = f';desc="{count} queries"' if name == "db" else ""
+            entries.append(f"{name};dur={ms:.2f}{desc}")
+        entries.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+        return response
+
+    @app.teardown_request
+    def _reset_recorder(exc):
+        token = getattr(g, "_profile_token", None)
+        if token is not None:
+            _current.reset(token)
+            g._profile_token = None
+        if getattr(g, "_profiler", None):
+            _stop_profiler(*g._profiler)
+
+    def _render_started(sender, template, context, **extra):
+        g._render_start = time.perf_counter()
+
+    def _render_finished(sender, template, context, **extra):
+        start = getattr(g, "_render_start", None)
+        recorder = _current.get()
+        if start is not None and recorder is not None:
+            recorder.add("render", (time.perf_counter() - start) * 1000)
+
+    before_render_template.connect(_render_started, app, weak=False)
+    template_rendered.connect(_render_finished, app, weak=False)
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        return Response(metrics.render(extra_caches), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -0,0 +1,165 @@
+"""
+Token-bucket rate limiting for the login and PIN-reset forms.
+
+Each key has a bucket, e.g. "login:user:ali" or "login:ip:10.0.0.5". A bucket
+holds up to `capacity` tokens and refills continuously at capacity/period
+tokens per second. An attempt uses one token, and a request that finds the
+bucket empty is refused with a retry-after time. A successful attempt gives
+its IP token back, so many people signing in from one address (an office, a
+mobile carrier) don't lock each other out; failed guesses still add up.
+
+The IP is the client's address as the app sees it. Behind a reverse proxy
+that is the proxy's own address unless TRUSTED_PROXIES is set (see run.py).
+
+RATE_LIMIT_STORE picks where buckets live:
+    memory (default)  per worker process
+    sqlite            one local file shared by all gunicorn workers on the host
+                      (RATE_LIMIT_PATH, /dev/shm by default, like the analytics cache)
+    off               no limiting
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+# "<attempts>/<seconds>" bursts allowed per key; refilled evenly over the period
+LOGIN_USER_LIMIT = os.environ.get("LOGIN_USER_LIMIT", "5/60")
+LOGIN_IP_LIMIT = os.environ.get("LOGIN_IP_LIMIT", "20/60")
+
+def parse_limit(spec):
+    """'5/60' -> (capacity 5, refill 5/60 tokens per second)."""
+    attempts, seconds = spec.split("/")
+    capacity = float(attempts)
+    return capacity, capacity / float(seconds)
+
+class MemoryStore:
+    """Buckets in a dict guarded by a lock; idle, full buckets are pruned as it grows."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, rate, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._prune(now, capacity, rate)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def refund(self, key, capacity):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(capacity, tokens + 1), updated)
+
+    def _prune(self, now, capacity, rate):
+        full_after = capacity / rate
+        for k in [k for k, (_, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[k]
+
+class SQLiteStore:
+    """Buckets in a local SQLite file; BEGIN IMMEDIATE makes read-modify-write atomic across processes."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, rate, now=None):
+        # Wall clock: monotonic clocks aren't comparable across processes
+        now = time.time() if now is None else now
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?)", (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def refund(self, key, capacity):
+        self._conn().execute("UPDATE buckets SET tokens = MIN(?, tokens + 1) WHERE key = ?", (capacity, key))
+
+class NullStore:
+    def consume(self, key, capacity, rate, now=None):
+        return True, 0.0
+
+    def refund(self, key, capacity):
+        pass
+
+class RateLimiter:
+    def __init__(self, store, user_limit, ip_limit):
+        self.store = store
+        self.user_limit = parse_limit(user_limit)
+        self.ip_limit = parse_limit(ip_limit)
+        self.rejected = 0
+
+    def hit(self, action, username, ip):
+        """
+        Charges one attempt at `action` ('login', 'pin') to the username and IP buckets.
+        Returns (allowed, retry_after_seconds). Both buckets are charged even when one is empty.
+        """
+        user_ok, user_wait = self.store.consume(f"{action}:user:{username.strip().lower()}", *self.user_limit)
+        ip_ok, ip_wait = self.store.consume(f"{action}:ip:{ip}", *self.ip_limit)
+        if user_ok and ip_ok:
+            return True, 0.0
+        self.rejected += 1
+        return False, max(user_wait, ip_wait)
+
+    def succeeded(self, action, ip):
+        """Returns the IP token of an attempt that turned out to be legitimate."""
+        self.store.refund(f"{action}:ip:{ip}", self.ip_limit[0])
+
+def _default_sqlite_path():
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "smartexp_ratelimit.db")
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_limiter():
+    """Process-wide limiter for the auth forms (backend from RATE_LIMIT_STORE)."""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                backend = os.environ.get("RATE_LIMIT_STORE", "memory").lower()
+                if backend == "sqlite":
+                    store = SQLiteStore(os.environ.get("RATE_LIMIT_PATH", _default_sqlite_path()))
+                elif backend == "off":
+                    store = NullStore()
+                else:
+                    store = MemoryStore()
+                _limiter = RateLimiter(store, LOGIN_USER_LIMIT, LOGIN_IP_LIMIT)
+    return _limiter
@@ -0,0 +1,229 @@
+"""
+Receipt images: the uploaded originals and smaller copies made from them.
+
+An upload is stored once in UPLOAD_FOLDER as <sha256>.<ext>, so the same
+photo uploaded twice is one file, and expenses.receipt holds that name.
+Derivatives are made on first request and kept in RECEIPT_CACHE_DIR as
+<sha256>-<variant><size>.<format>:
+
+  thumb   fits 320 px, for lists
+  medium  fits 1280 px, for viewing
+  ocr     grayscale with the contrast stretched, fits 2000 px, PNG; what
+          Tesseract reads instead of the full-size photo
+
+thumb and medium are WebP for browsers that accept it, JPEG otherwise. A
+file name always means the same bytes, so they can be cached for a year.
+JPEG originals are decoded at 1/2, 1/4 or 1/8 scale when that is still
+larger than the target (Image.draft), which skips most of the decoding work
+for phone photos.
+
+sweep_orphans deletes originals that no expense points at any more (the
+expenses were deleted or the account reset), and derivatives whose original
+is gone. Files younger than RECEIPT_SWEEP_MIN_AGE are kept: an upload is
+saved before its expenses are written.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+import database
+
+UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', os.path.join('static', 'uploads'))
+RECEIPT_CACHE_DIR = os.environ.get('RECEIPT_CACHE_DIR')  # default: "derived" inside UPLOAD_FOLDER
+RECEIPT_SWEEP_HOURS = float(os.environ.get('RECEIPT_SWEEP_HOURS', '24'))
+RECEIPT_SWEEP_MIN_AGE = 3600
+
+# variant -> (longest side in px, grayscale)
+VARIANTS = {
+    "thumb": (320, False),
+    "medium": (1280, False),
+    "ocr": (2000, True),
+}
+MIMETYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+_NAME_RE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]{1,5}$')
+_DERIVED_RE = re.compile(r'^([0-9a-f]{64})-[a-z]+\d+\.[a-z]+$')
+
+def cache_dir():
+    return RECEIPT_CACHE_DIR or os.path.join(UPLOAD_FOLDER, 'derived')
+
+def is_receipt_name(name):
+    return bool(_NAME_RE.match(name or ''))
+
+def save_upload(stream, filename):
+    """Stores an uploaded file under its content hash. Returns the receipt name."""
+    ext = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if not re.fullmatch(r'[a-z0-9]{1,5}', ext):
+        ext = 'jpg'
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=UPLOAD_FOLDER, prefix='.upload-')
+    with os.fdopen(fd, 'wb') as f:
+        for block in iter(lambda: stream.read(1 << 16), b''):
+            digest.update(block)
+            f.write(block)
+    name = f"{digest.hexdigest()}.{ext}"
+    path = os.path.join(UPLOAD_FOLDER, name)
+    if os.path.exists(path):
+        os.remove(tmp)
+        # Fresh again, so a sweep running right now leaves it alone
+        os.utime(path)
+    else:
+        os.replace(tmp, path)
+    return name
+
+def output_format(variant, accept=''):
+    """File format of a variant for a request's Accept header."""
+    if variant == "ocr":
+        return "png"
+    return "webp" if "image/webp" in (accept or '') else "jpeg"
+
+def derivative_path(name, variant, fmt):
+    size, _ = VARIANTS[variant]
+    return os.path.join(cache_dir(), f"{name.split('.')[0]}-{variant}{size}.{fmt}")
+
+def derivative(name, variant, fmt=None):
+    """
+    Path of a variant of a stored receipt, rendering it first if it isn't
+    cached. Raises FileNotFoundError for an unknown receipt and OSError when
+    the original can't be read as an image.
+    """
+    if not is_receipt_name(name):
+        raise FileNotFoundError(name)
+    fmt = fmt or output_format(variant)
+    path = derivative_path(name, variant, fmt)
+    if os.path.exists(path):
+        return path
+    source = os.path.join(UPLOAD_FOLDER, name)
+    if not os.path.exists(source):
+        raise FileNotFoundError(name)
+    os.makedirs(cache_dir(), exist_ok=True)
+    # Workers racing on the same file each write their own temp copy; the last rename wins
+    fd, tmp = tempfile.mkstemp(dir=cache_dir(), prefix='.render-')
+    os.close(fd)
+    try:
+        _render(source, tmp, variant, fmt)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+def _render(source, target, variant, fmt):
+    from PIL import Image, ImageOps
+
+    size, grayscale = VARIANTS[variant]
+    with Image.open(source) as image:
+        if image.format == 'JPEG':
+            image.draft('L' if grayscale else 'RGB', (size, size))
+        # Phone photos are stored sideways with an orientation tag
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if grayscale:
+            image = ImageOps.autocontrast(image.convert('L'), cutoff=1)
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        if fmt == 'webp':
+            image.save(target, 'WEBP', quality=80, method=4)
+        elif fmt == 'jpeg':
+            image.save(target, 'JPEG', quality=82, optimize=True, progressive=True)
+        else:
+            image.save(target, 'PNG')
+
+def ocr_source(name):
+    """
+    The file OCR should read: the ocr variant of a photo of one receipt, else
+    the original (PDFs, multi-frame images, files that can't be rendered, and
+    photos of several receipts: fitting those in 2000 px leaves each receipt
+    a fraction of it, so they are cut apart at full resolution).
+    """
+    from PIL import Image, ImageOps
+
+    from ai_engine.ocr import find_receipts
+
+    original = os.path.join(UPLOAD_FOLDER, name)
+    try:
+        with Image.open(original) as image:
+            if getattr(image, 'n_frames', 1) > 1:
+                return original
+            # find_receipts looks at 600 px, so a reduced JPEG decode is enough
+            if image.format == 'JPEG':
+                image.draft('L', (600, 600))
+            if len(find_receipts(ImageOps.exif_transpose(image.convert('L')))) > 1:
+                return original
+        return derivative(name, "ocr")
+    except OSError:
+        return original
+
+# --- Orphans ---
+
+def sweep_orphans(min_age=None):
+    """
+    Deletes stored receipts no expense points at and derivatives of missing
+    originals, leaving files modified in the last `min_age` seconds. Returns
+    {"originals": n, "derivatives": n, "bytes": n}.
+    """
+    min_age = RECEIPT_SWEEP_MIN_AGE if min_age is None else min_age
+    cutoff = time.time() - min_age
+    referenced = database.get_receipts()
+    removed = {"originals": 0, "derivatives": 0, "bytes": 0}
+
+    def remove(path, kind):
+        try:
+            if os.path.getmtime(path) > cutoff:
+                return
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        removed[kind] += 1
+        removed["bytes"] += size
+
+    # Files from before content-hash names, temp files and the cache dir don't match
+    originals = [name for name in os.listdir(UPLOAD_FOLDER) if is_receipt_name(name)] \
+        if os.path.isdir(UPLOAD_FOLDER) else []
+    for name in originals:
+        if name not in referenced:
+            remove(os.path.join(UPLOAD_FOLDER, name), "originals")
+    kept = {name.split('.')[0] for name in originals if os.path.exists(os.path.join(UPLOAD_FOLDER, name))}
+    if os.path.isdir(cache_dir()):
+        for name in os.listdir(cache_dir()):
+            match = _DERIVED_RE.match(name)
+            if match and match.group(1) not in kept:
+                remove(os.path.join(cache_dir(), name), "derivatives")
+    return removed
+
+def start_sweeper():
+    """
+    Runs sweep_orphans every RECEIPT_SWEEP_HOURS in a daemon thread. Every
+    worker starts one; a marker file's mtime lets only the first one due do
+    the work.
+    """
+    if RECEIPT_SWEEP_HOURS <= 0:
+        return None
+    interval = RECEIPT_SWEEP_HOURS * 3600
+
+    def loop():
+        while True:
+            marker = os.path.join(cache_dir(), '.last_sweep')
+            try:
+                due = time.time() - os.path.getmtime(marker) >= interval
+            except OSError:
+                due = True
+            if due:
+                os.makedirs(cache_dir(), exist_ok=True)
+                with open(marker, 'w'):
+                    pass
+                try:
+                    sweep_orphans()
+                except Exception as e:
+                    print(f"Receipt sweep failed: {e}")
+            time.sleep(min(interval, 3600))
+
+    thread = threading.Thread(target=loop, name='receipt-sweep', daemon=True)
+    thread.start()
+    return thread
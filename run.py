@@ -1,31 +1,109 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, g, send_file
 import database
+import backup
+import cache
+import concurrency
+import profiling
+import ratelimit
+import receipts
+import sessions
+import profiles
+import expense_store
+import assets
+import templating
 from ai_engine import classifier as ai_classifier
 from ai_engine import analytics as ai_analytics
 from ai_engine import ocr as ai_ocr
 from ai_engine import chatbot as ai_chatbot
-import re
+from ai_engine import recurring as ai_recurring
+from ai_engine.parser import parse_input
 import os
+import math
+import secrets
+import hmac
+import asyncio
+import inspect
 from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from werkzeug.http import is_resource_modified
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
-app.secret_key = 'super_secret_key_for_university_project'
-UPLOAD_FOLDER = os.path.join('static', 'uploads')
+# Sessions live server-side (sessions.py); the key only signs what Flask still signs itself
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+app.session_interface = sessions.SQLiteSessionInterface()
+app.permanent_session_lifetime = timedelta(days=float(os.environ.get('SESSION_LIFETIME_DAYS', '7')))
+UPLOAD_FOLDER = receipts.UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Reverse proxies in front of the app (1 on Render/Heroku). Their X-Forwarded-For/-Proto
+# give the client address the login rate limit counts by; 0 trusts no forwarded headers.
+TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', '0'))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+# Bearer token for the /admin endpoints; they answer 404 while it is unset
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# The OCR pool (ai_engine/ocr.py) spawns fresh interpreters, and each imports
+# the script the app was started from as __mp_main__: this file under
+# `python run.py`. They only run OCR, so they skip the startup work.
+OCR_CHILD = __name__ == '__mp_main__'
 
 # Initialize System
-database.init_db()
 classifier = ai_classifier.ExpenseClassifier()
-try:
-    classifier.load_model()
-except:
-    classifier.train()
+if not OCR_CHILD:
+    database.init_db()
+    try:
+        classifier.load_model()
+    except:
+        classifier.train()
+
+# Chart payloads keyed on (user, data version, month); a write bumps the version
+chart_cache = cache.LRUCache(max_entries=2048)
+database.on_write(chart_cache.invalidate)
+
+# Re-check the touched bill series after every expense write
+database.on_expense_change(ai_recurring.update_series)
+
+if not OCR_CHILD:
+    # Delete stored receipts whose expenses are gone (RECEIPT_SWEEP_HOURS)
+    receipts.start_sweeper()
+
+    # Hashed, precompressed static files under /assets/; compiled templates and cached fragments
+    assets.init_app(app)
+    templating.init_app(app)
+
+# Opt-in per-request phase timings, Server-Timing headers and /metrics (PROFILING=1)
+if profiling.ENABLED:
+    profiling.install(app, extra_caches={"chart_data": chart_cache, "fragments": templating.fragment_cache})
+
+@app.before_request
+def load_profile():
+    user_id = session.get('user_id')
+    if not user_id:
+        g.profile = None
+    elif session.row is not None:
+        # The session row came joined with the profile version; reload only if it changed
+        g.profile = profiles.sync(user_id, session.row)
+    else:
+        g.profile = profiles.get_profile(user_id)
+
+@app.context_processor
+def inject_profile():
+    profile = g.get('profile')
+    return {'currency': profile.currency if profile else 'PKR'}
 
 # --- Helpers ---
 def login_required(f):
+    if inspect.iscoroutinefunction(f):
+        @wraps(f)
+        async def async_decorated_function(*args, **kwargs):
+            if 'user_id' not in session:
+                return redirect(url_for('login'))
+            return await f(*args, **kwargs)
+        return async_decorated_function
+
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if 'user_id' not in session:
@@ -33,43 +111,67 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def parse_input(user_input):
-    """
-    Parses natural language input into multiple transactions.
-    Example: "pizza 700 cooking oil 700 cigs 150"
-    Returns: List of (text, amount) tuples.
-    """
-    # Helper to clean text
-    def clean(t): return t.strip().strip(',').strip('and').strip()
-
-    # Regex pattern: (Words/Spaces) followed by (Number)
-    # This logic splits the string by numbers to find multiple items
-    items = []
-    
-    # Strategy: Find all numbers first, then split text around them
-    # Better Regex: Look for groups of (Text)(Number)
-    pattern = re.compile(r'([a-zA-Z\s,]+?)(\d+(?:\.\d+)?)')
-    matches = pattern.findall(user_input)
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "not found"}), 404
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {ADMIN_TOKEN}"):
+            return jsonify({"error": "forbidden"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+def _rate_limited(action, username, template, **context):
+    """Returns a 429 response when this username or client IP is over its attempt budget, else None."""
+    allowed, retry_after = ratelimit.get_limiter().hit(action, username, request.remote_addr)
+    if allowed:
+        return None
+    wait = max(1, math.ceil(retry_after))
+    flash(f'Too many attempts. Try again in {wait} seconds.', 'error')
+    response = make_response(render_template(template, **context), 429)
+    response.headers['Retry-After'] = str(wait)
+    return response
+
+def _flag_duplicates(expense_id, text, amount):
+    """Asks the user to review a new expense that matches one already entered (e.g. typed and then scanned)."""
+    matches = database.find_duplicates(expense_id, session['user_id'])
+    if matches:
+        match = matches[0]
+        flash({'id': expense_id, 'text': text, 'amount': amount,
+               'match_text': match['expense_text'], 'match_date': match['date'][:10]}, 'duplicate')
+    return len(matches)
+
+def _add_classified(text, amount, **kwargs):
+    """Adds an expense in the category the classifier picks, flagged for review when it is unsure."""
+    category, confidence = classifier.predict(text)
+    review = ai_classifier.needs_review(confidence)
+    expense_id = database.add_expense(text, amount, category, session['user_id'], confidence=confidence,
+                                      needs_review=review, **kwargs)
+    _flag_duplicates(expense_id, text, amount)
+    return category, review
+
+def _load_history(user_id):
+    """(review queue, expenses grouped by category with totals) for the history page."""
+    expenses = database.get_expenses(user_id=user_id)
+    # Sort by Date descending so backdated entries appear correctly in timeline
+    expenses.sort(key=lambda x: (x['date'], x['id']), reverse=True)
     
-    for text, amount_str in matches:
-        desc = clean(text)
-        if desc:
-            try:
-                amt = float(amount_str)
-                items.append((desc, amt))
-            except:
-                continue
-                
-    # Fallback for simple "Biryani 300" if complex regex misses
-    if not items:
-        # Old logic as fallback
-        match = re.search(r'(\d+(\.\d+)?)', user_input)
-        if match:
-            amount = float(match.group(1))
-            text = user_input.replace(match.group(1), "").strip()
-            items.append((text, amount))
-            
-    return items
+    # Group by category
+    categorized_expenses = {}
+    for expense in expenses:
+        cat = expense['category']
+        if cat not in categorized_expenses:
+            categorized_expenses[cat] = {'entries': [], 'total': 0}
+        categorized_expenses[cat]['entries'].append(expense)
+        categorized_expenses[cat]['total'] += expense['amount_minor']
+    for group in categorized_expenses.values():
+        group['total'] /= 100
+    return database.get_review_queue(user_id), categorized_expenses
+
+def _flash_review(count):
+    if count:
+        flash(f'Not sure about the category of {count} item{"s" if count > 1 else ""}: '
+              f'confirm {"them" if count > 1 else "it"} under Needs review in History.', 'warning')
 
 # --- Routes ---
 @app.route('/')
@@ -83,8 +185,13 @@ def login():
     if request.method == 'POST':
         username = request.form['username']
         password = request.form['password']
+        limited = _rate_limited('login', username, 'login.html', page_title="Login")
+        if limited:
+            return limited
         user_id = database.check_user(username, password)
         if user_id:
+            ratelimit.get_limiter().succeeded('login', request.remote_addr)
+            session.rotate()
             session['user_id'] = user_id
             session['username'] = username
             return redirect(url_for('dashboard'))
@@ -111,9 +218,14 @@ def forgot_password():
         username = request.form['username']
         pin = request.form['pin']
         new_password = request.form['new_password']
+        limited = _rate_limited('pin', username, 'forgot_password.html')
+        if limited:
+            return limited
         
         if database.check_security_pin(username, pin):
+            ratelimit.get_limiter().succeeded('pin', request.remote_addr)
             database.update_password(username, new_password)
+            database.delete_user_sessions(database.get_user_id(username))
             flash('Password reset successfully! Please login.', 'success')
             return redirect(url_for('login'))
         else:
@@ -133,15 +245,12 @@ def dashboard():
     username = session['username']
     
     # Fetch Data
-    expenses = database.get_expenses(user_id=user_id)
-    # Sort by Date descending (Newest date first), then by ID (for same date)
-    expenses.sort(key=lambda x: (x['date'], x['id']), reverse=True)
+    # Newest date first, then by ID (for same date)
+    expenses = database.get_recent_expenses(user_id, limit=5)
     total = ai_analytics.get_monthly_total(user_id)
-    suggestions = ai_analytics.generate_suggestions(user_id)
     
     # Advanced AI
     forecast = ai_analytics.predict_next_month_spending(user_id)
-    anomalies = ai_analytics.detect_anomalies(user_id)
     
     current_date = datetime.now().strftime("%B %d, %Y")
     
@@ -149,12 +258,14 @@ def dashboard():
                            page_title="Dashboard",
                            active_page="dashboard",
                            username=username, 
-                           expenses=expenses[:5],
+                           expenses=expenses,
                            total=total, 
-                           suggestions=suggestions,
-                           anomalies=anomalies,
                            forecast=forecast,
-                           current_date=current_date)
+                           current_date=current_date,
+                           fragment_key=templating.fragment_key(user_id),
+                           # Only called when the Insight block isn't cached
+                           load_insights=lambda: (ai_analytics.detect_anomalies(user_id),
+                                                  ai_analytics.generate_suggestions(user_id)))
 
 @app.route('/chat')
 @login_required
@@ -167,38 +278,30 @@ def chat_page():
 
 @app.route('/api/chat', methods=['POST'])
 @login_required
-def chat_api():
+async def chat_api():
     data = request.get_json()
     message = data.get('message', '')
     user_id = session['user_id']
     username = session['username']
-    response = ai_chatbot.process_query(message, user_id, username)
+    response = await concurrency.run_io_bound(ai_chatbot.process_query, message, user_id, username)
     return jsonify({'response': response})
 
 @app.route('/history')
 @login_required
-def history():
+async def history():
     user_id = session['user_id']
     username = session['username']
     
-    expenses = database.get_expenses(user_id=user_id)
-    # Sort by Date descending so backdated entries appear correctly in timeline
-    expenses.sort(key=lambda x: (x['date'], x['id']), reverse=True)
-    
-    # Group by category
-    categorized_expenses = {}
-    for expense in expenses:
-        cat = expense['category']
-        if cat not in categorized_expenses:
-            categorized_expenses[cat] = {'entries': [], 'total': 0}
-        categorized_expenses[cat]['entries'].append(expense)
-        categorized_expenses[cat]['total'] += expense['amount']
+    fragment_key = await concurrency.run_io_bound(templating.fragment_key, user_id)
     
     return render_template('history.html', 
                            page_title="History",
                            active_page="history",
                            username=username,
-                           categorized_expenses=categorized_expenses)
+                           fragment_key=fragment_key,
+                           # Only called when the page body isn't cached
+                           load_history=lambda: _load_history(user_id),
+                           categories=list(profiles.DEFAULT_CATEGORY_BUDGETS))
 
 @app.route('/settings')
 @login_required
@@ -207,7 +310,10 @@ def settings():
     return render_template('settings.html',
                            page_title="Settings",
                            active_page="settings",
-                           username=username)
+                           username=username,
+                           profile=g.profile,
+                           currencies=profiles.CURRENCIES,
+                           categories=list(profiles.DEFAULT_CATEGORY_BUDGETS))
 
 @app.route('/change_password', methods=['POST'])
 @login_required
@@ -215,14 +321,14 @@ def change_password():
     new_password = request.form['new_password']
     username = session['username']
     database.update_password(username, new_password)
+    # Sign out other devices
+    database.delete_user_sessions(session['user_id'], keep_sid=session.sid)
     flash('Password updated successfully.', 'success')
     return redirect(url_for('settings'))
 
 @app.route('/export_pdf')
 @login_required
 def export_pdf():
-    from fpdf import FPDF
-    
     user_id = session['user_id']
     username = session['username']
     expenses = database.get_expenses(user_id=user_id)
@@ -230,6 +336,19 @@ def export_pdf():
     forecast = ai_analytics.predict_next_month_spending(user_id)
     current_date = datetime.now().strftime("%B %d, %Y")
     
+    # PDF layout is pure CPU work: run it on the bounded executor
+    pdf_bytes = concurrency.run_cpu_bound(build_pdf_report, username, expenses, total, forecast, current_date,
+                                          g.profile.currency)
+    
+    response = make_response(pdf_bytes)
+    response.headers['Content-Type'] = 'application/pdf'
+    response.headers['Content-Disposition'] = 'attachment; filename=SmartExpense_Report.pdf'
+    return response
+
+def build_pdf_report(username, expenses, total, forecast, current_date, currency="PKR"):
+    """Lays out the user report and returns the PDF bytes."""
+    from fpdf import FPDF
+    
     class PDF(FPDF):
         def header(self):
             self.set_font('Arial', 'B', 15)
@@ -258,12 +377,12 @@ def export_pdf():
     pdf.set_font("Arial", 'B', 12)
     pdf.cell(95, 10, f"Total Spending (This Month):", 0, 0)
     pdf.set_font("Arial", '', 12)
-    pdf.cell(95, 10, f"PKR {total}", 0, 1)
+    pdf.cell(95, 10, f"{currency} {total}", 0, 1)
     
     pdf.set_font("Arial", 'B', 12)
     pdf.cell(95, 10, f"Forecast (Next Month):", 0, 0)
     pdf.set_font("Arial", '', 12)
-    pdf.cell(95, 10, f"PKR {forecast}", 0, 1)
+    pdf.cell(95, 10, f"{currency} {forecast}", 0, 1)
     
     pdf.ln(15)
     
@@ -288,12 +407,9 @@ def export_pdf():
         pdf.cell(30, 10, date_str, 1)
         pdf.cell(50, 10, str(e['category']), 1)
         pdf.cell(80, 10, str(e['expense_text'])[:40], 1) # Truncate long text
-        pdf.cell(30, 10, f"PKR {e['amount']}", 1, 1)
+        pdf.cell(30, 10, f"{currency} {e['amount']}", 1, 1)
         
-    response = make_response(pdf.output(dest='S').encode('latin-1'))
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = 'attachment; filename=SmartExpense_Report.pdf'
-    return response
+    return pdf.output(dest='S').encode('latin-1')
 
 @app.route('/delete_expense/<int:expense_id>', methods=['POST'])
 @login_required
@@ -321,23 +437,48 @@ def update_expense_route(expense_id):
     flash('Transaction updated successfully.', 'success')
     return redirect(url_for('history'))
 
+@app.route('/review_expense/<int:expense_id>', methods=['POST'])
+@login_required
+def review_expense_route(expense_id):
+    """Confirms or corrects the category of an expense from the review queue."""
+    category = request.form.get('category')
+    if category not in profiles.DEFAULT_CATEGORY_BUDGETS:
+        flash('Invalid category.', 'error')
+    elif database.review_expense(expense_id, session['user_id'], category):
+        flash(f'Category confirmed: {category}.', 'success')
+    else:
+        flash('Transaction not found.', 'error')
+    return redirect(url_for('history'))
+
 @app.route('/reset_account', methods=['POST'])
 @login_required
 def reset_account():
     # In a real app, require password confirmation here
     user_id = session['user_id']
-    conn = database.get_connection()
-    c = conn.cursor()
-    c.execute("DELETE FROM expenses WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    database.reset_account(user_id)
     flash('All your data has been reset.', 'warning')
     return redirect(url_for('settings'))
 
 @app.route('/update_settings', methods=['POST'])
 @login_required
 def update_settings():
-    # Placeholder for saving currency/profile preferences
+    currency = request.form.get('currency', 'PKR')
+    try:
+        monthly_budget = float(request.form.get('monthly_budget') or profiles.DEFAULT_MONTHLY_BUDGET)
+        alert_threshold = float(request.form.get('alert_threshold') or profiles.DEFAULT_ALERT_THRESHOLD * 100) / 100
+        budgets = {}
+        for i, category in enumerate(profiles.DEFAULT_CATEGORY_BUDGETS):
+            value = request.form.get(f'budget_{i}')
+            budgets[category] = float(value) if value else profiles.DEFAULT_CATEGORY_BUDGETS[category]
+    except ValueError:
+        flash('Budgets must be numbers.', 'error')
+        return redirect(url_for('settings'))
+    if currency not in profiles.CURRENCIES or monthly_budget < 0 or not 0 < alert_threshold <= 1 \
+            or any(v < 0 for v in budgets.values()):
+        flash('Invalid settings.', 'error')
+        return redirect(url_for('settings'))
+    
+    profiles.update_profile(session['user_id'], currency, monthly_budget, alert_threshold, budgets)
     flash('Settings saved successfully.', 'success')
     return redirect(url_for('settings'))
 
@@ -346,22 +487,33 @@ def update_settings():
 def add_expense_route():
     raw_input = request.form['raw_input']
     custom_date = request.form.get('expense_date') # Optional date from form
+    if custom_date:
+        try:
+            datetime.strptime(custom_date, '%Y-%m-%d')
+        except ValueError:
+            flash('Invalid date. Use the YYYY-MM-DD format.', 'error')
+            return redirect(url_for('dashboard'))
     
-    items = parse_input(raw_input)
+    leftovers = []
+    items = parse_input(raw_input, leftovers)
     
     if items:
         count = 0
+        unsure = 0
         for text, amount in items:
-            category = classifier.predict(text)
-            database.add_expense(text, amount, category, session['user_id'], custom_date)
+            category, review = _add_classified(text, amount, custom_date=custom_date)
+            unsure += review
             count += 1
         
         if count == 1:
             # Single item message
-            flash(f'Added: {items[0][0]} (PKR {items[0][1]}) - {category}', 'success')
+            flash(f'Added: {items[0][0]} ({g.profile.currency} {items[0][1]}) - {category}', 'success')
         else:
             # Multi item message
             flash(f'Successfully added {count} separate expenses!', 'success')
+        if leftovers:
+            flash(f'Not added (no amount or item to pair with): {", ".join(leftovers)}', 'warning')
+        _flash_review(unsure)
     else:
         flash('Could not understand input. Try format "Item 100 Item 200"', 'error')
     return redirect(url_for('dashboard'))
@@ -378,50 +530,155 @@ def upload_receipt():
         flash('No selected file', 'error')
         return redirect(url_for('dashboard'))
         
-    filename = secure_filename(file.filename)
-    path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(path)
+    # Stored under its content hash; OCR reads the downscaled grayscale copy
+    receipt = receipts.save_upload(file.stream, secure_filename(file.filename))
+    path = concurrency.run_cpu_bound(receipts.ocr_source, receipt)
     
-    text = ai_ocr.extract_text(path)
+    # One text per PDF page, image frame or receipt found on the photo, in order
+    pages = concurrency.run_cpu_bound(ai_ocr.extract_pages, path)
     
     # Feature #4: Try to find multiple items first
-    items = ai_ocr.parse_receipt_items(text)
+    items = ai_ocr.parse_receipt_items(pages)
     
+    unsure = 0
     if items:
         count = 0
         total_added = 0
         for item in items:
-            cat = classifier.predict(item['desc'])
-            database.add_expense(item['desc'], item['amount'], cat, session['user_id'])
+            _, review = _add_classified(item['desc'], item['amount'], receipt=receipt)
+            unsure += review
             count += 1
             total_added += item['amount']
-        flash(f'Receipt Processed! Added {count} items totaling PKR {total_added}. Check History.', 'success')
+        flash(f'Receipt Processed! Added {count} items totaling {g.profile.currency} {total_added}. Check History.', 'success')
     else:
-        # Fallback to simple Total parsing if no items found
-        desc, amount = ai_ocr.parse_receipt(text)
-        category = classifier.predict(desc if desc else "Receipt")
+        # Fallback to simple Total parsing if no items found, one total per page / receipt
+        added = []  # (desc, amount, category) of each total added
+        for text in pages:
+            desc, amount = ai_ocr.parse_receipt(text)
+            if amount > 0:
+                category, review = _add_classified(desc, amount, receipt=receipt)
+                unsure += review
+                added.append((desc, amount, category))
         
-        if amount > 0:
-            database.add_expense(desc, amount, category, session['user_id'])
-            flash(f'Receipt Scanned! Added: {desc} (PKR {amount}) - {category}', 'success')
+        if len(added) == 1:
+            desc, amount, category = added[0]
+            flash(f'Receipt Scanned! Added: {desc} ({g.profile.currency} {amount}) - {category}', 'success')
+        elif added:
+            flash(f'Receipts Scanned! Added {len(added)} totals. Check History.', 'success')
         else:
             flash('Could not read receipt clearly. Please add manually.', 'warning')
+    _flash_review(unsure)
              
     return redirect(url_for('dashboard'))
 
+@app.route('/receipts/<name>/<variant>')
+@login_required
+def receipt_image(name, variant):
+    """A downscaled copy of one of the user's receipts (see receipts.VARIANTS), made on first request."""
+    if variant not in receipts.VARIANTS or not receipts.is_receipt_name(name) \
+            or not database.has_receipt(session['user_id'], name):
+        return 'Not found', 404
+    fmt = receipts.output_format(variant, request.headers.get('Accept'))
+    try:
+        path = concurrency.run_cpu_bound(receipts.derivative, name, variant, fmt)
+    except OSError:
+        return 'Not found', 404
+    response = send_file(path, mimetype=receipts.MIMETYPES[fmt], conditional=True)
+    response.headers['Cache-Control'] = receipts.CACHE_CONTROL
+    response.vary.add('Accept')
+    return response
+
 @app.route('/api/chart_data')
 @login_required
-def chart_data():
+async def chart_data():
     user_id = session['user_id']
-    breakdown = ai_analytics.get_category_breakdown(user_id)
-    daily = ai_analytics.get_daily_spending(user_id)
+    version, updated_at = await concurrency.run_io_bound(database.get_data_version, user_id)
+    
+    # Charts only cover the current month, so the month is part of the validator
+    now = datetime.now()
+    current_month = now.strftime("%Y-%m")
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_modified = max(updated_at, month_start) if updated_at else month_start
+    etag = f"{user_id}-{version}-{current_month}"
+    
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = make_response('', 304)
+    else:
+        key = ('chart_data', user_id, version, current_month)
+        payload = chart_cache.get(key)
+        if payload is None:
+            breakdown, daily = await asyncio.gather(
+                concurrency.run_io_bound(ai_analytics.get_category_breakdown, user_id),
+                concurrency.run_io_bound(ai_analytics.get_daily_spending, user_id)
+            )
+            payload = {
+                "categories": list(breakdown.keys()),
+                "category_amounts": list(breakdown.values()),
+                "dates": list(daily.keys()),
+                "daily_amounts": list(daily.values())
+            }
+            chart_cache.set(key, payload)
+        response = jsonify(payload)
+    
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Private data: browsers may keep it but must revalidate every time
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/search')
+@login_required
+def search_api():
+    args = request.args
+    try:
+        min_amount = float(args['min']) if args.get('min') else None
+        max_amount = float(args['max']) if args.get('max') else None
+        page = max(1, int(args.get('page', 1)))
+        per_page = min(100, max(1, int(args.get('per_page', 20))))
+        for key in ('from', 'to'):
+            if args.get(key):
+                datetime.strptime(args[key], "%Y-%m-%d")
+    except ValueError:
+        return jsonify({"error": "Invalid filter value"}), 400
     
+    rows, total = database.search_expenses(session['user_id'],
+                                           query=args.get('q', '').strip(),
+                                           category=args.get('category') or None,
+                                           date_from=args.get('from') or None,
+                                           date_to=args.get('to') or None,
+                                           min_amount=min_amount,
+                                           max_amount=max_amount,
+                                           page=page,
+                                           per_page=per_page)
     return jsonify({
-        "categories": list(breakdown.keys()),
-        "category_amounts": list(breakdown.values()),
-        "dates": list(daily.keys()),
-        "daily_amounts": list(daily.values())
+        "results": [{"id": r['id'], "text": r['expense_text'], "amount": r['amount'],
+                     "category": r['category'], "date": r['date']} for r in rows],
+        "total": total,
+        "page": page,
+        "per_page": per_page
     })
 
+@app.route('/api/cache_stats')
+@admin_required
+def cache_stats():
+    # Process-wide counts over every user's entries, so not for regular accounts
+    return jsonify({
+        "analytics": cache.get_analytics_cache().stats(),
+        "chart_data": chart_cache.stats(),
+        "fragments": templating.fragment_cache.stats(),
+        "expense_store": expense_store.cache_stats(),
+        "profiles": profiles.cache_stats()
+    })
+
+@app.route('/admin/backup', methods=['GET', 'POST'])
+@admin_required
+def admin_backup():
+    """POST starts an online snapshot in the background (?compress=1 to gzip it); GET reports its progress."""
+    if request.method == 'POST':
+        if not backup.start_background(compress=request.args.get('compress') == '1'):
+            return jsonify({"error": "a backup is already running", **backup.status()}), 409
+        return jsonify(backup.status()), 202
+    return jsonify(backup.status())
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
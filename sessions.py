@@ -0,0 +1,91 @@
+"""
+Server-side Flask sessions stored in the `sessions` table.
+
+The cookie holds only a random session id. The session data (user_id,
+username, flashed messages) stays in SQLite, so it can't be read or forged on
+the client, and a user can be logged out everywhere by deleting rows. The
+lookup query also joins user_profiles, and its result is handed to
+profiles.sync, so loading the profile costs no extra query per request.
+
+Rows are written only when the session changes, or to extend the expiry once
+less than half the lifetime remains.
+"""
+import secrets
+import time
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SecureCookieSession, SessionInterface
+
+import database
+
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid=None, new=False, row=None):
+        super().__init__(initial)
+        self.sid = sid
+        self.new = new
+        self.row = row              # session + profile join row, None for a new session
+        self.stale_sid = None       # old id to delete after rotate()
+
+    def rotate(self):
+        """New id for an existing session (call on login to prevent session fixation)."""
+        if not self.new:
+            self.stale_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+class SQLiteSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+    session_class = ServerSession
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            row = database.load_session(sid, time.time())
+            if row is not None:
+                try:
+                    data = self.serializer.loads(row['data'])
+                    return self.session_class(data, sid=sid, row=row)
+                except ValueError:
+                    pass
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.stale_sid:
+            database.delete_session(session.stale_sid)
+            session.stale_sid = None
+
+        if not session:
+            if session.modified and not session.new:
+                # Cleared (logout): drop the row and the cookie
+                database.delete_session(session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app), httponly=self.get_cookie_httponly(app))
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        expires_at = now + lifetime
+        if session.modified or session.new:
+            database.save_session(session.sid, session.get('user_id'), self.serializer.dumps(dict(session)), expires_at)
+            if session.new and session.get('user_id'):
+                database.purge_expired_sessions(now)
+        elif session.row is not None and session.row['expires_at'] - now < lifetime / 2:
+            database.touch_session(session.sid, expires_at)
+        else:
+            return
+
+        response.set_cookie(
+            name, session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+        response.vary.add("Cookie")
@@ -0,0 +1,79 @@
+"""
+Template rendering costs: compiled templates kept on disk, and the heavy
+blocks of a page kept as rendered HTML per user.
+
+Jinja compiles every template to Python the first time a worker loads it.
+The compiled code is written to TEMPLATE_CACHE_DIR (Jinja's per-user temp
+directory by default, "off" to disable), keyed by template name and source
+checksum, so a new worker loads it instead of compiling again and an edited
+template is compiled once more. warm() loads all templates when the worker
+starts, so no first request pays for it.
+
+    {% cache "history", fragment_key %} ... {% endcache %}
+
+renders its body once per key and keeps the HTML in an in-process LRU of
+FRAGMENT_CACHE_SIZE entries (0 turns it off). Views pass
+fragment_key(user_id): (user_id, data version, profile version, month). An
+expense write or a settings change in any worker gives a new key; this
+worker's entries for that user are also dropped on write. The body only runs
+on a miss, so views hand in the data it needs as callables and nothing is
+queried on a hit.
+"""
+import os
+from datetime import datetime
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+import cache
+import database
+import profiles
+
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR')  # None: Jinja's default temp dir
+FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', '512'))
+
+fragment_cache = cache.LRUCache(max_entries=FRAGMENT_CACHE_SIZE) if FRAGMENT_CACHE_SIZE > 0 else cache.NullCache()
+database.on_write(fragment_cache.invalidate)
+
+def fragment_key(user_id):
+    """Everything a cached fragment of this user's pages depends on."""
+    version, _ = database.get_data_version(user_id)
+    return (user_id, version, profiles.get_profile(user_id).version, datetime.now().strftime("%Y-%m"))
+
+class FragmentCacheExtension(Extension):
+    """The {% cache name, key %} tag; key is a fragment_key() tuple, or None to render uncached."""
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        name = parser.parse_expression()
+        parser.stream.expect("comma")
+        key = parser.parse_expression()
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [name, key]), [], [], body).set_lineno(lineno)
+
+    def _render(self, name, key, caller):
+        if key is None:
+            return caller()
+        # The user id stays in position 1, where LRUCache.invalidate looks for it
+        full_key = ("fragment", key[0], name) + tuple(key[1:])
+        html = fragment_cache.get(full_key)
+        if html is None:
+            html = caller()
+            fragment_cache.set(full_key, html, user_id=key[0])
+        return html
+
+def warm(app):
+    """Loads (and so compiles, or reads from the bytecode cache) every template."""
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+
+def init_app(app):
+    if TEMPLATE_CACHE_DIR != "off":
+        if TEMPLATE_CACHE_DIR:
+            os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+        # Must be set before the first template is loaded
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    warm(app)
@@ -0,0 +1,40 @@
+"""
+Shared fixtures. Tests run against a throwaway database, upload folder and
+asset directory, with cheap password hashing and one trusted proxy hop; `app`
+imports run.py once per test session.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Set before any test module imports database.py, which reads EXPENSES_DB on import
+_workdir = tempfile.mkdtemp(prefix="smartexp-tests-")
+os.environ.update({
+    "EXPENSES_DB": os.path.join(_workdir, "expenses.db"),
+    "UPLOAD_FOLDER": os.path.join(_workdir, "uploads"),
+    "ASSET_DIR": os.path.join(_workdir, "assets"),
+    "TEMPLATE_CACHE_DIR": "off",
+    "RECEIPT_SWEEP_HOURS": "0",
+    "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    "PASSWORD_CACHE_TTL": "0",
+    "RATE_LIMIT_STORE": "memory",
+    "TRUSTED_PROXIES": "1",
+})
+sys.path.insert(0, ROOT)
+
+@pytest.fixture(scope="session")
+def app():
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import run
+        run.app.testing = True
+        yield run.app
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(_workdir, ignore_errors=True)
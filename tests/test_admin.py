@@ -0,0 +1,16 @@
+"""Endpoints that report on every user's data answer to the admin token only."""
+import database
+
+def test_cache_stats_needs_the_admin_token(app, monkeypatch):
+    import run
+
+    database.register_user("tenant", "pw", "0000")
+    client = app.test_client()
+    client.post("/login", data={"username": "tenant", "password": "pw"})
+    assert client.get("/api/cache_stats").status_code == 404  # no ADMIN_TOKEN set
+
+    monkeypatch.setattr(run, "ADMIN_TOKEN", "s3cret")
+    assert client.get("/api/cache_stats").status_code == 403
+    response = client.get("/api/cache_stats", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "chart_data" in response.get_json()
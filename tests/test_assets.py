@@ -0,0 +1,54 @@
+"""Vendored static files (assets.vendor) against a stand-in npm registry."""
+import base64
+import hashlib
+import io
+import json
+import tarfile
+import urllib.request
+
+import pytest
+
+import assets
+
+FILES = {"package/dist/chart.umd.js": b"/*!\n * Chart.js v4.4.0\n */\n!function(){}();\n",
+         "package/LICENSE.md": b"The MIT License (MIT)\n"}
+
+def npm_tarball(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """Serves one chart.js release; returns its dist metadata to tamper with."""
+    tarball = npm_tarball(FILES)
+    dist = {"tarball": "https://registry.test/chart.js-4.4.0.tgz",
+            "integrity": "sha512-" + base64.b64encode(hashlib.sha512(tarball).digest()).decode()}
+
+    def urlopen(url, timeout=None):
+        if url == f"{assets.NPM_REGISTRY}/chart.js/4.4.0":
+            return io.BytesIO(json.dumps({"dist": dist}).encode())
+        assert url == dist["tarball"]
+        return io.BytesIO(tarball)
+
+    monkeypatch.setattr(urllib.request, "urlopen", urlopen)
+    monkeypatch.setattr(assets, "STATIC_FOLDER", str(tmp_path))
+    (tmp_path / "js").mkdir()
+    return dist
+
+def test_vendor_copies_the_release_files_unchanged(registry, tmp_path):
+    assert assets.vendor(check=True) == list(assets.VENDORED)
+    assert assets.vendor() == list(assets.VENDORED)
+    assert (tmp_path / "js" / "chart.umd.min.js").read_bytes() == FILES["package/dist/chart.umd.js"]
+    assert (tmp_path / "js" / "chart.LICENSE.txt").read_bytes() == FILES["package/LICENSE.md"]
+    assert assets.vendor(check=True) == []
+
+def test_vendor_rejects_a_tarball_that_fails_its_integrity_hash(registry, tmp_path):
+    registry["integrity"] = "sha512-" + base64.b64encode(hashlib.sha512(b"other").digest()).decode()
+    with pytest.raises(ValueError):
+        assets.vendor()
+    assert not (tmp_path / "js" / "chart.umd.min.js").exists()
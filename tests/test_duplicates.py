@@ -0,0 +1,16 @@
+"""Duplicate-entry checks (database.find_duplicates) through the kept read connection."""
+import database
+
+def test_a_kept_connection_sees_each_new_expense(app):
+    database.register_user("twice", "pw", "0000")
+    user_id = database.check_user("twice", "pw")
+    first = database.add_expense("kfc zinger", 950, "Food & Dining", user_id, "2026-03-02")
+    assert database.find_duplicates(first, user_id) == []
+
+    second = database.add_expense("Zinger KFC", 950, "Food & Dining", user_id, "2026-03-03")
+    matches = database.find_duplicates(second, user_id)
+    assert [m["id"] for m in matches] == [first]
+    assert matches[0]["similarity"] == 1.0
+
+    other = database.add_expense("kfc zinger", 950, "Food & Dining", user_id, "2026-03-20")
+    assert database.find_duplicates(other, user_id) == []
@@ -0,0 +1,18 @@
+"""The /history view: the page body is loaded only when it isn't cached."""
+import database
+
+def test_history_loads_only_on_a_miss(app, monkeypatch):
+    import run
+
+    calls = []
+    original = run._load_history
+    monkeypatch.setattr(run, "_load_history", lambda user_id: calls.append(user_id) or original(user_id))
+    database.register_user("historian", "pw", "0000")
+    client = app.test_client()
+    client.post("/login", data={"username": "historian", "password": "pw"})
+    client.post("/add_expense", data={"raw_input": "samosa 60"})
+
+    first = client.get("/history").get_data(as_text=True)
+    second = client.get("/history").get_data(as_text=True)
+    assert len(calls) == 1
+    assert "samosa" in first and first == second
@@ -0,0 +1,13 @@
+"""The command-line tool (main.py)."""
+import database
+import main
+import profiles
+
+def test_report_uses_the_profile_currency(app, capsys):
+    database.register_user("cli-eur", "pw", "0000")
+    user_id = database.get_user_id("cli-eur")
+    database.add_expense("chai", 40, "Food & Dining", user_id)
+    profiles.update_profile(user_id, "EUR", 50000, 0.8, dict(profiles.DEFAULT_CATEGORY_BUDGETS))
+    assert main.main(["report", "--user", "cli-eur"]) == 0
+    out = capsys.readouterr().out
+    assert "EUR 40" in out and "PKR" not in out
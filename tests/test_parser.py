@@ -0,0 +1,132 @@
+"""
+Property checks for ai_engine.parser.parse_input.
+
+Random expense lists are rendered in every format the parser accepts: both
+orders, "2,500" / "1.5k" / "2 lac", Rs/PKR/"/-" markers, "x2" quantities,
+linking words and mixed connectors. Each one must parse back to exactly the
+items it was built from, and random Unicode noise must never raise.
+benchmarks/bench_parser.py runs the same checks on more cases.
+"""
+import random
+
+import pytest
+
+from ai_engine.parser import LINKING_WORDS, parse_input
+
+WORDS = ["pizza", "naan", "bread", "chai", "biryani", "petrol", "uber", "rent", "bijli", "bill", "dawai",
+         "zinger", "burger", "samosa", "doodh", "sabzi", "fees", "gift", "careem", "load", "7up", "mcdonald's",
+         "ghar", "kiraya", "bread-rolls", "چائے", "پیٹرول"]
+UNITS = ["2kg", "5L", "500 ml", "1 dozen", "12 pcs"]
+NOISE = "abcxyz0123456789 ,.+&-/;:\n\tRsPKRk₨×x۰۱۲۳ـآبپ😀'\"()[]"
+
+# --- Generators ---
+
+def random_description(rng):
+    words = rng.sample(WORDS, rng.randint(1, 3))
+    if rng.random() < 0.3:
+        # Interior connector, e.g. "bread and butter"
+        words.insert(rng.randint(1, len(words)), rng.choice(["and", "&"]))
+        if words[-1] in ("and", "&"):
+            words.append(rng.choice(WORDS))
+    if rng.random() < 0.2:
+        words.append(rng.choice(UNITS))
+    return " ".join(words)
+
+def render_amount(rng, amount):
+    """Returns (text, value) for a random spelling of a whole-rupee amount."""
+    style = rng.random()
+    if amount >= 1000 and amount % 100 == 0 and style < 0.2:
+        text = f"{amount / 1000:g}k"
+    elif amount >= 100000 and amount % 10000 == 0 and style < 0.3:
+        text = f"{amount / 100000:g} lac"
+    elif amount >= 1000 and style < 0.5:
+        text = f"{amount:,}"
+    else:
+        text = str(amount)
+    marker = rng.random()
+    if marker < 0.15:
+        text = "Rs " + text
+    elif marker < 0.25:
+        text = "PKR" + rng.choice(["", " "]) + text
+    elif marker < 0.35 and not text.endswith(("k", "lac")):
+        text += "/-"
+    return text
+
+def random_amount(rng):
+    return rng.choice([rng.randint(100, 999), rng.randint(1, 250) * 100, rng.randint(1, 50) * 10000, rng.randint(1000, 99999)])
+
+def random_case(rng):
+    """Builds one input line and the items it must parse to."""
+    amount_first = rng.random() < 0.4
+    expected, chunks = [], []
+    for _ in range(rng.randint(1, 5)):
+        desc = random_description(rng)
+        amount = random_amount(rng)
+        amount_text = render_amount(rng, amount)
+        qty = 1
+        if rng.random() < 0.15:
+            qty = rng.randint(2, 9)
+            desc_part = rng.choice([f"{qty}x {desc}", f"{desc} x{qty}"])
+        else:
+            desc_part = desc
+        if rng.random() < 0.15:
+            # "500 for petrol" / "petrol for 500": the linking word is not part of the description
+            link = rng.choice(sorted(LINKING_WORDS))
+            amount_text = f"{amount_text} {link}" if amount_first else f"{link} {amount_text}"
+        chunks.append(f"{amount_text} {desc_part}" if amount_first else f"{desc_part} {amount_text}")
+        expected.append((desc, float(amount * qty)))
+    line = chunks[0]
+    for chunk in chunks[1:]:
+        line += rng.choice([" ", ", ", " and ", " + ", "; ", "\n"]) + chunk
+    return line, expected
+
+def check_properties(cases, seed):
+    rng = random.Random(seed)
+    failures = []
+    for _ in range(cases):
+        line, expected = random_case(rng)
+        leftovers = []
+        got = parse_input(line, leftovers)
+        if got != expected or leftovers:
+            failures.append((line, expected, (got, leftovers)))
+    for _ in range(cases):
+        noise = "".join(rng.choice(NOISE) for _ in range(rng.randint(0, 60)))
+        try:
+            for desc, amount in parse_input(noise):
+                if not desc or not isinstance(amount, float):
+                    failures.append((noise, "non-empty description and float amount", (desc, amount)))
+        except Exception as e:
+            failures.append((noise, "no exception", repr(e)))
+    return failures
+
+# --- Tests ---
+
+@pytest.mark.parametrize("text, expected", [
+    ("pizza 700 and coke 150", [("pizza", 700.0), ("coke", 150.0)]),
+    ("Rs 1.5k groceries, 2,500 rent", [("groceries", 1500.0), ("rent", 2500.0)]),
+    ("milk 2L 300\n2x chai 40", [("milk 2L", 300.0), ("chai", 80.0)]),
+    ("500 for petrol", [("petrol", 500.0)]),
+    ("petrol for 500", [("petrol", 500.0)]),
+    ("300 on chai and 1200 at mcdonald's", [("chai", 300.0), ("mcdonald's", 1200.0)]),
+    ("Rs 700 for 2x pizza", [("pizza", 1400.0)]),
+    ("bread and butter for 200", [("bread and butter", 200.0)]),
+    ("for 500", [("for", 500.0)]),
+])
+def test_examples(text, expected):
+    leftovers = []
+    assert parse_input(text, leftovers) == expected
+    assert leftovers == []
+
+@pytest.mark.parametrize("text, expected, leftovers", [
+    ("biryani 300 300", [("biryani", 300.0)], ["300"]),
+    ("x 100", [], ["x 100"]),
+    ("chai 40 samosa", [("chai", 40.0)], ["samosa"]),
+])
+def test_leftovers_are_returned(text, expected, leftovers):
+    got = []
+    assert parse_input(text, got) == expected
+    assert got == leftovers
+
+def test_random_lists_round_trip():
+    failures = check_properties(2000, seed=1)
+    assert not failures, failures[:5]
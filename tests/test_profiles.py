@@ -0,0 +1,18 @@
+"""The per-worker profile cache (profiles.py)."""
+import cache
+import database
+import profiles
+
+def test_profile_cache_is_bounded_and_invalidated(app, monkeypatch):
+    monkeypatch.setattr(profiles, "_cache", cache.LRUCache(max_entries=2))
+    user_ids = []
+    for index in range(3):
+        database.register_user(f"budgeter{index}", "pw", "0000")
+        user_ids.append(database.check_user(f"budgeter{index}", "pw"))
+    for user_id in user_ids:
+        assert profiles.get_profile(user_id).currency == "PKR"
+    assert len(profiles._cache) == 2
+
+    user_id = user_ids[-1]
+    profiles.update_profile(user_id, "EUR", 50000, 0.8, {})
+    assert profiles.get_profile(user_id).currency == "EUR"
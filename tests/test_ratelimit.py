@@ -0,0 +1,43 @@
+"""Login rate limiting (ratelimit.py) as the app applies it behind a proxy."""
+import pytest
+
+import ratelimit
+
+@pytest.fixture
+def limiter(app):
+    ratelimit._limiter = None
+    yield ratelimit.get_limiter()
+    ratelimit._limiter = None
+
+def login(client, username, password, ip):
+    return client.post("/login", data={"username": username, "password": password},
+                       headers={"X-Forwarded-For": ip})
+
+def test_client_ips_have_their_own_buckets(app, limiter):
+    capacity = int(limiter.ip_limit[0])
+    client = app.test_client()
+    # Different usernames, so only the IP bucket runs out
+    for attempt in range(capacity):
+        assert login(client, f"nobody{attempt}", "wrong", "203.0.113.1").status_code == 200
+    assert login(client, "nobody-last", "wrong", "203.0.113.1").status_code == 429
+    assert login(client, "nobody-last", "wrong", "203.0.113.2").status_code == 200
+
+def test_successful_logins_do_not_use_up_the_ip_bucket(app, limiter):
+    import database
+    capacity = int(limiter.ip_limit[0])
+    for index in range(capacity + 5):
+        database.register_user(f"office{index}", "pw", "0000")
+    for index in range(capacity + 5):
+        response = login(app.test_client(), f"office{index}", "pw", "198.51.100.7")
+        assert response.status_code == 302, f"login {index + 1} from a shared IP was refused"
+    assert login(app.test_client(), "office0", "wrong", "198.51.100.7").status_code == 200
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_refund_never_exceeds_capacity(backend, tmp_path):
+    store = ratelimit.MemoryStore() if backend == "memory" else ratelimit.SQLiteStore(str(tmp_path / "rl.db"))
+    rate = 1e-9  # no refill during the test
+    assert store.consume("k", 2, rate, now=0)[0]
+    store.refund("k", 2)
+    store.refund("k", 2)
+    assert store.consume("k", 2, rate, now=0)[0] and store.consume("k", 2, rate, now=0)[0]
+    assert not store.consume("k", 2, rate, now=0)[0]
@@ -0,0 +1,22 @@
+"""Receipt uploads (/upload_receipt) with the OCR text given."""
+import io
+
+from PIL import Image
+
+import database
+from ai_engine import ocr
+
+def test_one_total_flashes_the_expense_it_added(app, monkeypatch):
+    database.register_user("scanner", "pw", "0000")
+    client = app.test_client()
+    client.post("/login", data={"username": "scanner", "password": "pw"})
+    # The readable page first: the message must not come from the last page read
+    monkeypatch.setattr(ocr, "extract_pages", lambda path: ["KFC Gulberg\nTotal 1500", "smudge"])
+    photo = io.BytesIO()
+    Image.new("L", (200, 300), 240).save(photo, "PNG")
+
+    response = client.post("/upload_receipt", data={"receipt": (io.BytesIO(photo.getvalue()), "kfc.png")},
+                           follow_redirects=True)
+    html = response.get_data(as_text=True)
+    assert "Added: KFC Gulberg (PKR 1500.0)" in html
+    assert "smudge" not in html
@@ -0,0 +1,18 @@
+"""The web app serves on NumPy alone: pandas, scikit-learn and SciPy stay unloaded."""
+import json
+import os
+import subprocess
+import sys
+
+import database
+from benchmarks import seed as seeder
+from tests.conftest import ROOT
+
+def test_serving_path_does_not_import_heavy_modules(app):
+    database.register_user("lean", seeder.PASSWORD, "0000")
+    # A fresh interpreter, like a gunicorn worker; this one already has pytest's imports
+    code = "from benchmarks.bench_memory import worker; worker([], 'lean')"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=dict(os.environ),
+                         check=True, capture_output=True, text=True).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    assert result["loaded"] == [], f"serving imported {result['loaded']}"